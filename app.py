@@ -1,16 +1,11 @@
 import streamlit as st
-import requests
-import json
-import time
-import os
-import io
-import tempfile
-from openai import OpenAI
-from dotenv import load_dotenv
-from audiorecorder import audiorecorder
-
-# Load environment variables from .env file
-load_dotenv()
+from simple_speech_ai import PipelineConfig, TextDelta
+from simple_speech_ai.engine import SpeechEngine
+from simple_speech_ai.app_support import MissingAPIKeyError, load_api_keys, reset_history, show_history, show_stats
+from simple_speech_ai.audio_server import AudioServer, content_type
+from simple_speech_ai.prompts import ASSISTANT_PROMPT
+from simple_speech_ai.stt import UPLOAD_FORMATS
+from simple_speech_ai.vad import NoSpeechError
 
 # Page configuration
 st.set_page_config(
@@ -19,48 +14,67 @@ st.set_page_config(
     layout="centered"
 )
 
-# Create directory for audio files if it doesn't exist
-os.makedirs("./audio_files", exist_ok=True)
-
 # Initialize session state
-if 'conversation_history' not in st.session_state:
-    st.session_state.conversation_history = []
 if 'audio_file' not in st.session_state:
     st.session_state.audio_file = None
 if 'auto_play' not in st.session_state:
     st.session_state.auto_play = True
 if 'is_listening' not in st.session_state:
     st.session_state.is_listening = False
+if 'streaming_tts' not in st.session_state:
+    st.session_state.streaming_tts = True
+if 'stt_format' not in st.session_state:
+    st.session_state.stt_format = "wav"
+if 'stt_downsample' not in st.session_state:
+    st.session_state.stt_downsample = True
+if 'show_timings' not in st.session_state:
+    st.session_state.show_timings = False
 
-# Get API Keys from environment variables or Streamlit secrets
+# Get API Keys from the .env file, environment variables or Streamlit secrets.
+# Read once per process rather than on every rerun; missing keys raise, and
+# exceptions are not cached, so the check repeats until the keys are set.
+@st.cache_data(show_spinner=False)
 def get_api_keys():
-    # Try to get from environment variables first
-    openai_api_key = os.getenv("OPENAI_API_KEY")
-    typecast_api_key = os.getenv("TYPECAST_API_KEY")
-    typecast_actor_id = os.getenv("TYPECAST_ACTOR_ID", "606c6b127b9f53b4cd1743f5")  # Default Korean voice
-    
-    # If not found, try to get from Streamlit secrets
-    if not openai_api_key and hasattr(st, "secrets"):
-        openai_api_key = st.secrets.get("OPENAI_API_KEY")
-        typecast_api_key = st.secrets.get("TYPECAST_API_KEY")
-        typecast_actor_id = st.secrets.get("TYPECAST_ACTOR_ID", "606c6b127b9f53b4cd1743f5")
-    
-    return {
-        "openai_api_key": openai_api_key,
-        "typecast_api_key": typecast_api_key,
-        "typecast_actor_id": typecast_actor_id
-    }
-
-# Get API keys
-api_keys = get_api_keys()
+    # Reading st.secrets without a secrets.toml would draw an error on the page
+    return load_api_keys(st.secrets if st.secrets.load_if_toml_exists() else None)
 
-# Check if API keys are available
-if not api_keys["openai_api_key"] or not api_keys["typecast_api_key"]:
-    st.error("API keys are missing. Please set OPENAI_API_KEY and TYPECAST_API_KEY in your .env file or Streamlit secrets.")
+# Get API keys, checking that the ones the configured providers need are available
+try:
+    api_keys = get_api_keys()
+except MissingAPIKeyError as e:
+    st.error(str(e))
     st.stop()
 
-# Initialize OpenAI client
-client = OpenAI(api_key=api_keys["openai_api_key"])
+# Speech engine shared by every session in this process; turns run on its event loop
+@st.cache_resource
+def get_pipeline(openai_api_key, typecast_api_key, typecast_actor_id):
+    config = PipelineConfig.from_env(
+        openai_api_key=openai_api_key,
+        typecast_api_key=typecast_api_key,
+        typecast_actor_id=typecast_actor_id,
+        system_prompt=ASSISTANT_PROMPT,
+        max_tokens=250,  # Keeping responses shorter for voice interaction
+        tts_tempo=1.1,  # Slightly faster for better flow
+        poll_deadline=30
+    )
+    return SpeechEngine(config)
+
+pipeline = get_pipeline(**api_keys)
+
+# Optional local server that streams clips to the browser while they download
+@st.cache_resource
+def get_audio_server():
+    return AudioServer.from_config(pipeline.config)
+
+audio_server = get_audio_server()
+
+# Per-session conversation state; with a turn store, the session ID in the
+# URL resumes the conversation after a reconnect
+if 'conversation' not in st.session_state:
+    st.session_state.conversation = pipeline.new_conversation(st.query_params.get("session"))
+    if pipeline.turn_store is not None:
+        st.query_params["session"] = st.session_state.conversation.session_id
+conversation = st.session_state.conversation
 
 # App title
 st.title("Voice-First AI Conversation")
@@ -80,160 +94,100 @@ def speech_language_code():
 def transcribe_audio(audio_data):
     with st.spinner("Transcribing your speech..."):
         try:
-            # Export audio to a temporary WAV file
-            temp_filename = f"temp_recording_{int(time.time())}.wav"
-            audio_data.export(temp_filename, format="wav")
-            
-            # Use OpenAI's Whisper API to transcribe the audio
-            with open(temp_filename, "rb") as audio_file:
-                transcript = client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file,
-                    language=speech_language_code()
-                )
-            
-            # Clean up the temporary file
-            os.remove(temp_filename)
-            
-            return transcript.text
+            # The recording is encoded in memory; nothing is written to disk
+            transcription = pipeline.transcribe(
+                audio_data,
+                language=speech_language_code(),
+                fmt=st.session_state.stt_format,
+                downsample=st.session_state.stt_downsample,
+                conversation=conversation
+            )
+            if transcription.engine == "local":
+                st.sidebar.caption(f"Transcribed on this machine "
+                                   f"({transcription.trimmed_seconds:.1f}s of silence trimmed)")
+            else:
+                st.sidebar.caption(f"Upload size: {transcription.upload_bytes / 1024:.0f} KB "
+                                   f"({transcription.trimmed_seconds:.1f}s of silence trimmed)")
+            return transcription.text
+        except NoSpeechError:
+            st.warning("No speech was detected in the recording. Please try again.")
+            return None
         except Exception as e:
             st.error(f"Error transcribing audio: {e}")
             return None
 
 # Function to generate response using OpenAI
 def generate_response(user_input):
-    # Simple system prompt
-    system_prompt = "You are a helpful AI assistant. Respond concisely and conversationally."
-    
-    # Format the messages for OpenAI API
-    messages = [
-        {"role": "system", "content": system_prompt}
-    ]
-    
-    # Add conversation history
-    for entry in st.session_state.conversation_history:
-        messages.append({"role": "user", "content": entry["user"]})
-        if "assistant" in entry:
-            messages.append({"role": "assistant", "content": entry["assistant"]})
-    
-    # Add the current user input
-    messages.append({"role": "user", "content": user_input})
-    
     with st.spinner("Generating response..."):
         try:
-            response = client.chat.completions.create(
-                model="gpt-4-turbo",
-                messages=messages,
-                temperature=0.7,
-                max_tokens=250  # Keeping responses shorter for voice interaction
-            )
-            ai_response = response.choices[0].message.content
-            
-            # Update conversation history
-            st.session_state.conversation_history.append({
-                "user": user_input, 
-                "assistant": ai_response
-            })
-            
-            return ai_response
+            return pipeline.respond(conversation, user_input)
         except Exception as e:
             st.error(f"Error generating response: {e}")
             return f"Sorry, I couldn't generate a response: {str(e)}"
 
-# Function to generate speech using Typecast AI
+# Function to play a clip, streamed from the audio server when it is enabled
+def play_audio(audio_file):
+    if audio_server:
+        st.audio(audio_server.url_for(audio_file), format=content_type(audio_file))
+    else:
+        st.audio(audio_file, format=content_type(audio_file), start_time=0)
+
+# Function to generate speech with the configured voice provider
 def generate_speech(text):
-    # Set up the headers
-    headers = {
-        'Authorization': f'Bearer {api_keys["typecast_api_key"]}',
-        'Content-Type': 'application/json'
-    }
-    
-    # Step 1: Request speech synthesis
     with st.spinner("Generating voice response..."):
-        payload = {
-            'text': text,
-            'lang': 'auto',
-            'actor_id': api_keys["typecast_actor_id"],
-            'xapi_hd': True,
-            'model_version': 'latest',
-            'tempo': 1.1,  # Slightly faster for better flow
-            'volume': 100,
-            'pitch': 0
-        }
+        progress_bar = st.progress(0)
+        status_text = st.empty()
+        
+        def show_progress(elapsed, deadline):
+            progress_bar.progress(min(elapsed / deadline, 1.0))
+            status_text.text(f"Creating voice response... ({elapsed:.1f}s)")
         
         try:
-            r = requests.post('https://typecast.ai/api/speak', headers=headers, json=payload)
-            r.raise_for_status()
-            response_data = r.json()
-            
-            # Get the speak URL from the response
-            if 'result' in response_data and 'speak_v2_url' in response_data['result']:
-                speak_url = response_data['result']['speak_v2_url']
-            elif 'result' in response_data and 'speak_url' in response_data['result']:
-                speak_url = response_data['result']['speak_url']
-            else:
-                st.error("Could not find speak URL in response")
-                return None
-            
-            # Step 2: Poll for the speech synthesis result
-            max_attempts = 30  # Maximum polling attempts
-            poll_interval = 1  # Seconds between polls
-            
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-            
-            for attempt in range(max_attempts):
-                progress_value = attempt / max_attempts
-                progress_bar.progress(progress_value)
-                status_text.text(f"Creating voice response... ({attempt+1}/{max_attempts})")
-                
-                poll_response = requests.get(speak_url, headers=headers)
-                poll_response.raise_for_status()
-                poll_data = poll_response.json()
-                
-                # Check if we have status in the poll data
-                if ('status' in poll_data and poll_data['status'] == 'done') or \
-                   ('result' in poll_data and 'status' in poll_data['result'] and poll_data['result']['status'] == 'done'):
-                    progress_bar.progress(1.0)
-                    status_text.text("Voice ready!")
-                    
-                    # Get the audio download URL
-                    audio_url = None
-                    if 'result' in poll_data and 'audio_download_url' in poll_data['result']:
-                        audio_url = poll_data['result']['audio_download_url']
-                    elif 'audio_download_url' in poll_data:
-                        audio_url = poll_data['audio_download_url']
-                    
-                    if audio_url:
-                        # Download the audio file
-                        audio_response = requests.get(audio_url)
-                        audio_response.raise_for_status()
-                        
-                        filename = f"./audio_files/speech_{int(time.time())}.wav"
-                        with open(filename, 'wb') as f:
-                            f.write(audio_response.content)
-                        
-                        return filename
-                    else:
-                        st.error("Could not find audio_download_url in response")
-                        return None
-                else:
-                    time.sleep(poll_interval)
-            
-            progress_bar.progress(1.0)
-            status_text.text("Time limit reached")
-            st.error(f"Exceeded maximum polling attempts ({max_attempts})")
-            return None
-            
+            audio_file = pipeline.speak(text, on_poll=show_progress, progressive=audio_server is not None,
+                                       conversation=conversation)
+            status_text.text("Voice ready!")
+            return audio_file
         except Exception as e:
             st.error(f"Error in generate_speech: {e}")
             return None
+        finally:
+            progress_bar.progress(1.0)
+
+# Function to stream the reply and speak it sentence by sentence
+def stream_reply_with_speech(user_input):
+    text_placeholder = st.empty()
+    ai_response = ""
+    
+    try:
+        for event in pipeline.stream_turn(conversation, user_input, progressive=audio_server is not None):
+            if isinstance(event, TextDelta):
+                ai_response += event.text
+                text_placeholder.markdown(ai_response + "▌")
+                continue
+            
+            # Clips arrive in sentence order, as soon as each one is ready
+            if event.audio_file:
+                st.session_state.audio_file = event.audio_file
+                if st.session_state.auto_play:
+                    play_audio(event.audio_file)
+            elif event.error:
+                st.warning(f"Voice synthesis failed: {event.error}")
+        text_placeholder.markdown(ai_response)
+    except Exception as e:
+        text_placeholder.markdown(ai_response)
+        st.error(f"Error generating response: {e}")
+
+REPLAY_CAPTIONS = {"repeat": "🔁 Replayed", "slower": "🐢 Replayed slower", "louder": "🔊 Replayed louder"}
 
 # Function to process user input and generate response
 def process_message(user_input):
     if not user_input.strip():
         return
     
+    # Barge-in: stop whatever is still running for the previous turn
+    pipeline.cancel(conversation)
+    st.session_state.audio_file = None
+    
     # Add user message to conversation
     with st.chat_message("user"):
         st.write(user_input)
@@ -243,6 +197,24 @@ def process_message(user_input):
             st.caption("🎤 via speech")
             st.session_state.is_listening = False
     
+    # "Say that again", "slower" or "louder": replay the last reply without calling the APIs
+    replayed = pipeline.replay(conversation, user_input)
+    if replayed:
+        with st.chat_message("assistant"):
+            st.write(replayed.text)
+            st.caption(REPLAY_CAPTIONS[replayed.intent])
+            for audio_file in replayed.audio_files:
+                st.session_state.audio_file = audio_file
+                if st.session_state.auto_play:
+                    play_audio(audio_file)
+        return
+    
+    # Stream the reply and start speaking before it is complete
+    if st.session_state.streaming_tts:
+        with st.chat_message("assistant"):
+            stream_reply_with_speech(user_input)
+        return
+    
     # Generate AI response
     ai_response = generate_response(user_input)
     
@@ -261,14 +233,17 @@ def process_message(user_input):
             if st.session_state.auto_play:
                 audio_placeholder = st.empty()
                 with audio_placeholder:
-                    st.audio(audio_file, format="audio/wav", start_time=0)
+                    play_audio(audio_file)
         else:
             st.warning("Voice synthesis failed")
 
 # Clear conversation
 def clear_conversation():
-    st.session_state.conversation_history = []
+    pipeline.cancel(conversation)
+    pipeline.release_audio(conversation)
+    conversation.clear()
     st.session_state.audio_file = None
+    reset_history()
     st.experimental_rerun()
 
 # Toggle auto-play setting
@@ -280,21 +255,27 @@ def process_audio_recording(audio_data):
     if audio_data is None or len(audio_data) == 0:
         return
     
+    # Barge-in: stop whatever is still running for the previous turn
+    pipeline.cancel(conversation)
+    st.session_state.audio_file = None
+    
     # Set listening flag
     st.session_state.is_listening = True
     
     # Display recording info
     st.sidebar.write(f"Recording length: {audio_data.duration_seconds:.2f} seconds")
     
-    # Transcribe the audio
-    transcript = transcribe_audio(audio_data)
-    
-    if transcript:
-        st.sidebar.success(f"Transcribed: {transcript}")
-        # Process the transcribed text as user input
-        process_message(transcript)
-    else:
-        st.sidebar.error("Failed to transcribe audio. Please try again.")
+    # Transcription and reply are timed as one turn
+    with pipeline.turn(conversation):
+        # Transcribe the audio
+        transcript = transcribe_audio(audio_data)
+        
+        if transcript:
+            st.sidebar.success(f"Transcribed: {transcript}")
+            # Process the transcribed text as user input
+            process_message(transcript)
+        else:
+            st.sidebar.error("Failed to transcribe audio. Please try again.")
 
 # Create two columns - main content and sidebar
 col_main, col_sidebar = st.columns([3, 1])
@@ -313,17 +294,31 @@ with st.sidebar:
         index=["Auto-detect", "Korean", "English"].index(st.session_state.speech_language)
     )
     
+    # Whisper upload encoding
+    st.selectbox("Upload Format", list(UPLOAD_FORMATS), key="stt_format",
+                 help="Opus and MP3 make uploads much smaller but need ffmpeg.")
+    st.checkbox("Downsample to 16 kHz mono", key="stt_downsample")
+    
     # Auto-play toggle
     auto_play = st.checkbox("Auto-play responses", value=st.session_state.auto_play, on_change=toggle_auto_play)
     
+    # Sentence-by-sentence streaming toggle
+    st.checkbox("Speak while generating", key="streaming_tts",
+                help="Start voice playback sentence by sentence while the reply is still being written.")
+    
     # Clear conversation button
     if st.button("Clear Conversation"):
         clear_conversation()
     
+    # Prompt size, cache and rate-limit counters, latency breakdown
+    show_stats(pipeline, conversation)
+    
     # Voice recording section
     st.markdown("### 🎤 Voice Input")
     
-    # Initialize audio recorder with proper parameters
+    # Initialize audio recorder with proper parameters; imported here, as it
+    # pulls in pydub, so the rest of the page renders without waiting for it
+    from audiorecorder import audiorecorder
     audio_data = audiorecorder("Click to record", "Click to stop recording")
     
     # Help text
@@ -335,18 +330,16 @@ with st.sidebar:
 
 # Main area
 # Display conversation history
-if not st.session_state.conversation_history:
+if not conversation.history:
     st.info("💬 Start a conversation by speaking or typing below.")
 
-for i, message in enumerate(st.session_state.conversation_history):
-    st.chat_message("user").write(message["user"])
-    if "assistant" in message:
-        with st.chat_message("assistant"):
-            st.write(message["assistant"])
+# Only the latest turns are rendered; earlier ones on request
+show_history(conversation, pipeline.config.history_page_turns)
 
 # Input area at the bottom
 st.write("---")
 user_input = st.chat_input("Type your message or use the voice input button...")
 
 if user_input:
-    process_message(user_input)
\ No newline at end of file
+    with pipeline.turn(conversation):
+        process_message(user_input)
\ No newline at end of file
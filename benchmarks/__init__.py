@@ -0,0 +1,3 @@
+"""
+Benchmarks and local stand-in servers for simple_speech_ai.
+"""
@@ -0,0 +1,277 @@
+"""
+End-to-end latency benchmark for the speech loop.
+
+Runs :class:`simple_speech_ai.pipeline.Pipeline` headless against the local
+OpenAI and Typecast stand-ins (:mod:`benchmarks.fake_openai`,
+:mod:`benchmarks.fake_typecast`) with N concurrent simulated sessions, and
+reports p50/p95/p99 for time to first token, time to first audio and total
+turn time, plus throughput. Timings are measured from the start of the turn
+(including transcription when ``--stt`` is set).
+
+Results are JSON, so two runs can be diffed:
+
+    python -m benchmarks.bench_pipeline --sessions 1,4,8 --output before.json
+    ... change something ...
+    python -m benchmarks.bench_pipeline --sessions 1,4,8 --compare before.json
+
+Latency options take the specs described in :mod:`benchmarks.latency`.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.fake_typecast import FakeTypecastServer, silent_wav
+from benchmarks.latency import parse_latency, summarize
+from simple_speech_ai.config import PipelineConfig
+from simple_speech_ai.engine import AsyncPipeline
+from simple_speech_ai.pipeline import Pipeline, SpokenSentence, TextDelta
+
+QUESTION = "중앙도서관 가고 싶은데 어케 가야 되노?"
+METRICS = ("stt", "ttft", "ttfa", "turn")
+
+
+def run_session(pipeline, turns, stt, progressive, recording):
+    """
+    Play one simulated session.
+
+    Returns:
+        list: One dict of timings (seconds) per turn
+    """
+    conversation = pipeline.new_conversation()
+    results = []
+    for _ in range(turns):
+        timing = {"stt": None, "ttft": None, "ttfa": None, "turn": None, "errors": 0}
+        started = time.perf_counter()
+        user_input = QUESTION
+        with pipeline.turn(conversation):
+            if stt:
+                user_input = pipeline.transcribe(recording, language="ko").text
+                timing["stt"] = time.perf_counter() - started
+
+            for event in pipeline.stream_turn(conversation, user_input, progressive=progressive):
+                elapsed = time.perf_counter() - started
+                if isinstance(event, TextDelta) and timing["ttft"] is None:
+                    timing["ttft"] = elapsed
+                elif isinstance(event, SpokenSentence):
+                    if event.error:
+                        timing["errors"] += 1
+                    elif timing["ttfa"] is None:
+                        timing["ttfa"] = elapsed
+        timing["turn"] = time.perf_counter() - started
+        results.append(timing)
+    return results
+
+
+async def run_session_async(pipeline, turns, stt, progressive, recording):
+    """
+    Play one simulated session on the asyncio engine.
+
+    Returns:
+        list: One dict of timings (seconds) per turn
+    """
+    conversation = pipeline.new_conversation()
+    results = []
+    for _ in range(turns):
+        timing = {"stt": None, "ttft": None, "ttfa": None, "turn": None, "errors": 0}
+        started = time.perf_counter()
+        user_input = QUESTION
+        with pipeline.turn(conversation):
+            if stt:
+                user_input = (await pipeline.transcribe(recording, language="ko")).text
+                timing["stt"] = time.perf_counter() - started
+
+            async for event in pipeline.stream_turn(conversation, user_input, progressive=progressive):
+                elapsed = time.perf_counter() - started
+                if isinstance(event, TextDelta) and timing["ttft"] is None:
+                    timing["ttft"] = elapsed
+                elif isinstance(event, SpokenSentence):
+                    if event.error:
+                        timing["errors"] += 1
+                    elif timing["ttfa"] is None:
+                        timing["ttfa"] = elapsed
+        timing["turn"] = time.perf_counter() - started
+        results.append(timing)
+    return results
+
+
+def run_threads(config, sessions, args, recording):
+    # One shared Pipeline, one thread per session
+    pipeline = Pipeline(config)
+    try:
+        with ThreadPoolExecutor(max_workers=sessions) as executor:
+            futures = [
+                executor.submit(run_session, pipeline, args.turns, args.stt, args.progressive, recording)
+                for _ in range(sessions)
+            ]
+            turns = [timing for future in futures for timing in future.result()]
+        return turns, pipeline.tts.stats()
+    finally:
+        pipeline.close()
+
+
+async def run_async(config, sessions, args, recording):
+    # One shared AsyncPipeline, one task per session
+    pipeline = AsyncPipeline(config, asyncio.get_running_loop())
+    try:
+        results = await asyncio.gather(*[
+            run_session_async(pipeline, args.turns, args.stt, args.progressive, recording)
+            for _ in range(sessions)
+        ])
+        return [timing for session in results for timing in session], pipeline.tts.stats()
+    finally:
+        await pipeline.close()
+
+
+def run_level(config, sessions, args):
+    """
+    Run ``sessions`` concurrent sessions on one shared pipeline.
+
+    Returns:
+        dict: Latency summaries, throughput and error counts
+    """
+    recording = silent_wav(args.recording_seconds)
+    started = time.perf_counter()
+    if args.engine == "async":
+        turns, tts_stats = asyncio.run(run_async(config, sessions, args, recording))
+    else:
+        turns, tts_stats = run_threads(config, sessions, args, recording)
+    wall = time.perf_counter() - started
+
+    result = {
+        metric: summarize([t[metric] for t in turns if t[metric] is not None])
+        for metric in METRICS
+        if args.stt or metric != "stt"
+    }
+    result.update({
+        "sessions": sessions,
+        "turns": len(turns),
+        "wall_s": round(wall, 3),
+        "throughput_turns_per_s": round(len(turns) / wall, 3),
+        "tts_errors": sum(t["errors"] for t in turns),
+        "tts_cache_hits": tts_stats.get("hits", 0),
+    })
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline):
+    """
+    Print per-level percentage changes against a previous run.
+    """
+    before = {level["sessions"]: level for level in baseline["levels"]}
+    for level in current["levels"]:
+        old = before.get(level["sessions"])
+        if old is None:
+            continue
+        print(f"sessions={level['sessions']}", file=sys.stderr)
+        for metric in METRICS:
+            if metric not in level or metric not in old:
+                continue
+            for stat in ("p50", "p95", "p99"):
+                new_value, old_value = level[metric][stat], old[metric][stat]
+                if new_value is None or not old_value:
+                    continue
+                change = 100 * (new_value - old_value) / old_value
+                print(f"  {metric:5} {stat}: {old_value:.3f}s -> {new_value:.3f}s ({change:+.1f}%)",
+                      file=sys.stderr)
+        old_tp, new_tp = old["throughput_turns_per_s"], level["throughput_turns_per_s"]
+        if old_tp:
+            print(f"  throughput: {old_tp:.3f} -> {new_tp:.3f} turns/s "
+                  f"({100 * (new_tp - old_tp) / old_tp:+.1f}%)", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", default="1,4",
+                        help="Comma-separated concurrency levels to run")
+    parser.add_argument("--turns", type=int, default=3, help="Turns per session")
+    parser.add_argument("--engine", choices=("threads", "async"), default="threads",
+                        help="Thread-per-session Pipeline or the asyncio engine")
+    parser.add_argument("--stt", action="store_true", help="Transcribe a recording before each turn")
+    parser.add_argument("--recording-seconds", type=float, default=2.0)
+    parser.add_argument("--progressive", action="store_true",
+                        help="Report audio as soon as its download starts")
+    parser.add_argument("--llm-ttft", default="lognormal:0.5:0.3", help="OpenAI time to first token")
+    parser.add_argument("--token-interval", default="0.02", help="Delay between streamed tokens")
+    parser.add_argument("--stt-latency", default="lognormal:0.7:0.3", help="Whisper processing time")
+    parser.add_argument("--typecast-latency", default="lognormal:1.0:0.3",
+                        help="Typecast fixed cost per job")
+    parser.add_argument("--typecast-per-char", type=float, default=0.02,
+                        help="Typecast cost per character, in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--telemetry-log", help="Also write per-stage timing spans to this JSONL file")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    parser.add_argument("--compare", help="Previous results file to compare against")
+    args = parser.parse_args()
+
+    levels = [int(n) for n in args.sessions.split(",")]
+    rng = random.Random(args.seed)
+    lock = threading.Lock()
+
+    def sampler(spec):
+        sample = parse_latency(spec, rng)
+
+        def locked():
+            with lock:
+                return sample()
+        return locked
+
+    typecast_base = sampler(args.typecast_latency)
+
+    results = {
+        "benchmark": "pipeline",
+        "commit": git_commit(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "telemetry_log")},
+        "levels": [],
+    }
+
+    with FakeOpenAIServer(ttft=sampler(args.llm_ttft),
+                          token_interval=sampler(args.token_interval),
+                          stt_latency=sampler(args.stt_latency)) as openai_server, \
+            FakeTypecastServer(latency=lambda text: typecast_base() + args.typecast_per_char * len(text)) \
+            as typecast_server:
+        for sessions in levels:
+            with tempfile.TemporaryDirectory() as audio_dir:
+                config = PipelineConfig(
+                    openai_api_key="benchmark",
+                    typecast_api_key="benchmark",
+                    openai_base_url=openai_server.base_url,
+                    typecast_speak_url=typecast_server.speak_url,
+                    audio_dir=audio_dir,
+                    typecast_pool_size=max(10, sessions * PipelineConfig.sentence_workers),
+                    telemetry_log=args.telemetry_log,
+                )
+                results["levels"].append(run_level(config, sessions, args))
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare and os.path.exists(args.compare):
+        with open(args.compare, encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
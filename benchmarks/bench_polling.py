@@ -0,0 +1,86 @@
+"""
+Compare fixed-interval polling with the adaptive poller.
+
+Runs synthesis jobs against :class:`benchmarks.fake_typecast.FakeTypecastServer`
+with scripted latencies and reports, per strategy, how long after the job was
+actually ready the client noticed (wasted latency) and how many poll requests
+it sent.
+
+Usage:
+    python -m benchmarks.bench_polling --jobs 40 --interval 1
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+
+from benchmarks.fake_typecast import FakeTypecastServer, default_latency
+from simple_speech_ai import typecast
+from simple_speech_ai.polling import AdaptivePoller, PollTimeout
+
+
+class FixedPoller:
+    """The original strategy: sleep a fixed interval between polls."""
+
+    def __init__(self, interval=1.0, max_attempts=30):
+        self.interval = interval
+        self.max_attempts = max_attempts
+
+    def wait(self, check, text_length=0, on_poll=None, started=None):
+        for _ in range(self.max_attempts):
+            done, value = check()
+            if done:
+                return value
+            time.sleep(self.interval)
+        raise PollTimeout(f"Exceeded maximum polling attempts ({self.max_attempts})")
+
+
+def run(poller, texts, server):
+    client = typecast.TypecastClient(api_key="benchmark", speak_url=server.speak_url)
+    wasted = []
+    polls_before = server.counts["polls"]
+
+    for text in texts:
+        speak_url = client.request_speech(typecast.build_payload(text))
+        job = server.jobs[speak_url.rsplit("/", 1)[-1]]
+        client.poll_speech(speak_url, poller=poller, text_length=len(text))
+        wasted.append(max(0.0, time.monotonic() - job["ready_at"]))
+    client.close()
+
+    return {
+        "jobs": len(texts),
+        "polls": server.counts["polls"] - polls_before,
+        "wasted_mean_s": round(statistics.mean(wasted), 3),
+        "wasted_p95_s": round(sorted(wasted)[int(0.95 * (len(wasted) - 1))], 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=40, help="Jobs per strategy")
+    parser.add_argument("--interval", type=float, default=1.0, help="Fixed polling interval in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    texts = ["가" * rng.randint(10, 200) for _ in range(args.jobs)]
+
+    def latency(text):
+        # Typecast-like latency with some noise
+        return default_latency(text) * rng.uniform(0.8, 1.3)
+
+    results = {}
+    with FakeTypecastServer(latency=latency) as server:
+        results["fixed"] = run(FixedPoller(interval=args.interval), texts, server)
+        # Warm the adaptive model with the first half, then measure everything
+        adaptive = AdaptivePoller()
+        run(adaptive, texts[: len(texts) // 2], server)
+        results["adaptive"] = run(adaptive, texts, server)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
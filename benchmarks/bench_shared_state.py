@@ -0,0 +1,192 @@
+"""
+Turn throughput of several worker processes on one shared state.
+
+Starts ``--workers`` processes per backend, each playing ``--sessions``
+conversations for ``--seconds`` against the same shared state and audio
+directory, the way Streamlit workers behind a load balancer would. A turn
+waits ``--provider-latency`` seconds for speech recognition, then does what
+the pipeline does with the state:
+
+- syncs and looks up the reply cache; on a miss, waits as long again for the
+  reply, looks up and stores the voice clips of two sentences and publishes
+  the reply
+- appends the turn and attaches its clips
+- takes a token from a rate-limit bucket
+
+Questions come from a small pool, so workers serve each other's replies and
+clips. Reported per backend and worker count: turns per second, the speed-up
+over one worker and the p50/p99 time a turn spends in the shared state.
+Throughput grows with the number of workers as long as the store and the
+CPUs keep up; ``--provider-latency 0`` measures the store alone.
+
+Backends: ``sqlite`` (a temporary database), ``redis``
+(:class:`benchmarks.fake_redis.FakeRedisServer`, or ``--redis-url``; needs
+``pip install redis``).
+
+Usage:
+    python -m benchmarks.bench_shared_state --backends sqlite,redis --workers 1,2,4 --seconds 5
+    python -m benchmarks.bench_shared_state --backends redis --redis-url redis://localhost:6379/15
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.fake_redis import FakeRedisServer
+from benchmarks.latency import summarize
+
+QUESTIONS = 40
+
+
+def play(url, audio_dir, worker, args, start, results):
+    # Runs in a worker process, one thread per session
+    from simple_speech_ai.ratelimit import SharedTokenBucket
+    from simple_speech_ai.response_cache import ResponseCache
+    from simple_speech_ai.shared_state import open_state
+    from simple_speech_ai.tts_cache import SharedTTSCache, cache_key
+    from simple_speech_ai.turn_store import SharedTurnStore
+
+    state = open_state(url)
+    turns = SharedTurnStore(state)
+    tts_cache = SharedTTSCache(state, audio_dir)
+    response_cache = ResponseCache(state=state)
+    bucket = SharedTokenBucket(state, "benchmark", rate=1e6, burst=1e6)
+    overheads = []
+
+    def session(number):
+        rng = random.Random(worker * 1000 + number)
+        session_id = f"worker{worker}-{number}"
+        deadline = time.monotonic() + args.seconds
+        while time.monotonic() < deadline:
+            # Popular questions come up more often
+            question = f"{int(rng.paretovariate(1.2)) % QUESTIONS}번 질문은 무엇인가요"
+            time.sleep(args.provider_latency)
+            started = time.perf_counter()
+            cached = response_cache.lookup(question)
+            if cached is None:
+                spent = time.perf_counter() - started
+                time.sleep(args.provider_latency)
+                started = time.perf_counter()
+                clips = []
+                for sentence in (f"{question}의 첫 문장", f"{question}의 둘째 문장"):
+                    key = cache_key({"text": sentence})
+                    path = tts_cache.get(key)
+                    if path is None:
+                        source = os.path.join(audio_dir, f"download_{session_id}_{key}.wav")
+                        with open(source, "wb") as f:
+                            f.write(os.urandom(2048))
+                        path = tts_cache.put(key, source)
+                    clips.append((sentence, path))
+                reply = " ".join(sentence for sentence, _ in clips)
+                response_cache.store(question, reply, clips)
+            else:
+                spent = 0.0
+                reply, clips = cached.reply, cached.clips
+            turn_id = turns.append(session_id, {"user": question, "assistant": reply, "user_tokens": 8,
+                                                "assistant_tokens": 16, "audio_files": []})
+            turns.set_audio(turn_id, [path for _, path in clips])
+            bucket.take()
+            overheads.append(spent + time.perf_counter() - started)
+
+    start.wait()
+    threads = [threading.Thread(target=session, args=(number,)) for number in range(args.sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put(overheads)
+
+
+def run(url, workers, args, audio_dir):
+    context = multiprocessing.get_context("spawn")
+    start = context.Event()
+    results = context.Queue()
+    processes = [context.Process(target=play, args=(url, audio_dir, worker, args, start, results))
+                 for worker in range(workers)]
+    for process in processes:
+        process.start()
+    # Give the workers time to import and connect before the clock starts
+    time.sleep(args.startup)
+    start.set()
+    overheads = [seconds for _ in processes for seconds in results.get()]
+    for process in processes:
+        process.join()
+    return {"workers": workers, "turns": len(overheads),
+            "turns_per_s": round(len(overheads) / args.seconds, 1),
+            "state_time_per_turn": summarize(overheads)}
+
+
+def run_backend(backend, args):
+    server = None
+    directory = tempfile.mkdtemp()
+    try:
+        if backend == "sqlite":
+            base = "sqlite:///" + os.path.join(directory, "state{}.db")
+        elif backend == "redis":
+            if args.redis_url:
+                base = args.redis_url
+            else:
+                server = FakeRedisServer().start()
+                base = server.url
+        else:
+            raise ValueError(f"Unknown backend {backend!r}")
+
+        runs = []
+        for index, workers in enumerate(args.workers):
+            # A fresh store and audio directory per run, so runs start equally cold
+            url = base.format(index) if backend == "sqlite" else base
+            if server is not None:
+                server.execute([b"FLUSHALL"])
+            audio_dir = os.path.join(directory, f"audio{index}")
+            os.makedirs(audio_dir)
+            runs.append(run(url, workers, args, audio_dir))
+        baseline = runs[0]["turns_per_s"] / runs[0]["workers"]
+        for result in runs:
+            result["speedup"] = round(result["turns_per_s"] / baseline, 2) if baseline else None
+        return {"backend": backend, "runs": runs}
+    finally:
+        if server is not None:
+            server.stop()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backends", default="sqlite,redis", help="Comma-separated: sqlite, redis")
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker process counts")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Measured time per run")
+    parser.add_argument("--sessions", type=int, default=8, help="Concurrent sessions per worker")
+    parser.add_argument("--provider-latency", type=float, default=0.2,
+                        help="Seconds a turn waits for speech recognition, and a reply-cache miss again for the reply")
+    parser.add_argument("--startup", type=float, default=3.0, help="Seconds allowed for workers to start")
+    parser.add_argument("--redis-url", help="Real server to use instead of the stand-in; it is not flushed")
+    parser.add_argument("--output", help="Write the JSON results here as well")
+    args = parser.parse_args()
+    args.workers = [int(count) for count in args.workers.split(",")]
+
+    results = {"benchmark": "shared_state", "cpus": os.cpu_count(),
+               "params": {k: v for k, v in vars(args).items() if k not in ("output", "redis_url")},
+               "backends": []}
+    for backend in args.backends.split(","):
+        try:
+            results["backends"].append(run_backend(backend, args))
+        except Exception as e:
+            results["backends"].append({"backend": backend, "error": str(e)})
+            print(f"{backend}: failed ({e})", file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
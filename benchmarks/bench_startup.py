@@ -0,0 +1,161 @@
+"""
+Startup and rerun time budget for the Streamlit apps.
+
+Measures, and checks against budgets:
+
+- import: time to run each app's top-level import statements, read from the
+  script itself, in a fresh interpreter with Streamlit already loaded (median
+  of ``--repeat`` runs), and which heavy modules that pulls in eagerly
+- first run: the app's first script run (imports, config, engine construction)
+- rerun: a script rerun with every cached resource warm, as on each
+  widget interaction (median)
+
+The apps run headless through ``streamlit.testing.v1.AppTest`` with
+placeholder API keys; nothing is sent to OpenAI or Typecast.
+
+Usage:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --import-budget-ms 80 --rerun-budget-ms 60 --output startup.json
+
+Exits with status 1 if a budget is exceeded or a forbidden module is
+imported eagerly, so it can gate CI.
+"""
+
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Apps whose imports are measured
+APPS = ("app.py", "streamlit_app.py")
+
+# Deferred until first use: the OpenAI SDK, NumPy (VAD, answer cache,
+# phrase stitching), pydub (recording export) and requests (sync Typecast client)
+HEAVY_MODULES = ("openai", "numpy", "pydub", "requests")
+
+IMPORT_PROBE = """
+import json, sys, time
+import streamlit
+started = time.perf_counter()
+exec({imports!r})
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def app_imports(app):
+    """
+    The import statements at the top level of ``app``, which run before its
+    first render.
+
+    Returns:
+        str: The statements, one per line
+    """
+    with open(os.path.join(ROOT, app), encoding="utf-8") as f:
+        tree = ast.parse(f.read(), app)
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def measure_imports(app, repeat):
+    """
+    Run the app's top-level imports in fresh interpreters.
+
+    Returns:
+        dict: Median import time and the heavy modules loaded eagerly
+    """
+    probe = IMPORT_PROBE.format(imports=app_imports(app), heavy=HEAVY_MODULES)
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    runs = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True,
+                                cwd=ROOT, env=env, check=True)
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    return {
+        "median_ms": round(statistics.median(run["seconds"] for run in runs) * 1000, 1),
+        "eagerly_loaded": runs[-1]["loaded"],
+    }
+
+
+def measure_reruns(app, repeat):
+    """
+    Run ``app`` once, then rerun it ``repeat`` times with warm caches.
+
+    Returns:
+        dict: First run and median rerun time
+    """
+    from streamlit.testing.v1 import AppTest
+
+    os.environ.setdefault("OPENAI_API_KEY", "startup-benchmark")
+    os.environ.setdefault("TYPECAST_API_KEY", "startup-benchmark")
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+
+    test = AppTest.from_file(os.path.join(ROOT, app), default_timeout=120)
+    started = time.perf_counter()
+    test.run()
+    first = time.perf_counter() - started
+    if test.exception:
+        raise RuntimeError(f"{app} failed: {test.exception[0].value}")
+
+    reruns = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        test.run()
+        reruns.append(time.perf_counter() - started)
+    return {
+        "first_run_ms": round(first * 1000, 1),
+        "rerun_median_ms": round(statistics.median(reruns) * 1000, 1),
+        "rerun_max_ms": round(max(reruns) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--app", default="streamlit_app.py", help="App script to rerun")
+    parser.add_argument("--repeat", type=int, default=5, help="Import probes and reruns to take the median of")
+    parser.add_argument("--import-budget-ms", type=float, default=100.0)
+    parser.add_argument("--first-run-budget-ms", type=float, default=1500.0)
+    parser.add_argument("--rerun-budget-ms", type=float, default=80.0)
+    parser.add_argument("--allow", default="", help="Comma-separated heavy modules allowed at import time")
+    parser.add_argument("--output", help="Write the JSON results here as well")
+    args = parser.parse_args()
+
+    imports = {app: measure_imports(app, args.repeat) for app in APPS}
+    reruns = measure_reruns(args.app, args.repeat)
+
+    failures = []
+    allowed = set(filter(None, args.allow.split(",")))
+    for app, result in imports.items():
+        if result["median_ms"] > args.import_budget_ms:
+            failures.append(f"{app}: import {result['median_ms']} ms > {args.import_budget_ms} ms")
+        for module in result["eagerly_loaded"]:
+            if module not in allowed:
+                failures.append(f"{app}: {module} is imported eagerly")
+    if reruns["first_run_ms"] > args.first_run_budget_ms:
+        failures.append(f"first run {reruns['first_run_ms']} ms > {args.first_run_budget_ms} ms")
+    if reruns["rerun_median_ms"] > args.rerun_budget_ms:
+        failures.append(f"rerun {reruns['rerun_median_ms']} ms > {args.rerun_budget_ms} ms")
+
+    results = {
+        "benchmark": "startup",
+        "params": vars(args),
+        "import": imports,
+        "app": reruns,
+        "failures": failures,
+    }
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(output)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
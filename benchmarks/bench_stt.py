@@ -0,0 +1,182 @@
+"""
+Real-time factor and latency of the speech-to-text engines.
+
+Transcribes clips of several lengths with each engine (``api``, ``local``,
+``auto``; see :mod:`simple_speech_ai.local_stt`) at one or more
+concurrency levels and reports, per engine, level and clip length, the
+latency percentiles and the real-time factor (processing time divided by
+audio length; below 1 is faster than real time), plus how many clips the
+router sent to the local engine.
+
+The API path runs against the Whisper stand-in of
+:mod:`benchmarks.fake_openai`, whose processing time does not depend on
+the clip, unless ``--real-api`` is given (uses ``OPENAI_API_KEY``). Clips
+are synthetic speech-like tones unless ``--audio-dir`` points at real
+recordings; only real speech gives meaningful local decoding times.
+
+Usage:
+    python -m benchmarks.bench_stt --engines api,local,auto --clips 2,5,10,20 --concurrency 1,4
+    python -m benchmarks.bench_stt --engines api,local --real-api --audio-dir recordings/ --language ko
+
+The local engine needs faster-whisper; the first run downloads the model.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.bench_transcode import speech_like_wav
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.latency import parse_latency, summarize
+from simple_speech_ai.config import PipelineConfig
+from simple_speech_ai.llm import lazy_openai_client
+from simple_speech_ai.pipeline import build_stt
+
+SAMPLE_RATE = 16000
+
+
+def load_clips(args, directory):
+    """
+    Returns:
+        list: ``(name, seconds, AudioSegment)`` per clip
+    """
+    from pydub import AudioSegment
+
+    if args.audio_dir:
+        paths = [os.path.join(args.audio_dir, name) for name in sorted(os.listdir(args.audio_dir))
+                 if name.lower().endswith((".wav", ".mp3", ".m4a", ".ogg", ".webm", ".flac"))]
+    else:
+        rng = np.random.default_rng(args.seed)
+        paths = []
+        for seconds in (float(s) for s in args.clips.split(",")):
+            path = os.path.join(directory, f"speech_{seconds:g}s.wav")
+            speech_like_wav(path, seconds, rng, sample_rate=SAMPLE_RATE)
+            paths.append(path)
+    clips = []
+    for path in paths:
+        segment = AudioSegment.from_file(path)
+        clips.append((os.path.basename(path), len(segment) / 1000.0, segment))
+    return clips
+
+
+def prepare(config, engine):
+    """
+    Build the engine and, for local models, load them before timing anything.
+
+    Returns:
+        tuple: ``(stt, load_seconds)``
+    """
+    config = PipelineConfig(**{**vars(config), "stt_engine": engine})
+    stt = build_stt(config, lazy_openai_client(config))
+    local = getattr(stt, "local", stt if engine == "local" else None)
+    load_seconds = None
+    if local is not None:
+        started = time.perf_counter()
+        local.model.load()
+        load_seconds = round(time.perf_counter() - started, 3)
+    return stt, load_seconds
+
+
+def run_level(stt, clips, concurrency, repeat, language):
+    """
+    Transcribe every clip ``repeat`` times with ``concurrency`` copies in flight.
+
+    Returns:
+        list: One result dict per clip
+    """
+    results = []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for name, seconds, segment in clips:
+            latencies = []
+            engines = []
+
+            def transcribe():
+                started = time.perf_counter()
+                transcription = stt.transcribe(segment, language=language)
+                return time.perf_counter() - started, transcription.engine
+
+            for _ in range(repeat):
+                for latency, engine in executor.map(lambda _: transcribe(), range(concurrency)):
+                    latencies.append(latency)
+                    engines.append(engine)
+            results.append({
+                "clip": name,
+                "audio_s": round(seconds, 2),
+                "latency": summarize(latencies),
+                "rtf_p50": round(statistics.median(latencies) / seconds, 4),
+                "local_share": round(engines.count("local") / len(engines), 3),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--engines", default="api,local,auto", help="Comma-separated engines to compare")
+    parser.add_argument("--clips", default="2,5,10,20", help="Synthetic clip lengths in seconds")
+    parser.add_argument("--audio-dir", help="Use the recordings in this directory instead")
+    parser.add_argument("--concurrency", default="1,4", help="Comma-separated numbers of clips in flight")
+    parser.add_argument("--repeat", type=int, default=3, help="Rounds per clip and level")
+    parser.add_argument("--language", default="ko", help="ISO language code; empty to auto-detect")
+    parser.add_argument("--real-api", action="store_true", help="Call the real Whisper API")
+    parser.add_argument("--stt-latency", default="lognormal:0.7:0.3", help="Stand-in Whisper processing time")
+    parser.add_argument("--local-model", default=PipelineConfig.local_stt_model)
+    parser.add_argument("--local-workers", type=int, default=PipelineConfig.local_stt_workers)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON results here as well")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    lock = threading.Lock()
+    sample = parse_latency(args.stt_latency, rng)
+
+    def stt_latency():
+        with lock:
+            return sample()
+
+    levels = [int(n) for n in args.concurrency.split(",")]
+    results = {"benchmark": "stt", "params": {k: v for k, v in vars(args).items() if k != "output"},
+               "engines": []}
+
+    with FakeOpenAIServer(stt_latency=stt_latency) as server, tempfile.TemporaryDirectory() as directory:
+        overrides = dict(stt_vad=False, local_stt_model=args.local_model, local_stt_workers=args.local_workers)
+        if args.real_api:
+            config = PipelineConfig.from_env(**overrides)
+        else:
+            config = PipelineConfig(openai_api_key="benchmark", openai_base_url=server.base_url, **overrides)
+        clips = load_clips(args, directory)
+
+        for engine in args.engines.split(","):
+            entry = {"engine": engine}
+            try:
+                stt, entry["load_s"] = prepare(config, engine)
+            except ImportError as e:
+                entry["error"] = str(e)
+                results["engines"].append(entry)
+                print(f"{engine}: skipped ({e})", file=sys.stderr)
+                continue
+            # Untimed, so connection setup and first-call caches are not measured
+            stt.transcribe(clips[0][2], language=args.language or None)
+            entry["levels"] = [
+                {"concurrency": level, "clips": run_level(stt, clips, level, args.repeat, args.language or None)}
+                for level in levels
+            ]
+            results["engines"].append(entry)
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Bytes on the wire and encode cost of the compressed output formats.
+
+Encodes synthetic speech-like clips (a voiced tone with a wandering pitch,
+syllable-rate amplitude envelope, noise and pauses, at 44.1 kHz) with :class:`simple_speech_ai.transcode.Transcoder` and reports, per
+format and bitrate, the size relative to WAV, the time to transfer a clip
+over a slow link and the encode time per second of speech. Silent clips,
+like the ones the Typecast stand-in serves, would compress unrealistically
+well.
+
+Usage:
+    python -m benchmarks.bench_transcode --formats wav,opus:24k,opus:32k,mp3:48k --link-kbps 1000
+
+Needs ffmpeg with libopus and libmp3lame.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+from simple_speech_ai.transcode import Transcoder
+
+SAMPLE_RATE = 44100
+
+
+def speech_like_wav(path, seconds, rng, sample_rate=SAMPLE_RATE):
+    """Write a mono 16-bit WAV that compresses roughly like speech."""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.7 * t + rng.uniform(0, 6.3))
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 12))
+    syllables = np.clip(np.sin(2 * np.pi * 4.0 * t) + 0.3, 0, None)
+    pauses = (np.sin(2 * np.pi * 0.25 * t + rng.uniform(0, 6.3)) > -0.8).astype(float)
+    signal = (voiced * syllables + 0.05 * rng.standard_normal(t.size)) * pauses
+    samples = (0.3 * 32767 * signal / np.max(np.abs(signal))).astype("<i2")
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(samples.tobytes())
+
+
+def run(spec, clips, link_kbps, ffmpeg):
+    """
+    Encode every clip with one format.
+
+    Returns:
+        dict: Size, transfer and encode figures
+    """
+    fmt, _, bitrate = spec.partition(":")
+    transcoder = None if fmt == "wav" else Transcoder(fmt, bitrate=bitrate or "32k", workers=1, ffmpeg=ffmpeg)
+    audio_seconds = sum(seconds for _, seconds in clips)
+    wav_bytes = 0
+    out_bytes = 0
+    encode_rtf = []
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            for source, seconds in clips:
+                path = os.path.join(workdir, os.path.basename(source))
+                shutil.copyfile(source, path)
+                wav_bytes += os.path.getsize(path)
+                started = time.perf_counter()
+                if transcoder is not None:
+                    path = transcoder.encode(path)
+                encode_rtf.append((time.perf_counter() - started) / seconds)
+                out_bytes += os.path.getsize(path)
+    finally:
+        if transcoder is not None:
+            transcoder.close()
+
+    return {
+        "format": spec,
+        "clips": len(clips),
+        "kb_per_second_of_speech": round(out_bytes / 1024 / audio_seconds, 2),
+        "ratio_vs_wav": round(out_bytes / wav_bytes, 4),
+        "transfer_s_per_second_of_speech": round(out_bytes * 8 / 1000 / link_kbps / audio_seconds, 4),
+        "encode_s_per_second_of_speech": round(statistics.mean(encode_rtf), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--formats", default="wav,opus:24k,opus:32k,mp3:32k,mp3:48k",
+                        help="Comma-separated format[:bitrate] specs")
+    parser.add_argument("--seconds", default="2,5,12", help="Comma-separated clip lengths")
+    parser.add_argument("--repeat", type=int, default=3, help="Clips per length")
+    parser.add_argument("--link-kbps", type=float, default=1000.0,
+                        help="Link speed for the transfer estimate (kbit/s)")
+    parser.add_argument("--ffmpeg", default="ffmpeg")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    with tempfile.TemporaryDirectory() as sources:
+        clips = []
+        for seconds in [float(s) for s in args.seconds.split(",")]:
+            for i in range(args.repeat):
+                path = os.path.join(sources, f"speech_{seconds:g}s_{i}.wav")
+                speech_like_wav(path, seconds, rng)
+                clips.append((path, seconds))
+
+        results = {
+            "benchmark": "transcode",
+            "params": vars(args),
+            "formats": [run(spec, clips, args.link_kbps, args.ffmpeg) for spec in args.formats.split(",")],
+        }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Time to audio with and without hedged text-to-speech requests.
+
+Synthesizes distinct sentences against
+:class:`benchmarks.fake_typecast.FakeTypecastServer`, whose job latencies
+have a heavy tail (a share of the jobs takes several times longer), once
+per mode:
+
+- ``none``: Typecast only
+- ``typecast``: hedged with a second Typecast request
+- ``espeak`` / ``piper``: hedged with the local engine (must be installed)
+
+Each mode first runs ``--warmup`` unmeasured requests, so the hedge starts
+from learned latencies. Reported per mode: the p50/p95/p99 time to audio,
+Typecast jobs submitted per sentence (the cost) and how often the backup won.
+
+Usage:
+    python -m benchmarks.bench_tts --modes none,typecast --requests 200 --concurrency 8
+    python -m benchmarks.bench_tts --latency lognormal:1.2:0.3 --tail-prob 0.1 --tail-factor 3
+"""
+
+import argparse
+import json
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_typecast import FakeTypecastServer
+from benchmarks.latency import parse_latency, summarize
+from simple_speech_ai.config import PipelineConfig
+from simple_speech_ai.pipeline import build_tts
+
+
+def sentences(count, start, rng):
+    # Distinct texts, so every request misses the voice cache
+    return [f"{start + i}번 문장입니다. " + "가나다라마바사" * rng.randint(1, 6) for i in range(count)]
+
+
+def run_mode(mode, server, args, directory):
+    config = PipelineConfig(typecast_api_key="benchmark", typecast_speak_url=server.speak_url,
+                            audio_dir=directory, phrase_bank=False,
+                            tts_hedge_provider=None if mode == "none" else mode)
+    tts = build_tts(config)
+    rng = random.Random(args.seed)
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            list(executor.map(tts.synthesize, sentences(args.warmup, 0, rng)))
+            submits_before = server.counts["submits"]
+            stats_before = tts.stats()
+
+            def timed(text):
+                started = time.perf_counter()
+                tts.synthesize(text)
+                return time.perf_counter() - started
+
+            latencies = list(executor.map(timed, sentences(args.requests, args.warmup, rng)))
+        stats = tts.stats()
+    finally:
+        tts.close()
+    result = {
+        "mode": mode,
+        "time_to_audio": summarize(latencies),
+        "typecast_jobs_per_sentence": round((server.counts["submits"] - submits_before) / args.requests, 3),
+    }
+    if mode != "none":
+        result["hedged"] = stats["hedged"] - stats_before["hedged"]
+        result["backup_wins"] = stats["backup_wins"] - stats_before["backup_wins"]
+        result["hedge_delay_s"] = stats["hedge_delay_s"]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modes", default="none,typecast", help="Comma-separated hedge providers, or none")
+    parser.add_argument("--requests", type=int, default=200, help="Measured sentences per mode")
+    parser.add_argument("--warmup", type=int, default=40, help="Unmeasured sentences per mode")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", default="lognormal:1.0:0.25", help="Typical Typecast job latency")
+    parser.add_argument("--tail-prob", type=float, default=0.05, help="Share of straggling jobs")
+    parser.add_argument("--tail-factor", type=float, default=4.0, help="How much longer stragglers take")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON results here as well")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    lock = threading.Lock()
+    sample = parse_latency(args.latency, rng)
+
+    def latency(text):
+        with lock:
+            seconds = sample()
+            return seconds * args.tail_factor if rng.random() < args.tail_prob else seconds
+
+    results = {"benchmark": "tts", "params": {k: v for k, v in vars(args).items() if k != "output"},
+               "modes": []}
+    with FakeTypecastServer(latency=latency) as server:
+        for mode in args.modes.split(","):
+            with tempfile.TemporaryDirectory() as directory:
+                try:
+                    results["modes"].append(run_mode(mode, server, args, directory))
+                except Exception as e:
+                    results["modes"].append({"mode": mode, "error": str(e)})
+                    print(f"{mode}: failed ({e})", file=sys.stderr)
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
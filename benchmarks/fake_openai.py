@@ -0,0 +1,176 @@
+"""
+Local stand-in for the OpenAI chat completions and Whisper endpoints.
+
+Implements ``POST /v1/chat/completions`` (plain and ``stream=True`` server-sent
+events) and ``POST /v1/audio/transcriptions``, with configurable latencies, so
+the pipeline can be benchmarked with the real ``openai`` client pointed at
+``base_url``.
+
+Example:
+    with FakeOpenAIServer(ttft=lambda: 0.4, token_interval=lambda: 0.03) as server:
+        client = OpenAI(api_key="bench", base_url=server.base_url)
+"""
+
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+
+from benchmarks.fake_typecast import StandInHTTPServer
+
+DEFAULT_REPLIES = [
+    "할매요, 안녕하십니꺼! 손주 버스 도우미입니더. 중앙도서관은 약국 앞 정류장에서 7번 버스를 타시면 됩니더. "
+    "천천히 걸어도 5분이면 정류장에 도착합니더. 더 도와드릴 거 있습니꺼?",
+    "버스가 7분 후에 옵니더. 파란 간판 앞에서 기다리시면 됩니더. 걱정하지 마이소, 손주가 다 도와드릴게예. "
+    "더 도와드릴 거 있습니꺼?",
+    "Hello! The city hall is three stops away on bus 12. The stop is right in front of the pharmacy. "
+    "Take your time, there is no rush. Anything else I can help with?",
+]
+
+
+def _constant(value):
+    return lambda: value
+
+
+class FakeOpenAIServer:
+    """
+    Threaded HTTP server imitating the OpenAI API.
+
+    Latencies are callables returning seconds, so any distribution can be used.
+
+    Args:
+        ttft (callable): Delay before the first token (or the whole reply when
+            not streaming)
+        token_interval (callable): Delay between streamed tokens
+        stt_latency (callable): Whisper processing time
+        replies (list): Replies cycled through in request order
+        transcript (str): Text returned by the transcription endpoint
+        host (str): Interface to bind
+        port (int): Port to bind; 0 picks a free one
+    """
+
+    def __init__(self, ttft=_constant(0.5), token_interval=_constant(0.03), stt_latency=_constant(0.8),
+                 replies=None, transcript="중앙도서관 가고 싶은데 어케 가야 되노?", host="127.0.0.1", port=0):
+        self.ttft = ttft
+        self.token_interval = token_interval
+        self.stt_latency = stt_latency
+        self.transcript = transcript
+        self._replies = itertools.cycle(replies or DEFAULT_REPLIES)
+        self.counts = {"chat": 0, "transcriptions": 0}
+        self._lock = threading.Lock()
+        self._httpd = StandInHTTPServer((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _next_reply(self, kind):
+        with self._lock:
+            self.counts[kind] += 1
+            return next(self._replies), self.counts[kind]
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, data, status=200):
+                body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+                if self.path.endswith("/chat/completions"):
+                    return self._chat(json.loads(body or b"{}"))
+                if self.path.endswith("/audio/transcriptions"):
+                    server._next_reply("transcriptions")
+                    time.sleep(server.stt_latency())
+                    return self._send_json({"text": server.transcript})
+                self._send_json({"error": {"message": "not found"}}, status=404)
+
+            def _chat(self, request):
+                reply, number = server._next_reply("chat")
+                # Vary replies so the TTS cache does not turn the benchmark into a cache test
+                reply = reply.replace("7분", f"{number % 10 + 1}분")
+                model = request.get("model", "gpt-4-turbo")
+                time.sleep(server.ttft())
+
+                if not request.get("stream"):
+                    return self._send_json({
+                        "id": f"chatcmpl-{number}",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": reply},
+                            "finish_reason": "stop"
+                        }],
+                        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+                    })
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                tokens = [reply[i:i + 3] for i in range(0, len(reply), 3)]
+                try:
+                    for index, token in enumerate(tokens):
+                        if index:
+                            time.sleep(server.token_interval())
+                        self._event({
+                            "id": f"chatcmpl-{number}",
+                            "object": "chat.completion.chunk",
+                            "created": int(time.time()),
+                            "model": model,
+                            "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]
+                        })
+                    self._event({
+                        "id": f"chatcmpl-{number}",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+                    })
+                    self._chunk(b"data: [DONE]\n\n")
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client stopped reading, e.g. a cancelled turn
+                    self.close_connection = True
+
+            def _event(self, data):
+                self._chunk(b"data: " + json.dumps(data, ensure_ascii=False).encode("utf-8") + b"\n\n")
+
+            def _chunk(self, payload):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(payload), payload))
+                self.wfile.flush()
+
+        return Handler
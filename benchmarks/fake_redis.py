@@ -0,0 +1,278 @@
+"""
+Local stand-in for a Redis server, speaking the RESP2 and RESP3 protocols.
+
+Implements the commands :class:`simple_speech_ai.shared_state.RedisState`
+uses (strings, counters, hashes, lists, key expiry and MULTI/EXEC
+transactions) plus what clients send on connect, with all data in memory.
+Every command, and every transaction, runs under one lock, so they are
+atomic like on a real server.
+
+Example:
+    with FakeRedisServer() as server:
+        config = PipelineConfig(shared_state=server.url, ...)
+"""
+
+import socket
+import socketserver
+import threading
+import time
+
+
+class RESPError(Exception):
+    """Sent to the client as an error reply."""
+
+
+def _encode(value, protocol=2):
+    if isinstance(value, RESPError):
+        return f"-{value}\r\n".encode("utf-8")
+    if value is True:
+        return b"+OK\r\n"
+    if value is None:
+        return b"_\r\n" if protocol == 3 else b"$-1\r\n"
+    if isinstance(value, int):
+        return f":{value}\r\n".encode("ascii")
+    if isinstance(value, dict):
+        if protocol == 3:
+            return f"%{len(value)}\r\n".encode("ascii") + b"".join(
+                _encode(item, protocol) for pair in value.items() for item in pair)
+        value = [item for pair in value.items() for item in pair]
+    if isinstance(value, (list, tuple)):
+        return f"*{len(value)}\r\n".encode("ascii") + b"".join(_encode(item, protocol) for item in value)
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    return f"${len(value)}\r\n".encode("ascii") + value + b"\r\n"
+
+
+def _read_command(reader):
+    line = reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline command, e.g. "PING" typed into telnet
+        return line.split()
+    args = []
+    for _ in range(int(line[1:])):
+        length = int(reader.readline()[1:])
+        args.append(reader.read(length + 2)[:-2])
+    return args
+
+
+class StandInTCPServer(socketserver.ThreadingTCPServer):
+    """Threaded server with a listen backlog deep enough for many worker processes."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024
+
+
+class FakeRedisServer:
+    """
+    Threaded TCP server imitating Redis.
+
+    Args:
+        host (str): Interface to bind
+        port (int): Port to bind; 0 picks a free one
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.data = {}
+        self.expires = {}
+        self.commands = 0
+        self._lock = threading.RLock()
+        self._server = StandInTCPServer((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _live(self, key):
+        # Caller holds the lock; drops the key if it has expired
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return self.data.get(key)
+
+    def _typed(self, key, kind):
+        value = self._live(key)
+        if value is not None and not isinstance(value, kind):
+            raise RESPError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def execute(self, args):
+        """
+        Run one command.
+
+        Args:
+            args (list): Command name and arguments as bytes
+
+        Returns:
+            Reply value: True for OK, None for a nil reply, or int, bytes, list or dict
+        """
+        name = args[0].decode("ascii", "replace").upper()
+        args = args[1:]
+        with self._lock:
+            self.commands += 1
+            if name == "PING":
+                return args[0] if args else "PONG"
+            if name == "HELLO":
+                protocol = int(args[0]) if args else 2
+                if protocol not in (2, 3):
+                    raise RESPError("NOPROTO unsupported protocol version")
+                return {"server": "redis", "version": "7.2.0", "proto": protocol, "id": 1,
+                        "mode": "standalone", "role": "master", "modules": []}
+            if name in ("CLIENT", "SELECT", "FLUSHDB", "FLUSHALL"):
+                if name.startswith("FLUSH"):
+                    self.data.clear()
+                    self.expires.clear()
+                return True
+            if name == "GET":
+                return self._typed(args[0], bytes)
+            if name == "SET":
+                self.data[args[0]] = args[1]
+                self.expires.pop(args[0], None)
+                if len(args) >= 4 and args[2].upper() == b"EX":
+                    self.expires[args[0]] = time.monotonic() + int(args[3])
+                return True
+            if name == "DEL":
+                deleted = 0
+                for key in args:
+                    if self._live(key) is not None:
+                        del self.data[key]
+                        self.expires.pop(key, None)
+                        deleted += 1
+                return deleted
+            if name == "EXPIRE":
+                if self._live(args[0]) is None:
+                    return 0
+                self.expires[args[0]] = time.monotonic() + int(args[1])
+                return 1
+            if name in ("INCR", "INCRBY"):
+                amount = int(args[1]) if name == "INCRBY" else 1
+                value = int(self._typed(args[0], bytes) or b"0") + amount
+                self.data[args[0]] = str(value).encode("ascii")
+                return value
+            if name == "HGET":
+                return (self._typed(args[0], dict) or {}).get(args[1])
+            if name == "HSET":
+                fields = self._typed(args[0], dict)
+                if fields is None:
+                    fields = self.data[args[0]] = {}
+                added = 0
+                for field, value in zip(args[1::2], args[2::2]):
+                    added += field not in fields
+                    fields[field] = value
+                return added
+            if name == "HDEL":
+                fields = self._typed(args[0], dict) or {}
+                deleted = sum(fields.pop(field, None) is not None for field in args[1:])
+                if not fields:
+                    self.data.pop(args[0], None)
+                return deleted
+            if name == "HGETALL":
+                return dict(self._typed(args[0], dict) or {})
+            if name == "RPUSH":
+                items = self._typed(args[0], list)
+                if items is None:
+                    items = self.data[args[0]] = []
+                items.extend(args[1:])
+                return len(items)
+            if name == "LRANGE":
+                items = self._typed(args[0], list) or []
+                start, stop = int(args[1]), int(args[2])
+                start = max(0, len(items) + start if start < 0 else start)
+                stop = len(items) + stop if stop < 0 else stop
+                return items[start:stop + 1]
+            if name == "LSET":
+                items = self._typed(args[0], list)
+                if items is None:
+                    raise RESPError("ERR no such key")
+                try:
+                    items[int(args[1])] = args[2]
+                except IndexError:
+                    raise RESPError("ERR index out of range")
+                return True
+            if name == "LLEN":
+                return len(self._typed(args[0], list) or [])
+        raise RESPError(f"ERR unknown command '{name}'")
+
+    def execute_all(self, commands):
+        """
+        Run queued commands as one transaction, as ``EXEC`` does.
+
+        Returns:
+            list: One reply per command; a failing command's reply is its error
+        """
+        replies = []
+        with self._lock:
+            for args in commands:
+                try:
+                    replies.append(self.execute(args))
+                except RESPError as e:
+                    replies.append(e)
+        return replies
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def setup(self):
+                super().setup()
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def handle(self):
+                protocol = 2
+                # Commands queued between MULTI and EXEC, or None outside a transaction
+                queued = None
+                while True:
+                    try:
+                        args = _read_command(self.rfile)
+                    except (ValueError, ConnectionError):
+                        return
+                    if args is None:
+                        return
+                    if not args:
+                        continue
+                    command = args[0].upper()
+                    if command == b"MULTI":
+                        reply = RESPError("ERR MULTI calls can not be nested") if queued is not None else True
+                        queued = [] if queued is None else queued
+                    elif command in (b"EXEC", b"DISCARD"):
+                        if queued is None:
+                            reply = RESPError(f"ERR {command.decode()} without MULTI")
+                        else:
+                            reply = server.execute_all(queued) if command == b"EXEC" else True
+                            queued = None
+                    elif queued is not None:
+                        queued.append(args)
+                        self.wfile.write(b"+QUEUED\r\n")
+                        self.wfile.flush()
+                        continue
+                    else:
+                        try:
+                            reply = server.execute(args)
+                        except RESPError as e:
+                            reply = e
+                    if args[0].upper() == b"HELLO" and isinstance(reply, dict):
+                        protocol = reply["proto"]
+                    self.wfile.write(_encode(reply, protocol))
+                    self.wfile.flush()
+
+        return Handler
@@ -0,0 +1,175 @@
+"""
+Local stand-in for the Typecast speak API with scripted latencies.
+
+The server implements the three calls the app makes: submitting a job
+(``POST /api/speak``), polling it (``GET /api/speak/v2/<id>``) and
+downloading the finished clip (``GET /audio/<id>.wav``). Each job reports
+``progress`` until its scripted latency has elapsed and ``done`` after that.
+
+Example:
+    with FakeTypecastServer(latency=[0.8, 2.5, 1.2]) as server:
+        os.environ["TYPECAST_SPEAK_URL"] = server.speak_url
+        ...
+"""
+
+import io
+import itertools
+import json
+import threading
+import time
+import uuid
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StandInHTTPServer(ThreadingHTTPServer):
+    """Threaded server with a listen backlog deep enough for hundreds of clients."""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def default_latency(text):
+    """Rough Typecast-like completion time: fixed cost plus per-character cost."""
+    return 1.0 + 0.02 * len(text)
+
+
+def silent_wav(seconds, sample_rate=16000):
+    """
+    Build a silent mono 16-bit WAV clip.
+
+    Returns:
+        bytes: WAV file contents
+    """
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(b"\x00\x00" * int(seconds * sample_rate))
+    return buffer.getvalue()
+
+
+class FakeTypecastServer:
+    """
+    Threaded HTTP server imitating Typecast.
+
+    Args:
+        latency: Seconds until a job is done. Either a callable
+            ``latency(text) -> seconds`` or a sequence of seconds that is
+            cycled through in submission order.
+        audio_seconds_per_char (float): Length of the generated clip per character
+        host (str): Interface to bind
+        port (int): Port to bind; 0 picks a free one
+    """
+
+    def __init__(self, latency=default_latency, audio_seconds_per_char=0.08, host="127.0.0.1", port=0):
+        if callable(latency):
+            self._latency = latency
+        else:
+            scripted = itertools.cycle(list(latency))
+            self._latency = lambda text: next(scripted)
+        self.audio_seconds_per_char = audio_seconds_per_char
+        self.jobs = {}
+        self.counts = {"submits": 0, "polls": 0, "downloads": 0}
+        self._lock = threading.Lock()
+        self._httpd = StandInHTTPServer((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def speak_url(self):
+        return f"{self.base_url}/api/speak"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _submit(self, payload):
+        job_id = uuid.uuid4().hex
+        latency = self._latency(payload.get("text", ""))
+        with self._lock:
+            self.counts["submits"] += 1
+            self.jobs[job_id] = {
+                "text": payload.get("text", ""),
+                "latency": latency,
+                "ready_at": time.monotonic() + latency
+            }
+        return {"result": {"speak_v2_url": f"{self.base_url}/api/speak/v2/{job_id}"}}
+
+    def _poll(self, job_id):
+        with self._lock:
+            self.counts["polls"] += 1
+            job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        if time.monotonic() < job["ready_at"]:
+            return {"result": {"status": "progress"}}
+        return {"result": {
+            "status": "done",
+            "audio_download_url": f"{self.base_url}/audio/{job_id}.wav"
+        }}
+
+    def _audio(self, job_id):
+        with self._lock:
+            self.counts["downloads"] += 1
+            job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        return silent_wav(max(0.1, len(job["text"]) * self.audio_seconds_per_char))
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body, content_type="application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_json(self, data):
+                if data is None:
+                    self._send(404, b'{"error": "not found"}')
+                else:
+                    self._send(200, json.dumps(data).encode("utf-8"))
+
+            def do_POST(self):
+                if self.path != "/api/speak":
+                    return self._send_json(None)
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                self._send_json(server._submit(payload))
+
+            def do_GET(self):
+                if self.path.startswith("/api/speak/v2/"):
+                    return self._send_json(server._poll(self.path.rsplit("/", 1)[-1]))
+                if self.path.startswith("/audio/") and self.path.endswith(".wav"):
+                    audio = server._audio(self.path[len("/audio/"):-len(".wav")])
+                    if audio is None:
+                        return self._send_json(None)
+                    return self._send(200, audio, "audio/wav")
+                self._send_json(None)
+
+        return Handler
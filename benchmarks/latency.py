@@ -0,0 +1,84 @@
+"""
+Latency distributions and percentile summaries for the benchmarks.
+
+Distributions are written as short specs so they can be passed on the
+command line:
+
+    0.5                  constant 0.5 s
+    uniform:0.3:0.9      uniform between 0.3 s and 0.9 s
+    normal:0.5:0.1       normal with mean 0.5 s and std 0.1 s (clamped at 0)
+    lognormal:0.8:0.4    log-normal with median 0.8 s and sigma 0.4
+    exp:0.5              exponential with mean 0.5 s
+"""
+
+import math
+import random
+
+
+def parse_latency(spec, rng=None):
+    """
+    Turn a distribution spec into a sampler.
+
+    Args:
+        spec (str): Distribution spec (see module docstring)
+        rng (random.Random): Random source, for reproducible runs
+
+    Returns:
+        callable: ``sample() -> seconds``
+    """
+    rng = rng or random.Random()
+    kind, _, params = str(spec).partition(":")
+    try:
+        if not params:
+            value = float(kind)
+            return lambda: value
+        args = [float(p) for p in params.split(":")]
+        if kind == "const":
+            return lambda: args[0]
+        if kind == "uniform":
+            return lambda: rng.uniform(args[0], args[1])
+        if kind == "normal":
+            return lambda: max(0.0, rng.gauss(args[0], args[1]))
+        if kind == "lognormal":
+            mu = math.log(args[0])
+            return lambda: rng.lognormvariate(mu, args[1])
+        if kind == "exp":
+            return lambda: rng.expovariate(1.0 / args[0])
+    except (ValueError, IndexError):
+        pass
+    raise ValueError(f"Invalid latency spec: {spec!r}")
+
+
+def percentile(values, pct):
+    """
+    Linear-interpolated percentile of ``values``.
+
+    Returns:
+        float: The percentile, or None if there are no values
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = math.floor(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values, digits=4):
+    """
+    Summarize a list of durations.
+
+    Returns:
+        dict: ``count``, ``mean``, ``p50``, ``p95``, ``p99`` and ``max`` in seconds
+    """
+    if not values:
+        return {"count": 0, "mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), digits),
+        "p50": round(percentile(values, 50), digits),
+        "p95": round(percentile(values, 95), digits),
+        "p99": round(percentile(values, 99), digits),
+        "max": round(max(values), digits),
+    }
@@ -0,0 +1,36 @@
+"""
+Streamlit-free core of SimpleSpeechAI: the STT -> LLM -> TTS speech loop.
+
+Names are imported on first access, so ``import simple_speech_ai`` (and
+any submodule) stays cheap for the apps' first render and for CLIs.
+"""
+
+import importlib
+
+_EXPORTS = {
+    "Conversation": "simple_speech_ai.pipeline",
+    "Pipeline": "simple_speech_ai.pipeline",
+    "PipelineConfig": "simple_speech_ai.config",
+    "SpokenSentence": "simple_speech_ai.pipeline",
+    "TextDelta": "simple_speech_ai.pipeline",
+}
+
+__all__ = [
+    "Conversation",
+    "Pipeline",
+    "PipelineConfig",
+    "SpokenSentence",
+    "TextDelta",
+]
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,150 @@
+"""
+Pieces the two Streamlit apps share: reading the API keys, the sidebar
+statistics and paging through the conversation history.
+
+Streamlit is imported inside the functions that draw, so importing this
+module does not need it.
+"""
+
+import os
+
+from simple_speech_ai import ratelimit
+from simple_speech_ai.config import DEFAULT_ACTOR_ID, PipelineConfig
+
+
+class MissingAPIKeyError(Exception):
+    """
+    Raised when a key the configured providers need is not set.
+    """
+
+    def __init__(self, missing):
+        self.missing = missing
+        names = " and ".join(missing)
+        super().__init__(f"{names} {'is' if len(missing) == 1 else 'are'} missing. "
+                         f"Please set {'it' if len(missing) == 1 else 'them'} in your .env file "
+                         "or Streamlit secrets.")
+
+
+def required_keys():
+    """
+    Names of the API keys the configured providers need.
+
+    The OpenAI key is always needed (replies); the Typecast key only when
+    ``TTS_PROVIDER`` or ``TTS_HEDGE_PROVIDER`` is ``typecast``.
+
+    Returns:
+        list: Environment variable names
+    """
+    providers = (os.getenv("TTS_PROVIDER") or PipelineConfig.tts_provider, os.getenv("TTS_HEDGE_PROVIDER"))
+    required = ["OPENAI_API_KEY"]
+    if "typecast" in providers:
+        required.append("TYPECAST_API_KEY")
+    return required
+
+
+def load_api_keys(secrets=None):
+    """
+    Read the API keys from the ``.env`` file, environment variables or ``secrets``.
+
+    Args:
+        secrets: Mapping consulted for keys the environment does not set,
+            e.g. ``st.secrets``
+
+    Returns:
+        dict: ``openai_api_key``, ``typecast_api_key`` and ``typecast_actor_id``
+
+    Raises:
+        MissingAPIKeyError: If a key in :func:`required_keys` is set nowhere
+    """
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    def lookup(name):
+        value = os.getenv(name)
+        if not value and secrets is not None:
+            value = secrets.get(name)
+        return value or None
+
+    keys = {
+        "openai_api_key": lookup("OPENAI_API_KEY"),
+        "typecast_api_key": lookup("TYPECAST_API_KEY"),
+        "typecast_actor_id": lookup("TYPECAST_ACTOR_ID") or DEFAULT_ACTOR_ID,
+    }
+    missing = [name for name in required_keys() if not keys[name.lower()]]
+    if missing:
+        raise MissingAPIKeyError(missing)
+    return keys
+
+
+def show_stats(pipeline, conversation):
+    """
+    Draw the prompt size, cache, audio store and rate-limit counters, and the
+    latency breakdown of the last turn on request, in the sidebar.
+    """
+    import streamlit as st
+
+    sidebar = st.sidebar
+    report = conversation.context.last_report
+    if report:
+        sidebar.caption(f"Prompt: {report['prompt_tokens']} tokens (full history: {report['full_history_tokens']})")
+
+    cache_stats = pipeline.tts.stats()
+    if "hits" in cache_stats:
+        sidebar.caption(f"Voice cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+                        f"({cache_stats['bytes'] / (1024 * 1024):.1f} MB)")
+    if "hedged" in cache_stats:
+        sidebar.caption(f"Hedged voice requests: {cache_stats['hedged']} of {cache_stats['requests']} "
+                        f"after {cache_stats['hedge_delay_s']:.2f}s, backup won {cache_stats['backup_wins']}")
+    if pipeline.response_cache is not None:
+        answer_stats = pipeline.response_cache.stats()
+        sidebar.caption(f"Answer cache: {answer_stats['hits']} hits / {answer_stats['misses']} misses "
+                        f"({answer_stats['entries']} answers)")
+    store_stats = pipeline.audio_store.stats()
+    sidebar.caption(f"Audio files: {store_stats['files']} ({store_stats['bytes'] / (1024 * 1024):.1f} MB), "
+                    f"{store_stats['evicted_age'] + store_stats['evicted_bytes']} expired, "
+                    f"{store_stats['released']} deleted with their session")
+    for endpoint, limit_stats in ratelimit.stats().items():
+        sidebar.caption(f"{endpoint}: {limit_stats['queued']} queued, "
+                        f"avg wait {limit_stats['wait_avg_s']:.2f}s (max {limit_stats['wait_max_s']:.2f}s)")
+
+    # Per-stage timings of the last turn
+    if sidebar.checkbox("Show latency breakdown", key="show_timings"):
+        trace = conversation.last_trace
+        if trace and trace.spans:
+            sidebar.caption(f"Last turn: {trace.elapsed():.2f}s")
+            for stage, count, total in trace.breakdown():
+                times = f" ×{count}" if count > 1 else ""
+                sidebar.caption(f"{stage}{times}: {total:.2f}s")
+        else:
+            sidebar.caption("No timings yet.")
+
+
+def _show_earlier_turns(page_turns):
+    import streamlit as st
+    st.session_state.history_shown += page_turns
+
+
+def show_history(conversation, page_turns):
+    """
+    Draw the latest ``page_turns`` turns of ``conversation``, with a button
+    that shows ``page_turns`` earlier ones each time it is pressed.
+    """
+    import streamlit as st
+
+    if "history_shown" not in st.session_state:
+        st.session_state.history_shown = page_turns
+    hidden = len(conversation.history) - st.session_state.history_shown
+    if hidden > 0:
+        st.button(f"Show earlier turns ({hidden})", on_click=_show_earlier_turns, args=(page_turns,))
+    for message in conversation.recent(st.session_state.history_shown):
+        st.chat_message("user").write(message["user"])
+        if "assistant" in message:
+            st.chat_message("assistant").write(message["assistant"])
+
+
+def reset_history():
+    """
+    Show only the latest page of turns again, e.g. after clearing the conversation.
+    """
+    import streamlit as st
+    st.session_state.pop("history_shown", None)
@@ -0,0 +1,208 @@
+"""
+Small HTTP server that streams clips from the audio directory to the browser.
+
+Passing a file path to ``st.audio`` makes Streamlit read the whole clip into
+memory and push it through its own media endpoint. Serving the directory
+over HTTP instead keeps memory flat: finished files are sent in chunks with
+HTTP range support (so players can seek), and clips that are still being
+downloaded (``<name>.part``) are streamed progressively while they grow, so
+playback can start before the download has finished.
+"""
+
+import mimetypes
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHUNK_SIZE = 64 * 1024
+PARTIAL_SUFFIX = ".part"
+
+AUDIO_TYPES = {
+    ".wav": "audio/wav",
+    ".mp3": "audio/mpeg",
+    ".ogg": "audio/ogg",
+    ".opus": "audio/ogg",
+}
+
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+def content_type(path):
+    """Return the MIME type used to serve ``path``."""
+    ext = os.path.splitext(path)[1].lower()
+    return AUDIO_TYPES.get(ext) or mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+class AudioServer:
+    """
+    Serve one directory of audio clips.
+
+    Args:
+        directory (str): Directory to serve (only files directly inside it)
+        host (str): Interface to bind
+        port (int): Port to bind; 0 picks a free one
+        public_url (str): Base URL the browser should use, e.g. when the
+            server sits behind a reverse proxy; defaults to ``http://host:port``
+        growth_timeout (float): Seconds to wait for a partial file to grow
+            before giving up on it
+    """
+
+    def __init__(self, directory="./audio_files", host="127.0.0.1", port=0, public_url=None, growth_timeout=30.0):
+        self.directory = os.path.abspath(directory)
+        self.growth_timeout = growth_timeout
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+        if public_url:
+            self.public_url = public_url.rstrip("/")
+        else:
+            bound_host, bound_port = self._httpd.server_address[:2]
+            self.public_url = f"http://{bound_host}:{bound_port}"
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build and start a server from a :class:`simple_speech_ai.config.PipelineConfig`.
+
+        Returns:
+            AudioServer: Running server, or None if no port is configured
+        """
+        if not config.audio_server_port:
+            return None
+        return cls(
+            config.audio_dir,
+            host=config.audio_server_host,
+            port=config.audio_server_port,
+            public_url=config.audio_server_public_url
+        ).start()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def url_for(self, path):
+        """
+        Return the URL that plays ``path``.
+
+        The file does not have to exist yet; a matching ``.part`` file that is
+        still being downloaded is streamed as it grows.
+        """
+        return f"{self.public_url}/{os.path.basename(path)}"
+
+    def _resolve(self, url_path):
+        name = url_path.split("?", 1)[0].lstrip("/")
+        if not name or "/" in name or "\\" in name or name.startswith("."):
+            return None
+        return os.path.join(self.directory, name)
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_HEAD(self):
+                self._serve(send_body=False)
+
+            def do_GET(self):
+                self._serve(send_body=True)
+
+            def _serve(self, send_body):
+                path = server._resolve(self.path)
+                if path and os.path.isfile(path):
+                    return self._send_file(path, send_body)
+                if path and os.path.isfile(path + PARTIAL_SUFFIX):
+                    return self._send_growing(path, send_body)
+                self.send_error(404)
+
+            def _send_file(self, path, send_body):
+                size = os.path.getsize(path)
+                start, end = 0, size - 1
+                match = _RANGE.match(self.headers.get("Range", ""))
+                if match and (match.group(1) or match.group(2)):
+                    if match.group(1):
+                        start = int(match.group(1))
+                        end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+                    else:
+                        start = max(0, size - int(match.group(2)))
+                    if start > end:
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{size}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+                else:
+                    self.send_response(200)
+
+                length = end - start + 1
+                self.send_header("Content-Type", content_type(path))
+                self.send_header("Accept-Ranges", "bytes")
+                self.send_header("Content-Length", str(length))
+                self.end_headers()
+                if not send_body:
+                    return
+
+                with open(path, "rb") as f:
+                    f.seek(start)
+                    while length > 0:
+                        chunk = f.read(min(CHUNK_SIZE, length))
+                        if not chunk:
+                            break
+                        self.wfile.write(chunk)
+                        length -= len(chunk)
+
+            def _send_growing(self, path, send_body):
+                partial = path + PARTIAL_SUFFIX
+                try:
+                    f = open(partial, "rb")
+                except FileNotFoundError:
+                    # Finished between the check and the open
+                    return self._send_file(path, send_body) if os.path.isfile(path) else self.send_error(404)
+
+                with f:
+                    self.send_response(200)
+                    self.send_header("Content-Type", content_type(path))
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    if not send_body:
+                        self.wfile.write(b"0\r\n\r\n")
+                        return
+
+                    # The downloader renames the .part file when it is done. Our
+                    # handle keeps pointing at the same data, so read until the
+                    # rename has happened and the file is exhausted.
+                    last_growth = time.monotonic()
+                    while True:
+                        chunk = f.read(CHUNK_SIZE)
+                        if chunk:
+                            self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                            last_growth = time.monotonic()
+                            continue
+                        if not os.path.exists(partial):
+                            if not os.path.exists(path):
+                                # Removed instead of renamed: the turn was cancelled.
+                                # Drop the connection so the player stops.
+                                self.close_connection = True
+                                return
+                            rest = f.read()
+                            if rest:
+                                self.wfile.write(b"%x\r\n%s\r\n" % (len(rest), rest))
+                            break
+                        if time.monotonic() - last_growth > server.growth_timeout:
+                            break
+                        time.sleep(0.05)
+                    self.wfile.write(b"0\r\n\r\n")
+
+        return Handler
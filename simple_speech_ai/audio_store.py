@@ -0,0 +1,255 @@
+"""
+Retention for the audio directory.
+
+Every reply leaves WAV files in the audio directory. :class:`AudioStore`
+keeps it bounded:
+
+- clips are registered to the session that asked for them and deleted when
+  the session ends or its conversation is cleared
+- a background sweeper deletes files older than the age limit, then the
+  oldest files until the directory fits the byte limit
+
+Cached clips (see :mod:`simple_speech_ai.tts_cache`) are shared between
+sessions, so they are never deleted on a session's behalf; the cache's own
+budget and the sweeper's quotas apply to them. Cache hits refresh a clip's
+modification time, so the sweeper removes the least recently used first.
+The phrase bank (see :mod:`simple_speech_ai.phrase_bank`) is built offline
+and is never swept. Clips of replies in the answer cache (see
+:mod:`simple_speech_ai.response_cache`) are hard links named
+``answer_...`` (:meth:`AudioStore.share`), so they outlive the session that
+first spoke them and are left to the sweeper as well.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from simple_speech_ai.audio_server import PARTIAL_SUFFIX
+from simple_speech_ai.phrase_bank import MANIFEST_NAME, PHRASE_PREFIX
+from simple_speech_ai.tts_cache import CACHE_PREFIX
+
+logger = logging.getLogger(__name__)
+
+ANSWER_PREFIX = "answer_"
+
+
+class AudioStore:
+    """
+    Per-session ownership and global quotas for an audio directory.
+
+    The store is safe to share between sessions and threads.
+
+    Args:
+        directory (str): Directory holding the clips
+        max_age (float): Seconds a file may stay unmodified; None for no limit
+        max_bytes (int): Total size allowed; None for no limit
+        sweep_interval (float): Seconds between background sweeps
+    """
+
+    def __init__(self, directory="./audio_files", max_age=None, max_bytes=None, sweep_interval=300.0):
+        self.directory = directory
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self._sessions = {}
+        self._files = 0
+        self._bytes = 0
+        self._evicted = {"age": 0, "bytes": 0, "released": 0}
+        self._sweeps = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build the store for ``config.audio_dir`` and start its sweeper.
+
+        Returns:
+            AudioStore: Running store
+        """
+        return cls(
+            config.audio_dir,
+            max_age=config.audio_max_age_seconds,
+            max_bytes=config.audio_max_bytes,
+            sweep_interval=config.audio_sweep_interval
+        ).start()
+
+    def add(self, session_id, path):
+        """
+        Register ``path`` as belonging to ``session_id``.
+
+        Cached clips and files outside the directory are ignored.
+        """
+        if not path or session_id is None or not self._owned(path):
+            return
+        with self._lock:
+            self._sessions.setdefault(session_id, set()).add(os.path.abspath(path))
+
+    def _owned(self, path):
+        name = os.path.basename(path)
+        return (os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.directory)
+                and not name.startswith((CACHE_PREFIX, PHRASE_PREFIX, ANSWER_PREFIX)))
+
+    def share(self, path):
+        """
+        Link a session's clip under a shared name, which no session owns.
+
+        Clips that are shared already, or outside the directory, are
+        returned as they are.
+
+        Returns:
+            str: Path of the shared clip, or None if it cannot be linked
+        """
+        if not path or not self._owned(path):
+            return path
+        shared = os.path.join(self.directory, ANSWER_PREFIX + os.path.basename(path))
+        try:
+            os.link(path, shared)
+        except FileExistsError:
+            pass
+        except OSError as e:
+            logger.warning("Could not link %s for the answer cache: %s", path, e)
+            return None
+        return shared
+
+    def release(self, session_id):
+        """
+        Delete the files registered to ``session_id``.
+
+        Files still being downloaded are left to the sweeper.
+
+        Returns:
+            int: Number of files deleted
+        """
+        with self._lock:
+            paths = self._sessions.pop(session_id, set())
+        deleted = 0
+        freed = 0
+        for path in paths:
+            if os.path.exists(path + PARTIAL_SUFFIX):
+                continue
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except OSError:
+                continue
+            deleted += 1
+            freed += size
+        with self._lock:
+            self._evicted["released"] += deleted
+            self._files = max(0, self._files - deleted)
+            self._bytes = max(0, self._bytes - freed)
+        return deleted
+
+    def sweep(self):
+        """
+        Apply the age and byte limits once.
+
+        Abandoned ``.part`` files count towards the age limit only.
+
+        Returns:
+            int: Number of files deleted
+        """
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith(PHRASE_PREFIX) or entry.name == MANIFEST_NAME:
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        expired = []
+        kept = []
+        for mtime, size, path in entries:
+            if self.max_age is not None and now - mtime > self.max_age:
+                expired.append(path)
+            elif not path.endswith(PARTIAL_SUFFIX):
+                kept.append((mtime, size, path))
+
+        total = sum(size for _, size, _ in kept)
+        over_budget = []
+        if self.max_bytes is not None:
+            for mtime, size, path in sorted(kept):
+                if total <= self.max_bytes:
+                    break
+                # Clips still being written are needed by a player right now
+                if os.path.exists(path + PARTIAL_SUFFIX):
+                    continue
+                over_budget.append(path)
+                total -= size
+
+        deleted = {"age": self._remove(expired), "bytes": self._remove(over_budget)}
+        with self._lock:
+            self._files = len(kept) - deleted["bytes"]
+            self._bytes = total
+            self._sweeps += 1
+            for reason, count in deleted.items():
+                self._evicted[reason] += count
+        return deleted["age"] + deleted["bytes"]
+
+    @staticmethod
+    def _remove(paths):
+        removed = 0
+        for path in paths:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def start(self):
+        """
+        Sweep now and then every ``sweep_interval`` seconds on a daemon thread.
+
+        Returns:
+            AudioStore: self
+        """
+        if self._thread is None and self.sweep_interval:
+            self._thread = threading.Thread(target=self._run, name="audio-sweeper", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Audio sweep of %s failed", self.directory)
+            if self._stop.wait(self.sweep_interval):
+                return
+
+    def stats(self):
+        """
+        Return store counters. Size figures are measured by the last sweep
+        and lowered by releases since.
+
+        Returns:
+            dict: files, bytes, sessions, evicted_age, evicted_bytes, released and sweeps
+        """
+        with self._lock:
+            return {
+                "files": self._files,
+                "bytes": self._bytes,
+                "sessions": len(self._sessions),
+                "evicted_age": self._evicted["age"],
+                "evicted_bytes": self._evicted["bytes"],
+                "released": self._evicted["released"],
+                "sweeps": self._sweeps
+            }
+
+    def close(self):
+        """Stop the background sweeper."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
@@ -0,0 +1,234 @@
+"""
+Batch mode: run the speech loop over many inputs without a browser.
+
+    python -m simple_speech_ai.batch conversations.jsonl --output results.jsonl --audio-dir batch_audio
+    python -m simple_speech_ai.batch recordings/ --output results.jsonl --language ko
+
+The input is either a JSONL file with one item per line, or a directory of
+recordings (one single-turn item per file). An item is one of:
+
+    {"id": "q1", "text": "중앙도서관 어케 가노?"}
+    {"id": "c7", "turns": ["할매 왔다", "버스 몇 번 타노?"]}
+    {"id": "r3", "audio": "recordings/r3.wav"}
+
+Items run on a bounded worker pool, each on its own :class:`Conversation`,
+at ``BATCH`` priority: they draw from the rate limits of
+:mod:`simple_speech_ai.ratelimit` only when no interactive turn in the
+process is waiting, and with ``--rate-limit-dir`` they share the quota of
+app processes on the same host. Each finished item is appended to the
+output as one JSON line and flushed, so the output doubles as the
+checkpoint: a rerun with the same output skips items that already
+succeeded and retries the failed ones (readers should keep the last line
+per ID).
+
+Clips go to their own ``--audio-dir``, never the apps' ``AUDIO_DIR``, and
+are kept: the batch pipeline runs without the age and size limits of
+:class:`simple_speech_ai.audio_store.AudioStore`, so neither the run nor a
+running app deletes the other's files.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from simple_speech_ai import prompts
+from simple_speech_ai.config import PipelineConfig
+from simple_speech_ai.pipeline import Pipeline
+from simple_speech_ai.ratelimit import BATCH, priority
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".m4a", ".ogg", ".oga", ".webm", ".flac")
+PROMPTS = {
+    "assistant": prompts.ASSISTANT_PROMPT,
+    "bilingual": prompts.BILINGUAL_PROMPT,
+    "gyeongsang": prompts.GYEONGSANG_PROMPT,
+}
+
+
+def read_items(source):
+    """
+    Yield the items of a JSONL file or a directory of recordings.
+
+    Yields:
+        dict: Item with an ``id`` and ``text``, ``turns`` or ``audio``
+    """
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.lower().endswith(AUDIO_EXTENSIONS):
+                yield {"id": name, "audio": os.path.join(source, name)}
+        return
+    with open(source, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            item.setdefault("id", str(number))
+            yield item
+
+
+def completed_ids(output):
+    """Return the IDs that already succeeded in an earlier run's output."""
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # Torn last line of an interrupted run
+                continue
+            if result.get("error"):
+                done.discard(str(result["id"]))
+            else:
+                done.add(str(result["id"]))
+    return done
+
+
+def load_audio(path):
+    from pydub import AudioSegment
+    return AudioSegment.from_file(path)
+
+
+def process_item(pipeline, item, speak=True, language=None):
+    """
+    Run every turn of one item on a fresh conversation.
+
+    Returns:
+        dict: Result line for the output
+    """
+    with priority(BATCH):
+        return _process(pipeline, item, speak, language)
+
+
+def _process(pipeline, item, speak, language):
+    conversation = pipeline.new_conversation()
+    result = {"id": item["id"], "turns": [], "error": None}
+    started = time.perf_counter()
+    try:
+        if "audio" in item:
+            with pipeline.turn(conversation) as trace:
+                transcription = pipeline.transcribe(load_audio(item["audio"]), language=language)
+            result["stt"] = {name: round(total, 4) for name, _, total in trace.breakdown()}
+            turns = [transcription.text]
+        elif "turns" in item:
+            turns = item["turns"]
+        else:
+            turns = [item["text"]]
+
+        for user_input in turns:
+            with pipeline.turn(conversation) as trace:
+                reply = pipeline.respond(conversation, user_input)
+                # Not registered to the conversation: the clips outlive it
+                audio_file = pipeline.speak(reply) if speak else None
+            result["turns"].append({
+                "user": user_input,
+                "reply": reply,
+                "audio_file": audio_file,
+                "stages": {name: round(total, 4) for name, _, total in trace.breakdown()},
+            })
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def run(pipeline, items, output, workers=4, speak=True, language=None, progress=None):
+    """
+    Process ``items`` on a worker pool, appending results to ``output`` as they finish.
+
+    At most ``2 * workers`` items are in flight, so large inputs are read lazily.
+
+    Returns:
+        dict: Counts of processed, failed and skipped items
+    """
+    done = completed_ids(output)
+    counts = {"processed": 0, "failed": 0, "skipped": 0}
+    pending = set()
+    with open(output, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=workers) as executor:
+
+        def drain():
+            finished, still_pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                result = future.result()
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                counts["failed" if result["error"] else "processed"] += 1
+                if progress:
+                    progress(result, counts)
+            return still_pending
+
+        for item in items:
+            if str(item["id"]) in done:
+                counts["skipped"] += 1
+                continue
+            while len(pending) >= 2 * workers:
+                pending = drain()
+            pending.add(executor.submit(process_item, pipeline, item, speak, language))
+        while pending:
+            pending = drain()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the speech loop over a JSONL file or a directory "
+                                                 "of recordings.")
+    parser.add_argument("source", help="JSONL file of items or directory of recordings")
+    parser.add_argument("--output", required=True, help="Result JSONL; also the resume checkpoint")
+    parser.add_argument("--workers", type=int, default=4, help="Items processed concurrently")
+    parser.add_argument("--openai-rpm", type=float, help="OpenAI chat and transcription requests per minute")
+    parser.add_argument("--typecast-rpm", type=float, help="Typecast job submissions per minute")
+    parser.add_argument("--typecast-poll-rpm", type=float, help="Typecast status polls per minute")
+    parser.add_argument("--rate-limit-dir", help="Share rate limits with other processes through this directory")
+    parser.add_argument("--prompt", choices=sorted(PROMPTS), default="gyeongsang")
+    parser.add_argument("--prompt-file", help="System prompt file; overrides --prompt")
+    parser.add_argument("--model", help="Chat model")
+    parser.add_argument("--language", help="Recording language (ISO code); auto-detected if omitted")
+    parser.add_argument("--audio-dir", help="Where synthesized clips are written and kept; required unless "
+                                            "--no-speech, and not the apps' AUDIO_DIR")
+    parser.add_argument("--no-speech", action="store_true", help="Skip text-to-speech")
+    args = parser.parse_args()
+
+    app_audio_dir = os.getenv("AUDIO_DIR") or PipelineConfig.audio_dir
+    if not args.no_speech and not args.audio_dir:
+        parser.error("--audio-dir is required unless --no-speech is given")
+    if args.audio_dir and os.path.abspath(args.audio_dir) == os.path.abspath(app_audio_dir):
+        parser.error(f"--audio-dir must not be the apps' audio directory ({app_audio_dir})")
+
+    if args.prompt_file:
+        with open(args.prompt_file, encoding="utf-8") as f:
+            system_prompt = f.read()
+    else:
+        system_prompt = PROMPTS[args.prompt]
+    # Without --audio-dir nothing is synthesized; the empty store still needs a directory of its own
+    audio_dir = args.audio_dir or os.path.join(os.path.dirname(os.path.abspath(args.output)), "batch_audio")
+    # No retention limits and no sweeper: the clips are the batch's results
+    config = PipelineConfig.from_env(system_prompt=system_prompt, chat_model=args.model,
+                                     audio_dir=audio_dir, audio_max_age_hours=0, audio_max_mb=0,
+                                     audio_sweep_interval=0, openai_chat_rpm=args.openai_rpm,
+                                     openai_stt_rpm=args.openai_rpm, typecast_submit_rpm=args.typecast_rpm,
+                                     typecast_poll_rpm=args.typecast_poll_rpm, rate_limit_dir=args.rate_limit_dir)
+    pipeline = Pipeline(config)
+
+    started = time.perf_counter()
+
+    def progress(result, counts):
+        finished = counts["processed"] + counts["failed"]
+        rate = finished / (time.perf_counter() - started)
+        status = result["error"] or "ok"
+        print(f"[{finished}] {result['id']}: {status} ({result['seconds']}s, {rate:.2f} items/s)",
+              file=sys.stderr)
+
+    try:
+        counts = run(pipeline, read_items(args.source), args.output, workers=args.workers,
+                     speak=not args.no_speech, language=args.language, progress=progress)
+    finally:
+        pipeline.close()
+    print(json.dumps(counts), file=sys.stderr)
+    sys.exit(1 if counts["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Session-scoped cancellation for the asyncio engine.
+
+Every task the engine starts for a session (the turn itself, its sentence
+syntheses and progressive downloads that outlive the turn) is registered in
+the session's :class:`CancelScope`. When the user speaks or types again,
+cancelling the scope aborts the superseded turn's chat stream, polls and
+downloads in one go. The scope is found through a context variable, so
+tasks created inside a scoped coroutine are picked up by :func:`track`
+without passing it around.
+"""
+
+import contextvars
+import threading
+from contextlib import contextmanager
+
+_current = contextvars.ContextVar("simple_speech_ai_cancel_scope", default=None)
+
+
+class CancelScope:
+    """
+    Unfinished tasks started on behalf of one session.
+    """
+
+    def __init__(self):
+        self._tasks = set()
+        self._lock = threading.Lock()
+        self.cancelled = 0
+
+    def add(self, task):
+        with self._lock:
+            self._tasks.add(task)
+        task.add_done_callback(self._discard)
+
+    def _discard(self, task):
+        with self._lock:
+            self._tasks.discard(task)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._tasks)
+
+    def cancel(self):
+        """
+        Cancel every unfinished task. Must be called on the tasks' event loop.
+
+        Returns:
+            int: Number of tasks cancelled
+        """
+        with self._lock:
+            tasks = list(self._tasks)
+        count = sum(1 for task in tasks if task.cancel())
+        self.cancelled += count
+        return count
+
+
+def current_scope():
+    """Return the active :class:`CancelScope`, or None."""
+    return _current.get()
+
+
+@contextmanager
+def scoped(scope):
+    """Make ``scope`` current for the duration of the block."""
+    token = _current.set(scope)
+    try:
+        yield scope
+    finally:
+        _current.reset(token)
+
+
+def track(task):
+    """
+    Register ``task`` with the current scope, if any.
+
+    Returns:
+        asyncio.Task: ``task``
+    """
+    scope = _current.get()
+    if scope is not None:
+        scope.add(task)
+    return task
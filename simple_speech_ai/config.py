@@ -0,0 +1,274 @@
+"""
+Configuration for the speech pipeline.
+
+Every setting that used to be hard-coded (and had drifted) in the two
+Streamlit apps lives in :class:`PipelineConfig`. Values come from the
+dataclass defaults, then environment variables, then explicit overrides.
+"""
+
+import os
+from dataclasses import dataclass, fields
+from typing import Optional
+
+from simple_speech_ai.prompts import ASSISTANT_PROMPT
+
+DEFAULT_ACTOR_ID = "606c6b127b9f53b4cd1743f5"  # Default Korean voice
+DEFAULT_SPEAK_URL = "https://typecast.ai/api/speak"
+
+# field name -> environment variable
+ENV_VARS = {
+    "openai_api_key": "OPENAI_API_KEY",
+    "typecast_api_key": "TYPECAST_API_KEY",
+    "typecast_actor_id": "TYPECAST_ACTOR_ID",
+    "openai_base_url": "OPENAI_BASE_URL",
+    "chat_model": "CHAT_MODEL",
+    "openai_timeout": "OPENAI_TIMEOUT",
+    "context_token_budget": "CONTEXT_TOKEN_BUDGET",
+    "context_keep_turns": "CONTEXT_KEEP_TURNS",
+    "summary_model": "SUMMARY_MODEL",
+    "turn_store_path": "TURN_STORE_PATH",
+    "shared_state": "SHARED_STATE",
+    "history_page_turns": "HISTORY_PAGE_TURNS",
+    "response_cache": "RESPONSE_CACHE",
+    "response_cache_threshold": "RESPONSE_CACHE_THRESHOLD",
+    "response_cache_ttl": "RESPONSE_CACHE_TTL",
+    "response_cache_embedder": "RESPONSE_CACHE_EMBEDDER",
+    "stt_model": "STT_MODEL",
+    "stt_engine": "STT_ENGINE",
+    "local_stt_model": "LOCAL_STT_MODEL",
+    "local_stt_compute_type": "LOCAL_STT_COMPUTE_TYPE",
+    "local_stt_workers": "LOCAL_STT_WORKERS",
+    "local_stt_cpu_threads": "LOCAL_STT_CPU_THREADS",
+    "stt_route_max_seconds": "STT_ROUTE_MAX_SECONDS",
+    "stt_route_max_queue": "STT_ROUTE_MAX_QUEUE",
+    "stt_vad": "STT_VAD",
+    "vad_min_speech_ms": "VAD_MIN_SPEECH_MS",
+    "vad_max_pause_ms": "VAD_MAX_PAUSE_MS",
+    "vad_split_seconds": "VAD_SPLIT_SECONDS",
+    "audio_dir": "AUDIO_DIR",
+    "tts_cache_max_mb": "TTS_CACHE_MAX_MB",
+    "tts_provider": "TTS_PROVIDER",
+    "espeak_binary": "ESPEAK_BINARY",
+    "espeak_voice": "ESPEAK_VOICE",
+    "piper_binary": "PIPER_BINARY",
+    "piper_model": "PIPER_MODEL",
+    "tts_hedge_provider": "TTS_HEDGE_PROVIDER",
+    "tts_hedge_quantile": "TTS_HEDGE_QUANTILE",
+    "tts_hedge_max_ratio": "TTS_HEDGE_MAX_RATIO",
+    "phrase_bank": "PHRASE_BANK",
+    "replay": "REPLAY",
+    "audio_max_age_hours": "AUDIO_MAX_AGE_HOURS",
+    "audio_max_mb": "AUDIO_MAX_MB",
+    "audio_sweep_interval": "AUDIO_SWEEP_INTERVAL",
+    "audio_format": "AUDIO_FORMAT",
+    "audio_bitrate": "AUDIO_BITRATE",
+    "transcode_workers": "TRANSCODE_WORKERS",
+    "ffmpeg_binary": "FFMPEG_BINARY",
+    "typecast_speak_url": "TYPECAST_SPEAK_URL",
+    "typecast_pool_size": "TYPECAST_POOL_SIZE",
+    "typecast_connect_timeout": "TYPECAST_CONNECT_TIMEOUT",
+    "typecast_read_timeout": "TYPECAST_READ_TIMEOUT",
+    "typecast_retries": "TYPECAST_RETRIES",
+    "typecast_async_pool_size": "TYPECAST_ASYNC_POOL_SIZE",
+    "audio_server_port": "AUDIO_SERVER_PORT",
+    "audio_server_host": "AUDIO_SERVER_HOST",
+    "audio_server_public_url": "AUDIO_SERVER_PUBLIC_URL",
+    "openai_chat_rpm": "OPENAI_CHAT_RPM",
+    "openai_stt_rpm": "OPENAI_STT_RPM",
+    "typecast_submit_rpm": "TYPECAST_SUBMIT_RPM",
+    "typecast_poll_rpm": "TYPECAST_POLL_RPM",
+    "rate_limit_burst_seconds": "RATE_LIMIT_BURST_SECONDS",
+    "rate_limit_dir": "RATE_LIMIT_DIR",
+    "telemetry_log": "TELEMETRY_LOG",
+    "telemetry_otel": "TELEMETRY_OTEL",
+    "metrics_port": "METRICS_PORT",
+    "metrics_host": "METRICS_HOST",
+}
+
+
+def _parse_bool(value):
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass
+class PipelineConfig:
+    """
+    Settings for the STT, LLM and TTS stages.
+    """
+
+    # Credentials
+    openai_api_key: Optional[str] = None
+    typecast_api_key: Optional[str] = None
+    typecast_actor_id: str = DEFAULT_ACTOR_ID
+
+    # Chat completion
+    chat_model: str = "gpt-4-turbo"
+    system_prompt: str = ASSISTANT_PROMPT
+    temperature: float = 0.7
+    max_tokens: int = 250
+    openai_timeout: float = 30.0
+    openai_base_url: Optional[str] = None
+    context_token_budget: int = 4000
+    context_keep_turns: int = 6
+    summary_model: str = "gpt-3.5-turbo"
+
+    # Conversation turns kept in SQLite, so sessions survive a reconnect (see
+    # simple_speech_ai.turn_store); without a path they live in memory only.
+    # The apps render the history this many turns at a time.
+    turn_store_path: Optional[str] = None
+    history_page_turns: int = 10
+
+    # State shared by every worker process (see simple_speech_ai.shared_state):
+    # "sqlite:///path/state.db" for one host, "redis://host:6379/0" for several.
+    # Holds the turns (unless turn_store_path is set), the voice and reply cache
+    # indexes and the rate-limit buckets.
+    shared_state: Optional[str] = None
+
+    # Replies to repeated questions (see simple_speech_ai.response_cache); the
+    # embedder is "hashing" or a sentence-transformers model name
+    response_cache: bool = False
+    response_cache_threshold: float = 0.9
+    response_cache_ttl: float = 86400.0
+    response_cache_max_entries: int = 1000
+    response_cache_embedder: str = "hashing"
+
+    # Speech to text
+    stt_model: str = "whisper-1"
+    stt_format: str = "wav"
+    stt_downsample: bool = True
+
+    # "api" (Whisper API), "local" (faster-whisper on this machine's CPU) or "auto"
+    # (local for short clips while its queue is short, else the API; see
+    # simple_speech_ai.local_stt)
+    stt_engine: str = "api"
+    local_stt_model: str = "small"
+    local_stt_compute_type: str = "int8"
+    local_stt_workers: int = 2
+    local_stt_cpu_threads: int = 0
+    local_stt_beam_size: int = 1
+    stt_route_max_seconds: float = 15.0
+    stt_route_max_queue: int = 2
+
+    # Silence trimming before upload (see simple_speech_ai.vad)
+    stt_vad: bool = True
+    vad_min_speech_ms: int = 300
+    vad_max_pause_ms: int = 1000
+    vad_split_seconds: float = 0.0
+    vad_silence_db: float = 35.0
+
+    # Text to speech: "typecast", or a local engine that works offline, "espeak"
+    # (espeak-ng) or "piper" (needs piper_model); see simple_speech_ai.local_tts
+    tts_provider: str = "typecast"
+    espeak_binary: str = "espeak-ng"
+    espeak_voice: str = "ko"
+    piper_binary: str = "piper"
+    piper_model: Optional[str] = None
+    # Hedged requests (see simple_speech_ai.hedging): a text the provider has not
+    # spoken within this quantile of its recent latencies is also sent to
+    # tts_hedge_provider, which may be the same provider, and the first clip wins.
+    # At most tts_hedge_max_ratio of the requests are hedged.
+    tts_hedge_provider: Optional[str] = None
+    tts_hedge_quantile: float = 0.9
+    tts_hedge_max_ratio: float = 0.15
+    tts_hedge_min_samples: int = 20
+    tts_hedge_initial_delay: float = 3.0
+    tts_tempo: float = 1.0
+    tts_volume: int = 100
+    tts_pitch: int = 0
+    tts_model_version: str = "latest"
+    poll_deadline: float = 30.0
+    sentence_workers: int = 3
+    audio_dir: str = "./audio_files"
+    tts_cache_max_mb: int = 500
+    # Serve the persona's fixed phrases from clips built by simple_speech_ai.phrase_bank
+    phrase_bank: bool = True
+    # Answer "say that again", "slower" and "louder" by replaying the last reply's
+    # clips (see simple_speech_ai.replay)
+    replay: bool = True
+    # Job submission endpoint; overridable to run against a local stand-in server
+    typecast_speak_url: str = DEFAULT_SPEAK_URL
+    typecast_pool_size: int = 10
+    typecast_connect_timeout: float = 3.05
+    typecast_read_timeout: float = 15.0
+    typecast_retries: int = 2
+    typecast_async_pool_size: int = 100
+
+    # Audio directory retention (see simple_speech_ai.audio_store); 0 disables a limit
+    audio_max_age_hours: float = 24.0
+    audio_max_mb: int = 2000
+    audio_sweep_interval: float = 300.0
+
+    # Output format for the browser: "wav" as delivered, or "opus"/"mp3" (needs ffmpeg)
+    audio_format: str = "wav"
+    audio_bitrate: str = "32k"
+    transcode_workers: int = 2
+    ffmpeg_binary: str = "ffmpeg"
+
+    # Progressive playback server (disabled unless a port is set)
+    audio_server_port: Optional[int] = None
+    audio_server_host: str = "127.0.0.1"
+    audio_server_public_url: Optional[str] = None
+
+    # Requests per minute per provider endpoint, shared by all sessions (see
+    # simple_speech_ai.ratelimit); 0 disables a limit. With rate_limit_dir set,
+    # processes on the host share the quotas; shared_state takes precedence.
+    openai_chat_rpm: float = 0.0
+    openai_stt_rpm: float = 0.0
+    typecast_submit_rpm: float = 0.0
+    typecast_poll_rpm: float = 0.0
+    rate_limit_burst_seconds: float = 10.0
+    rate_limit_dir: Optional[str] = None
+
+    # Stage timing spans (see simple_speech_ai.telemetry)
+    telemetry_log: Optional[str] = None
+    telemetry_otel: bool = False
+    metrics_port: Optional[int] = None
+    metrics_host: str = "127.0.0.1"
+
+    @classmethod
+    def from_env(cls, **overrides):
+        """
+        Build a config from environment variables (``.env`` is loaded first).
+
+        Args:
+            **overrides: Field values that take precedence over the environment;
+                ``None`` values are ignored
+
+        Returns:
+            PipelineConfig: The configuration
+        """
+        from dotenv import load_dotenv
+        load_dotenv()
+
+        values = {}
+        types = {f.name: f.type for f in fields(cls)}
+        for name, var in ENV_VARS.items():
+            raw = os.getenv(var)
+            if raw is None or raw == "":
+                continue
+            values[name] = _convert(raw, types[name])
+        values.update({k: v for k, v in overrides.items() if v is not None})
+        return cls(**values)
+
+    @property
+    def tts_cache_max_bytes(self):
+        return self.tts_cache_max_mb * 1024 * 1024
+
+    @property
+    def audio_max_age_seconds(self):
+        return self.audio_max_age_hours * 3600 if self.audio_max_age_hours else None
+
+    @property
+    def audio_max_bytes(self):
+        return self.audio_max_mb * 1024 * 1024 if self.audio_max_mb else None
+
+
+def _convert(raw, field_type):
+    text = str(field_type)
+    if "bool" in text:
+        return _parse_bool(raw)
+    if "int" in text:
+        return int(raw)
+    if "float" in text:
+        return float(raw)
+    return raw
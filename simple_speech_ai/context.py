@@ -0,0 +1,240 @@
+"""
+Token-budgeted conversation context with a rolling summary.
+
+Sending the whole conversation on every turn makes prompt size, cost and
+latency grow without limit. :class:`ConversationContext` keeps the last few
+turns verbatim, folds older turns into a running summary that is refreshed
+on a background thread, and drops the oldest verbatim turns if the prompt
+would still exceed the token budget. Each call records how large the prompt
+was compared to sending the full history.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Extra tokens the chat format adds per message
+MESSAGE_OVERHEAD = 4
+
+_encoder = None
+_encoder_loaded = False
+
+# One background worker is enough: summaries are small and infrequent
+_summary_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="context-summary")
+
+
+def _get_encoder():
+    global _encoder, _encoder_loaded
+    if not _encoder_loaded:
+        _encoder_loaded = True
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoder = None
+    return _encoder
+
+
+def count_tokens(text):
+    """
+    Count tokens in ``text``.
+
+    Uses tiktoken when it is installed. Otherwise approximates: about four
+    ASCII characters per token and one token per other character (Hangul
+    syllables are roughly one token each in the GPT-4 tokenizer).
+
+    Returns:
+        int: Token count
+    """
+    encoder = _get_encoder()
+    if encoder is not None:
+        return len(encoder.encode(text))
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+def count_message_tokens(messages):
+    """Count tokens for a list of chat messages, including format overhead."""
+    return sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD for m in messages)
+
+
+def turn_messages(entry):
+    """Convert a history entry ``{"user": ..., "assistant": ...}`` into chat messages."""
+    messages = [{"role": "user", "content": entry["user"]}]
+    if "assistant" in entry:
+        messages.append({"role": "assistant", "content": entry["assistant"]})
+    return messages
+
+
+def turn_tokens(entry):
+    """Count a history entry's prompt tokens, using the counts recorded with the turn when present."""
+    if "user_tokens" not in entry:
+        return count_message_tokens(turn_messages(entry))
+    tokens = entry["user_tokens"] + MESSAGE_OVERHEAD
+    if "assistant" in entry:
+        tokens += entry["assistant_tokens"] + MESSAGE_OVERHEAD
+    return tokens
+
+
+class ConversationContext:
+    """
+    Build budgeted chat prompts from a conversation history.
+
+    The history list itself stays owned by the caller (e.g.
+    :class:`simple_speech_ai.pipeline.Conversation`); this object remembers
+    the running summary and how many turns it covers, and caches each
+    turn's chat messages and token count as the history grows, so building
+    a prompt only touches the new turns and the ones it keeps.
+
+    Args:
+        system_prompt (str): System prompt sent first on every turn
+        token_budget (int): Maximum prompt tokens, system prompt included
+        keep_turns (int): Most recent turns always kept verbatim (budget permitting)
+        summarize (callable): ``summarize(previous_summary, entries) -> str``;
+            called on a background thread. Without it old turns are dropped.
+        summary_batch (int): Number of turns that must have left the verbatim
+            window before the summary is refreshed, to avoid a call per turn
+    """
+
+    def __init__(self, system_prompt, token_budget=4000, keep_turns=6, summarize=None, summary_batch=2):
+        self.system_prompt = system_prompt
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.summarize = summarize
+        self.summary_batch = summary_batch
+        self.summary = ""
+        self.summarized_turns = 0
+        # Token counts of the latest prompt built; older ones are not kept
+        self.last_report = None
+        self._pending = None
+        self._generation = 0
+        self._lock = threading.Lock()
+        # (messages, tokens) per history entry, and their running total
+        self._turns = []
+        self._history_tokens = 0
+
+    def reset(self):
+        """Forget the summary, e.g. when the conversation is cleared."""
+        with self._lock:
+            self.summary = ""
+            self.summarized_turns = 0
+            self.last_report = None
+            self._pending = None
+            self._generation += 1
+        self._turns = []
+        self._history_tokens = 0
+
+    def _sync(self, history):
+        # Extend the per-turn cache with the turns added since the last call
+        if len(history) < len(self._turns):
+            self._turns = []
+            self._history_tokens = 0
+        for entry in history[len(self._turns):]:
+            tokens = turn_tokens(entry)
+            self._turns.append((turn_messages(entry), tokens))
+            self._history_tokens += tokens
+
+    def build_messages(self, history, user_input):
+        """
+        Build the messages for the next chat completion.
+
+        Args:
+            history (list): Previous turns as ``{"user", "assistant"}`` dicts
+            user_input (str): The new user message
+
+        Returns:
+            list: Chat messages within the token budget
+        """
+        with self._lock:
+            summary = self.summary
+            summarized_turns = min(self.summarized_turns, len(history))
+        self._sync(history)
+
+        head = [{"role": "system", "content": self.system_prompt}]
+        if summary:
+            head.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+        tail = [{"role": "user", "content": user_input}]
+        used = count_message_tokens(head) + count_message_tokens(tail)
+
+        # Add turns newest first. Turns already in the summary are only used
+        # for the guaranteed verbatim window; unsummarized turns are kept
+        # while they fit so nothing is lost before the summary catches up.
+        kept = []
+        for index in range(len(history) - 1, -1, -1):
+            is_recent = len(history) - index <= self.keep_turns
+            if index < summarized_turns and not is_recent:
+                break
+            messages, tokens = self._turns[index]
+            if used + tokens > self.token_budget:
+                break
+            kept[:0] = messages
+            used += tokens
+
+        self._schedule_summary(history)
+
+        full_history_tokens = (count_tokens(self.system_prompt) + MESSAGE_OVERHEAD
+                               + self._history_tokens + count_message_tokens(tail))
+        self.last_report = {
+            "turn": len(history) + 1,
+            "prompt_tokens": used,
+            "full_history_tokens": full_history_tokens,
+            "verbatim_turns": sum(1 for m in kept if m["role"] == "user"),
+            "summarized_turns": summarized_turns
+        }
+        return head + kept + tail
+
+    def _schedule_summary(self, history):
+        # Fold everything older than the verbatim window into the summary
+        target = len(history) - self.keep_turns
+        if self.summarize is None or target <= 0:
+            return
+
+        with self._lock:
+            if target - self.summarized_turns < self.summary_batch or (self._pending and not self._pending.done()):
+                return
+            previous, start = self.summary, self.summarized_turns
+            entries = list(history[start:target])
+            self._pending = _summary_executor.submit(
+                self._refresh_summary, previous, entries, target, self._generation)
+
+    def _refresh_summary(self, previous, entries, target, generation):
+        try:
+            summary = self.summarize(previous, entries)
+        except Exception:
+            # Keep the old summary; the unsummarized turns are retried next turn
+            return
+        with self._lock:
+            if generation == self._generation and self.summarized_turns <= target:
+                self.summary = summary
+                self.summarized_turns = target
+
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a conversation between a user and a voice assistant. "
+    "Update the summary with the new turns. Keep facts the assistant needs later: the user's "
+    "goals, places, times, preferences and anything already explained. Write it in the "
+    "language of the conversation, in at most {max_words} words."
+)
+
+
+def make_summarizer(complete, max_words=150):
+    """
+    Build a ``summarize`` callable on top of a chat model.
+
+    Args:
+        complete (callable): ``complete(messages) -> str``, e.g. a small, fast
+            model through :meth:`simple_speech_ai.llm.ChatModel.complete`
+        max_words (int): Target summary length
+
+    Returns:
+        callable: ``summarize(previous_summary, entries) -> str``
+    """
+    def summarize(previous, entries):
+        transcript = "\n".join(
+            f"{m['role']}: {m['content']}" for entry in entries for m in turn_messages(entry)
+        )
+        return complete([
+            {"role": "system", "content": SUMMARY_INSTRUCTIONS.format(max_words=max_words)},
+            {"role": "user", "content": f"Current summary:\n{previous or '(none)'}\n\nNew turns:\n{transcript}"}
+        ]).strip()
+
+    return summarize
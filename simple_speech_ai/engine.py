@@ -0,0 +1,392 @@
+"""
+Asyncio engine for the speech loop.
+
+:class:`AsyncPipeline` runs the STT -> LLM -> TTS stages as coroutines on
+``AsyncOpenAI`` and an ``httpx`` Typecast client, so a turn that is waiting
+on the network holds no thread. :class:`SpeechEngine` runs one
+:class:`AsyncPipeline` on a shared event loop thread and offers the same
+blocking API as :class:`simple_speech_ai.pipeline.Pipeline`, so Streamlit
+script threads can submit turns into it and cancel a session's work.
+"""
+
+import asyncio
+import queue
+import threading
+import time
+import weakref
+
+from simple_speech_ai.cancellation import CancelScope, scoped, track
+from simple_speech_ai.llm import AsyncOpenAIChat
+from simple_speech_ai.pipeline import Pipeline, TextDelta
+from simple_speech_ai.ratelimit import BACKGROUND, priority
+from simple_speech_ai.speech_stream import AsyncSentencePipeline
+from simple_speech_ai.telemetry import activate, current_trace
+
+_END = object()
+
+
+class EventLoopThread:
+    """
+    An asyncio event loop running forever on a daemon thread.
+
+    Args:
+        name (str): Thread name
+    """
+
+    def __init__(self, name="speech-engine"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro, scope=None):
+        """
+        Schedule ``coro`` on the loop from any other thread.
+
+        The caller's active turn (see :mod:`simple_speech_ai.telemetry`) is
+        carried over, so spans recorded by the coroutine land in it.
+
+        Args:
+            coro: Coroutine to run
+            scope (CancelScope): Scope the task and the tasks it starts are registered in
+
+        Returns:
+            concurrent.futures.Future: Result of the coroutine; cancelling it
+            cancels the task
+        """
+        return asyncio.run_coroutine_threadsafe(self._wrap(coro, current_trace(), scope), self.loop)
+
+    @staticmethod
+    async def _wrap(coro, trace, scope):
+        with activate(trace), scoped(scope):
+            track(asyncio.current_task())
+            return await coro
+
+    def iterate(self, agen, scope=None):
+        """
+        Consume an async generator from a blocking thread.
+
+        Items are handed over through a queue as the generator produces
+        them. Closing the returned generator cancels the task.
+
+        Returns:
+            tuple: ``(generator, future)``; the future can be cancelled from
+            another thread to stop the stream
+        """
+        items = queue.Queue()
+
+        async def pump():
+            try:
+                async for item in agen:
+                    items.put((item, None))
+            except asyncio.CancelledError:
+                items.put((_END, None))
+                raise
+            except BaseException as e:
+                items.put((_END, e))
+                raise
+            else:
+                items.put((_END, None))
+
+        future = self.submit(pump(), scope=scope)
+
+        def consume():
+            try:
+                while True:
+                    item, error = items.get()
+                    if item is _END:
+                        if error is not None:
+                            raise error
+                        return
+                    yield item
+            finally:
+                future.cancel()
+
+        return consume(), future
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+
+
+class AsyncPipeline(Pipeline):
+    """
+    STT -> LLM -> TTS pipeline with coroutine stages.
+
+    Must be used from the event loop given as ``loop``; conversation
+    summaries, which run on a background thread, are submitted back into it.
+
+    Args:
+        config (PipelineConfig): Pipeline configuration
+        loop (asyncio.AbstractEventLoop): Loop the pipeline runs on
+        **stages: Overrides as for :class:`simple_speech_ai.pipeline.Pipeline`;
+            ``stt``, ``llm`` and ``tts`` must be async stages
+    """
+
+    asynchronous = True
+    chat_class = AsyncOpenAIChat
+    sentence_class = AsyncSentencePipeline
+
+    def __init__(self, config, loop, **stages):
+        self.loop = loop
+        super().__init__(config, **stages)
+
+    def _summarize(self, messages):
+        # The task copies this thread's context, priority included
+        with priority(BACKGROUND):
+            future = asyncio.run_coroutine_threadsafe(
+                self.llm.complete(messages, model=self.config.summary_model, temperature=0, max_tokens=450),
+                self.loop
+            )
+        return future.result()
+
+    async def transcribe(self, audio, language=None, fmt=None, downsample=None):
+        with self.turn():
+            return await self.stt.transcribe(audio, language=language, fmt=fmt, downsample=downsample)
+
+    async def _lookup(self, conversation, user_input):
+        # Embedding with a local model takes a while, so keep it off the loop
+        if self.response_cache is None:
+            return None
+        return await asyncio.to_thread(super()._lookup, conversation, user_input)
+
+    @staticmethod
+    async def _record(conversation, method, *args):
+        # Writes to a turn store are blocking I/O (SQLite or Redis), so they run off the loop
+        if conversation.store is None:
+            return method(*args)
+        return await asyncio.to_thread(method, *args)
+
+    async def respond(self, conversation, user_input):
+        with self.turn(conversation):
+            cached = await self._lookup(conversation, user_input)
+            if cached is not None:
+                reply = cached.reply
+            else:
+                reply = await self.llm.complete(conversation.build_messages(user_input))
+                await asyncio.to_thread(self._remember, conversation, user_input, reply)
+        await self._record(conversation, conversation.add_turn, user_input, reply)
+        return reply
+
+    async def speak(self, text, on_poll=None, progressive=False, conversation=None):
+        with self.turn():
+            audio_file = await self.tts.synthesize(text, on_poll=on_poll, progressive=progressive)
+        if conversation is not None:
+            self.audio_store.add(conversation.session_id, audio_file)
+            await self._record(conversation, conversation.attach_audio, audio_file)
+        return audio_file
+
+    async def stream_turn(self, conversation, user_input, progressive=False):
+        turn = self._streamed_turn(conversation, progressive)
+        try:
+            with self.turn(conversation):
+                cached = await self._lookup(conversation, user_input)
+                if cached is not None:
+                    yield TextDelta(cached.reply)
+                    clips = turn.cached(cached)
+                    if clips is None:
+                        async for clip in turn.sentences.remaining():
+                            yield turn.clip(clip)
+                    else:
+                        for clip in clips:
+                            yield turn.clip(clip)
+                    return
+
+                async for delta in self.llm.stream(conversation.build_messages(user_input)):
+                    yield turn.text(delta)
+                    for clip in turn.sentences.ready():
+                        yield turn.clip(clip)
+                turn.sentences.close()
+                async for clip in turn.sentences.remaining():
+                    yield turn.clip(clip)
+                await asyncio.to_thread(self._remember, conversation, user_input, turn.reply, turn.spoken)
+        finally:
+            finished = turn.finished()
+            if finished:
+                # Shielded, so a cancelled turn still records what it said
+                await asyncio.shield(self._record(conversation, conversation.add_turn, user_input, *finished))
+
+    async def close(self):
+        """Release network resources held by the stages and the telemetry sinks."""
+        await self.tts.close()
+        if self.openai_client is not None and self.openai_client.built:
+            await self.openai_client.close()
+        self.tracer.close()
+        self.audio_store.close()
+        if self.turn_store is not None:
+            self.turn_store.close()
+
+
+class SpeechEngine:
+    """
+    Blocking front end to an :class:`AsyncPipeline` on a shared event loop.
+
+    Has the same methods as :class:`simple_speech_ai.pipeline.Pipeline`, so
+    the Streamlit apps can use either. Work started for a conversation runs
+    in that conversation's :class:`simple_speech_ai.cancellation.CancelScope`;
+    :meth:`cancel` aborts all of it (the chat stream, Typecast polls and
+    background downloads) without touching other sessions. A blocking call
+    that is abandoned, e.g. because Streamlit stopped the script for a new
+    input, cancels its own work.
+
+    Args:
+        config (PipelineConfig): Pipeline configuration
+        **stages: ``stt``, ``llm``, ``tts``, ``tracer``, ``audio_store``, ``response_cache`` or
+            ``turn_store`` overrides for the pipeline
+    """
+
+    def __init__(self, config, **stages):
+        self.config = config
+        self._scopes = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._loop_thread = EventLoopThread()
+        self.pipeline = self._call(self._create(config, stages))
+        self.tracer = self.pipeline.tracer
+        self.tts = self.pipeline.tts
+        self.audio_store = self.pipeline.audio_store
+        self.response_cache = self.pipeline.response_cache
+        self.turn_store = self.pipeline.turn_store
+
+    async def _create(self, config, stages):
+        # Built on the loop so the async clients bind to it
+        return AsyncPipeline(config, asyncio.get_running_loop(), **stages)
+
+    def _scope(self, conversation):
+        if conversation is None:
+            return None
+        with self._lock:
+            scope = self._scopes.get(conversation)
+            if scope is None:
+                scope = self._scopes[conversation] = CancelScope()
+            return scope
+
+    def _call(self, coro, conversation=None, updates=None, on_update=None):
+        # Run coro on the loop and wait; progress updates queued by the
+        # coroutine are handed to on_update on this thread while waiting
+        future = self._loop_thread.submit(coro, scope=self._scope(conversation))
+        try:
+            while updates is not None and not future.done():
+                try:
+                    on_update(*updates.get(timeout=0.05))
+                except queue.Empty:
+                    pass
+            return future.result()
+        except BaseException:
+            # Nobody is waiting for the result any more
+            future.cancel()
+            raise
+
+    def new_conversation(self, session_id=None):
+        return self.pipeline.new_conversation(session_id)
+
+    def turn(self, conversation=None):
+        return self.pipeline.turn(conversation)
+
+    def transcribe(self, audio, language=None, fmt=None, downsample=None, conversation=None):
+        """
+        Transcribe a recording.
+
+        Args:
+            conversation (Conversation): Session to run the work under, so
+                :meth:`cancel` can stop it
+
+        Returns:
+            Transcription: Text and number of bytes uploaded
+        """
+        return self._call(
+            self.pipeline.transcribe(audio, language=language, fmt=fmt, downsample=downsample),
+            conversation
+        )
+
+    def respond(self, conversation, user_input):
+        return self._call(self.pipeline.respond(conversation, user_input), conversation)
+
+    def speak(self, text, on_poll=None, progressive=False, conversation=None):
+        """
+        Synthesize a whole reply.
+
+        ``on_poll`` is called on the calling thread, so it may update Streamlit elements.
+
+        Returns:
+            str: Path of the audio file
+        """
+        if on_poll is None:
+            return self._call(
+                self.pipeline.speak(text, progressive=progressive, conversation=conversation), conversation
+            )
+        updates = queue.Queue()
+        return self._call(
+            self.pipeline.speak(text, on_poll=lambda *args: updates.put(args), progressive=progressive,
+                                conversation=conversation),
+            conversation, updates=updates, on_update=on_poll
+        )
+
+    def replay(self, conversation, user_input):
+        """
+        Replay the last reply for a repeat, slower or louder request; see
+        :meth:`simple_speech_ai.pipeline.Pipeline.replay`. Runs on the
+        calling thread, since it makes no network calls.
+
+        Returns:
+            Replay: Intent, reply text and clips to play, or None
+        """
+        return self.pipeline.replay(conversation, user_input)
+
+    def stream_turn(self, conversation, user_input, progressive=False):
+        """
+        Stream the reply and speak it sentence by sentence; see
+        :meth:`simple_speech_ai.pipeline.Pipeline.stream_turn`.
+
+        Closing the generator early cancels the rest of the turn.
+
+        Yields:
+            TextDelta or SpokenSentence: Reply text as it streams, and clips
+        """
+        events, _ = self._loop_thread.iterate(
+            self.pipeline.stream_turn(conversation, user_input, progressive=progressive),
+            scope=self._scope(conversation)
+        )
+        try:
+            yield from events
+        finally:
+            events.close()
+
+    def cancel(self, conversation):
+        """
+        Barge-in: cancel everything still running for ``conversation``.
+
+        Call this when the user speaks or types again. The cancellation is
+        recorded on the superseded turn as a ``turn.cancel`` span.
+
+        Returns:
+            int: Number of cancelled tasks
+        """
+        with self._lock:
+            scope = self._scopes.get(conversation)
+        if scope is None:
+            return 0
+        return self._call(self._cancel(scope, conversation.last_trace))
+
+    def release_audio(self, conversation):
+        """
+        Delete the audio files produced for ``conversation``.
+
+        Returns:
+            int: Number of files deleted
+        """
+        return self.pipeline.release_audio(conversation)
+
+    @staticmethod
+    async def _cancel(scope, trace):
+        count = scope.cancel()
+        if count and trace is not None:
+            trace.record("turn.cancel", time.time(), 0.0, {"tasks": count})
+        return count
+
+    def close(self):
+        """Close the pipeline's clients and stop the event loop."""
+        self._call(self.pipeline.close())
+        self._loop_thread.stop()
@@ -0,0 +1,298 @@
+"""
+Hedged text-to-speech requests.
+
+Most Typecast jobs finish in a second or two, but a few take many times
+longer, and those stragglers set the time to first audio of the turns they
+hit. :class:`HedgedTTS` sends a text to the primary provider and, if it has
+not answered within the primary's learned p90, sends the same text to a
+backup (another provider, or the same one again). The first clip wins and
+the other request is cancelled; a clip the loser still produced is deleted,
+after its download if it was progressive.
+
+The thresholds come from a :class:`LatencyHistogram` per provider, fed by
+every request the provider completes; cancelled losers, failures and cache
+hits do not count. Only about one request in ten waits past the p90, and
+``max_ratio`` caps the share of hedged requests, so a provider slowing down
+across the board costs at most that much extra.
+
+Cancelling a Typecast request stops its polling and download; the job
+itself cannot be withdrawn. Local engines (see
+:mod:`simple_speech_ai.local_tts`) are killed.
+"""
+
+import asyncio
+import bisect
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from simple_speech_ai.audio_server import PARTIAL_SUFFIX
+from simple_speech_ai.cancellation import track
+from simple_speech_ai.telemetry import span, submit
+from simple_speech_ai.transcode import SHARED_PREFIXES
+from simple_speech_ai.tts import TextToSpeech
+
+# Longest a losing clip's progressive download is waited for before it is deleted anyway
+DISCARD_TIMEOUT = 120.0
+
+
+class HedgeCancelled(Exception):
+    """Raised from ``on_poll`` to stop the request that lost the race."""
+
+
+class LatencyHistogram:
+    """
+    Latencies of one provider in log-spaced buckets.
+
+    Quantiles can be read at any time for a fixed memory cost. The counts
+    are halved every ``window`` samples, so the quantiles follow how the
+    provider behaves now rather than since start-up.
+
+    Args:
+        min_seconds (float): Upper bound of the first bucket
+        max_seconds (float): Upper bound of the last finite bucket
+        growth (float): Ratio between consecutive bucket bounds
+        window (int): Samples between two halvings of the counts
+    """
+
+    def __init__(self, min_seconds=0.01, max_seconds=120.0, growth=1.05, window=500):
+        bounds = [min_seconds]
+        while bounds[-1] < max_seconds:
+            bounds.append(bounds[-1] * growth)
+        self.bounds = bounds
+        self.window = window
+        self.samples = 0
+        self._counts = [0.0] * (len(bounds) + 1)
+        self._total = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.bounds, seconds)] += 1
+            self._total += 1
+            self.samples += 1
+            if self.samples % self.window == 0:
+                self._counts = [count / 2 for count in self._counts]
+                self._total /= 2
+
+    def quantile(self, q):
+        """
+        Returns:
+            float: Upper bound of the bucket holding the ``q`` quantile, or
+            None before the first sample
+        """
+        with self._lock:
+            if not self._total:
+                return None
+            target = q * self._total
+            cumulative = 0.0
+            for bound, count in zip(self.bounds, self._counts):
+                cumulative += count
+                if cumulative >= target:
+                    return bound
+            return self.bounds[-1]
+
+
+class HedgedTTS(TextToSpeech):
+    """
+    Sends slow texts to a backup provider as well.
+
+    Args:
+        primary (TextToSpeech): Provider every text goes to
+        backup (TextToSpeech): Provider of the hedged request; may be ``primary`` itself
+        quantile (float): Latency quantile of the primary after which to hedge
+        max_ratio (float): Largest share of requests that may be hedged
+        min_samples (int): Primary latencies needed before the learned quantile is used
+        initial_delay (float): Seconds to wait before hedging until then
+        workers (int): Threads running the requests
+    """
+
+    def __init__(self, primary, backup, quantile=0.9, max_ratio=0.15, min_samples=20, initial_delay=3.0,
+                 workers=32):
+        self.primary = primary
+        self.backup = backup
+        self.provider = primary.provider
+        self.quantile = quantile
+        self.max_ratio = max_ratio
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.latency = {}
+        self.requests = 0
+        self.hedged = 0
+        self.backup_wins = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tts-hedge")
+
+    @classmethod
+    def from_config(cls, config, primary, backup):
+        return cls(primary, backup, quantile=config.tts_hedge_quantile, max_ratio=config.tts_hedge_max_ratio,
+                   min_samples=config.tts_hedge_min_samples, initial_delay=config.tts_hedge_initial_delay)
+
+    def histogram(self, provider):
+        """Return the latency histogram of ``provider``."""
+        with self._lock:
+            return self.latency.setdefault(provider, LatencyHistogram())
+
+    def delay(self):
+        """Seconds to wait for the primary before hedging."""
+        histogram = self.histogram(self.primary.provider)
+        if histogram.samples < self.min_samples:
+            return self.initial_delay
+        return histogram.quantile(self.quantile)
+
+    def _start(self):
+        with self._lock:
+            self.requests += 1
+
+    def _take_hedge(self):
+        with self._lock:
+            if self.hedged + 1 > self.max_ratio * self.requests:
+                return False
+            self.hedged += 1
+            return True
+
+    def _won(self, attributes, backup_won):
+        attributes["winner"] = "backup" if backup_won else "primary"
+        if backup_won:
+            with self._lock:
+                self.backup_wins += 1
+
+    @staticmethod
+    def _remove_clip(path):
+        # Deletes a losing clip, unless it is shared, once its download is complete
+        if os.path.basename(path).startswith(SHARED_PREFIXES):
+            return
+        deadline = time.monotonic() + DISCARD_TIMEOUT
+        while os.path.exists(path + PARTIAL_SUFFIX) and time.monotonic() < deadline:
+            time.sleep(0.2)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _discard(self, keep, future):
+        # The loser may still have returned a clip, possibly still downloading
+        if future.cancelled() or future.exception() is not None:
+            return
+        path = future.result()
+        if path != keep:
+            submit(self._executor, self._remove_clip, path)
+
+    def _attempt(self, tts, text, on_poll, progressive, cancelled):
+        def check(elapsed, deadline):
+            if cancelled.is_set():
+                raise HedgeCancelled()
+            if on_poll:
+                on_poll(elapsed, deadline)
+
+        started = time.perf_counter()
+        audio_file = tts.synthesize(text, on_poll=check, progressive=progressive)
+        # Only completed requests are recorded: fast errors would drag the
+        # quantile down, and a cancelled loser's time is not a latency
+        self.histogram(tts.provider).record(time.perf_counter() - started)
+        return audio_file
+
+    def synthesize(self, text, on_poll=None, progressive=False):
+        if self.primary.cached(text):
+            return self.primary.synthesize(text, on_poll=on_poll, progressive=progressive)
+        self._start()
+        delay = self.delay()
+        with span("tts.hedge", provider=self.provider, delay=round(delay, 3)) as attributes:
+            cancelled = {}
+            primary = submit(self._executor, self._attempt, self.primary, text, on_poll, progressive,
+                             cancelled.setdefault("primary", threading.Event()))
+            done, _ = wait([primary], timeout=delay)
+            attributes["hedged"] = not done and self._take_hedge()
+            if not attributes["hedged"]:
+                return primary.result()
+
+            backup = submit(self._executor, self._attempt, self.backup, text, None, progressive,
+                            cancelled.setdefault("backup", threading.Event()))
+            futures = {"primary": primary, "backup": backup}
+            pending = set(futures.values())
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for name, future in futures.items():
+                    if future in done and future.exception() is None:
+                        for other, event in cancelled.items():
+                            if other != name:
+                                event.set()
+                                futures[other].add_done_callback(
+                                    lambda f, keep=future.result(): self._discard(keep, f))
+                        self._won(attributes, name == "backup")
+                        return future.result()
+            # Both failed
+            return primary.result()
+
+    def cached(self, text):
+        return self.primary.cached(text)
+
+    def stats(self):
+        stats = dict(self.primary.stats())
+        with self._lock:
+            stats.update(requests=self.requests, hedged=self.hedged, backup_wins=self.backup_wins)
+        stats["hedge_delay_s"] = round(self.delay(), 3)
+        return stats
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.primary.close()
+        if self.backup is not self.primary:
+            self.backup.close()
+
+
+class AsyncHedgedTTS(HedgedTTS):
+    """
+    :class:`HedgedTTS` over coroutine providers; the requests run as tasks
+    of the session's cancel scope, and the loser is cancelled.
+    """
+
+    async def _attempt_async(self, tts, text, on_poll, progressive):
+        started = time.perf_counter()
+        audio_file = await tts.synthesize(text, on_poll=on_poll, progressive=progressive)
+        self.histogram(tts.provider).record(time.perf_counter() - started)
+        return audio_file
+
+    async def synthesize(self, text, on_poll=None, progressive=False):
+        if self.primary.cached(text):
+            return await self.primary.synthesize(text, on_poll=on_poll, progressive=progressive)
+        self._start()
+        delay = self.delay()
+        with span("tts.hedge", provider=self.provider, delay=round(delay, 3)) as attributes:
+            tasks = {"primary": track(asyncio.ensure_future(self._attempt_async(
+                self.primary, text, on_poll, progressive)))}
+            try:
+                done, _ = await asyncio.wait(tasks.values(), timeout=delay)
+                attributes["hedged"] = not done and self._take_hedge()
+                if not attributes["hedged"]:
+                    return await tasks["primary"]
+
+                tasks["backup"] = track(asyncio.ensure_future(self._attempt_async(
+                    self.backup, text, None, progressive)))
+                pending = set(tasks.values())
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for name, task in tasks.items():
+                        if task in done and not task.cancelled() and task.exception() is None:
+                            for other, loser in tasks.items():
+                                if other == name:
+                                    continue
+                                # Finished in the same round, or cancelled before it returns
+                                if loser.done():
+                                    self._discard(task.result(), loser)
+                                else:
+                                    loser.cancel()
+                            self._won(attributes, name == "backup")
+                            return task.result()
+                return tasks["primary"].result()
+            finally:
+                # The turn was cancelled, e.g. by a barge-in
+                for task in tasks.values():
+                    task.cancel()
+
+    async def close(self):
+        self._executor.shutdown(wait=False)
+        await self.primary.close()
+        if self.backup is not self.primary:
+            await self.backup.close()
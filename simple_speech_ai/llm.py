@@ -0,0 +1,195 @@
+"""
+Chat completion stage.
+"""
+
+import threading
+import time
+
+from simple_speech_ai.ratelimit import RateLimiter
+from simple_speech_ai.telemetry import record, span
+
+
+def create_openai_client(config, client_class=None):
+    """
+    Create an OpenAI client with explicit timeouts, so a hung socket cannot
+    block a session.
+
+    Args:
+        config (PipelineConfig): Pipeline configuration
+        client_class (type): Client class, e.g. ``AsyncOpenAI``; defaults to ``OpenAI``
+
+    Returns:
+        OpenAI: Initialized client
+    """
+    if client_class is None:
+        from openai import OpenAI as client_class
+    return client_class(
+        api_key=config.openai_api_key,
+        base_url=config.openai_base_url,
+        timeout=config.openai_timeout,
+        max_retries=2
+    )
+
+
+class LazyClient:
+    """
+    Stand-in for an OpenAI client that builds it on first use.
+
+    Importing ``openai`` takes the better part of a second, which would
+    otherwise delay the first page of the apps. :meth:`warm` builds the
+    client on a background thread while the page renders; attribute access
+    waits for it if it is not ready yet.
+
+    Args:
+        factory (callable): Builds the client, e.g. ``lambda: create_openai_client(config)``
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def built(self):
+        return self._client is not None
+
+    def get(self):
+        """Return the client, building it if needed."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return self._client
+
+    def warm(self):
+        """Start building the client in the background."""
+        threading.Thread(target=self.get, name="openai-client-warmup", daemon=True).start()
+        return self
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+def lazy_openai_client(config, asynchronous=False):
+    """
+    Return a :class:`LazyClient` for ``OpenAI`` (or ``AsyncOpenAI``) that is
+    already warming up.
+    """
+    def factory():
+        if asynchronous:
+            from openai import AsyncOpenAI
+            return create_openai_client(config, client_class=AsyncOpenAI)
+        return create_openai_client(config)
+    return LazyClient(factory).warm()
+
+
+class ChatModel:
+    """Interface for chat completion stages."""
+
+    def complete(self, messages, **options):
+        """
+        Return the full reply for ``messages``.
+
+        Returns:
+            str: Assistant reply
+        """
+        raise NotImplementedError
+
+    def stream(self, messages, **options):
+        """
+        Yield the reply for ``messages`` as text deltas.
+        """
+        raise NotImplementedError
+
+
+class OpenAIChat(ChatModel):
+    """
+    OpenAI chat completions.
+
+    ``options`` passed to :meth:`complete` or :meth:`stream` (``model``,
+    ``temperature``, ``max_tokens``) override the configured values.
+    Requests wait for the ``openai.chat`` rate limit, if configured.
+
+    Args:
+        client (OpenAI): OpenAI client
+        config (PipelineConfig): Pipeline configuration
+    """
+
+    def __init__(self, client, config):
+        self.client = client
+        self.config = config
+        self.limiter = RateLimiter.from_config(config, "openai.chat")
+
+    def _options(self, options):
+        return {
+            "model": options.get("model") or self.config.chat_model,
+            "temperature": options.get("temperature", self.config.temperature),
+            "max_tokens": options.get("max_tokens") or self.config.max_tokens,
+        }
+
+    def complete(self, messages, **options):
+        options = self._options(options)
+        if self.limiter is not None:
+            self.limiter.acquire()
+        with span("llm.completion", model=options["model"], stream=False):
+            response = self.client.chat.completions.create(messages=messages, **options)
+        return response.choices[0].message.content
+
+    def stream(self, messages, **options):
+        options = self._options(options)
+        if self.limiter is not None:
+            self.limiter.acquire()
+        with span("llm.completion", model=options["model"], stream=True) as attributes:
+            start = time.time()
+            started = time.perf_counter()
+            first = True
+            stream = self.client.chat.completions.create(messages=messages, stream=True, **options)
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if first:
+                        first = False
+                        ttft = time.perf_counter() - started
+                        attributes["ttft"] = round(ttft, 4)
+                        record("llm.first_token", start, ttft, model=options["model"])
+                    yield chunk.choices[0].delta.content
+
+
+class AsyncOpenAIChat(OpenAIChat):
+    """
+    OpenAI chat completions on ``AsyncOpenAI``; :meth:`complete` is a
+    coroutine and :meth:`stream` an async generator.
+
+    Args:
+        client (AsyncOpenAI): Async OpenAI client
+        config (PipelineConfig): Pipeline configuration
+    """
+
+    async def complete(self, messages, **options):
+        options = self._options(options)
+        if self.limiter is not None:
+            await self.limiter.acquire_async()
+        with span("llm.completion", model=options["model"], stream=False):
+            response = await self.client.chat.completions.create(messages=messages, **options)
+        return response.choices[0].message.content
+
+    async def stream(self, messages, **options):
+        options = self._options(options)
+        if self.limiter is not None:
+            await self.limiter.acquire_async()
+        with span("llm.completion", model=options["model"], stream=True) as attributes:
+            start = time.time()
+            started = time.perf_counter()
+            first = True
+            stream = await self.client.chat.completions.create(messages=messages, stream=True, **options)
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        if first:
+                            first = False
+                            ttft = time.perf_counter() - started
+                            attributes["ttft"] = round(ttft, 4)
+                            record("llm.first_token", start, ttft, model=options["model"])
+                        yield chunk.choices[0].delta.content
+            finally:
+                # Drop the HTTP stream right away when the turn is cancelled
+                await stream.close()
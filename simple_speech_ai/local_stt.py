@@ -0,0 +1,309 @@
+"""
+Speech-to-text on the local CPU, and routing between it and the Whisper API.
+
+Every API transcription pays for an upload and a round trip through
+OpenAI's queue, and fails when the network does. :class:`LocalWhisperSTT`
+runs Whisper in-process with faster-whisper (CTranslate2, int8 on CPU):
+
+- the model is loaded once per process and warmed up on a background
+  thread when the pipeline is built (:meth:`LocalWhisperModel.warm`)
+- transcriptions run on a bounded worker pool shared by every session, so
+  concurrent utterances queue instead of oversubscribing the CPU
+- silence trimming and splitting (see :mod:`simple_speech_ai.vad`) and the
+  ``language`` argument work as they do for the API
+
+:class:`STTRouter` sends short clips to the local engine while its queue is
+short and everything else to the API, and falls back to the local engine
+when an API call fails. faster-whisper is an optional dependency
+(``pip install faster-whisper``); it is only imported when a local engine
+is configured.
+"""
+
+import asyncio
+import io
+import logging
+import threading
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+from simple_speech_ai.stt import WHISPER_SAMPLE_RATE, SpeechToText, Transcription, WhisperSTT, join_texts
+from simple_speech_ai.telemetry import span, submit
+from simple_speech_ai.vad import NoSpeechError
+
+logger = logging.getLogger(__name__)
+
+LOCAL = "local"
+API = "api"
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def clip_seconds(audio):
+    """
+    Return the length of a recording in seconds.
+
+    Returns:
+        float: Length, or None for encoded uploads other than WAV
+    """
+    if isinstance(audio, tuple):
+        audio = audio[1] if audio[0].endswith(".wav") else None
+    if audio is None:
+        return None
+    if isinstance(audio, (bytes, bytearray)):
+        try:
+            with wave.open(io.BytesIO(audio), "rb") as wav:
+                return wav.getnframes() / float(wav.getframerate())
+        except (EOFError, wave.Error):
+            return None
+    return len(audio) / 1000.0
+
+
+def to_samples(audio):
+    """
+    Convert a recording to the 16 kHz mono float32 samples faster-whisper takes.
+
+    Args:
+        audio: pydub ``AudioSegment``, WAV bytes or a ``(filename, bytes, mime_type)`` upload
+
+    Returns:
+        numpy.ndarray: Samples in [-1, 1]
+    """
+    import numpy as np
+    from pydub import AudioSegment
+
+    if isinstance(audio, tuple):
+        filename, data, _ = audio
+        audio = AudioSegment.from_file(io.BytesIO(data), format=filename.rsplit(".", 1)[-1])
+    elif isinstance(audio, (bytes, bytearray)):
+        audio = AudioSegment.from_file(io.BytesIO(bytes(audio)), format="wav")
+    segment = audio.set_frame_rate(WHISPER_SAMPLE_RATE).set_channels(1).set_sample_width(2)
+    return np.frombuffer(segment.raw_data, dtype="<i2").astype(np.float32) / 32768.0
+
+
+class LocalWhisperModel:
+    """
+    A faster-whisper model with a worker pool in front of it.
+
+    Args:
+        model_name (str): Model size (e.g. ``"small"``) or path to a converted model
+        compute_type (str): CTranslate2 quantization, e.g. ``"int8"``
+        workers (int): Transcriptions run at the same time; more wait in the queue
+        cpu_threads (int): Threads per transcription; 0 lets CTranslate2 decide
+        beam_size (int): Decoding beam width; 1 is greedy and fastest
+    """
+
+    def __init__(self, model_name="small", compute_type="int8", workers=2, cpu_threads=0, beam_size=1):
+        self.model_name = model_name
+        self.compute_type = compute_type
+        self.workers = workers
+        self.cpu_threads = cpu_threads
+        self.beam_size = beam_size
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._warming = None
+        # Why the model could not be loaded, if it could not
+        self.error = None
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="local-stt")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Return the process-wide model for the configured settings.
+
+        Returns:
+            LocalWhisperModel: Shared model
+        """
+        key = (config.local_stt_model, config.local_stt_compute_type, config.local_stt_workers,
+               config.local_stt_cpu_threads, config.local_stt_beam_size)
+        with _registry_lock:
+            model = _registry.get(key)
+            if model is None:
+                model = _registry[key] = cls(*key)
+            return model
+
+    @property
+    def queue_depth(self):
+        """Transcriptions submitted and not finished yet."""
+        with self._lock:
+            return self._pending
+
+    def load(self):
+        """
+        Load the model on first use.
+
+        Returns:
+            faster_whisper.WhisperModel: The model
+        """
+        with self._load_lock:
+            if self._model is None:
+                from faster_whisper import WhisperModel
+                with span("stt.local.load", model=self.model_name, compute_type=self.compute_type):
+                    self._model = WhisperModel(self.model_name, device="cpu", compute_type=self.compute_type,
+                                               cpu_threads=self.cpu_threads, num_workers=self.workers)
+            return self._model
+
+    def warm(self):
+        """Load the model and decode a second of silence on a background thread, once."""
+        with self._load_lock:
+            if self._warming is not None:
+                return
+            self._warming = threading.Thread(target=self._warm, name="local-stt-warmup", daemon=True)
+        self._warming.start()
+
+    def _warm(self):
+        import numpy as np
+        try:
+            self._decode(np.zeros(WHISPER_SAMPLE_RATE, dtype=np.float32), None)
+        except Exception as e:
+            self.error = e
+            logger.warning("Could not load the local speech-to-text model %s: %s", self.model_name, e)
+
+    def _decode(self, samples, language):
+        segments, _ = self.load().transcribe(samples, language=language, beam_size=self.beam_size,
+                                             condition_on_previous_text=False)
+        # Segments are decoded lazily, as the generator is consumed
+        return "".join(segment.text for segment in segments)
+
+    def _run(self, audio, language):
+        try:
+            samples = to_samples(audio)
+            with span("stt.local", model=self.model_name, audio_s=round(len(samples) / WHISPER_SAMPLE_RATE, 3)):
+                return self._decode(samples, language)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def submit(self, audio, language=None):
+        """
+        Queue a transcription on the worker pool.
+
+        Returns:
+            concurrent.futures.Future: The transcript text
+        """
+        with self._lock:
+            self._pending += 1
+        return submit(self._executor, self._run, audio, language)
+
+
+class LocalWhisperSTT(WhisperSTT):
+    """
+    Whisper on the local CPU through faster-whisper.
+
+    Trims silence like :class:`simple_speech_ai.stt.WhisperSTT`; ``fmt``
+    and ``downsample`` are ignored, since nothing is uploaded.
+
+    Args:
+        config (PipelineConfig): Pipeline configuration
+        model (LocalWhisperModel): Model to use; the process-wide one for the config if omitted
+    """
+
+    def __init__(self, config, model=None):
+        self.client = None
+        self.config = config
+        self.limiter = None
+        self.model = model or LocalWhisperModel.from_config(config)
+
+    def transcribe(self, audio, language=None, fmt=None, downsample=None):
+        chunks, trimmed = self.trim(audio)
+        futures = [self.model.submit(chunk, language) for chunk in chunks]
+        return Transcription(join_texts([future.result() for future in futures]), 0, trimmed, LOCAL)
+
+
+class AsyncLocalWhisperSTT(LocalWhisperSTT):
+    """:class:`LocalWhisperSTT` with a coroutine :meth:`transcribe`; the event loop waits on the pool."""
+
+    async def transcribe(self, audio, language=None, fmt=None, downsample=None):
+        chunks, trimmed = await asyncio.to_thread(self.trim, audio)
+        texts = await asyncio.gather(*[asyncio.wrap_future(self.model.submit(chunk, language))
+                                       for chunk in chunks])
+        return Transcription(join_texts(texts), 0, trimmed, LOCAL)
+
+
+class STTRouter(SpeechToText):
+    """
+    Picks the local engine or the API for each recording.
+
+    Clips up to ``max_local_seconds`` go to the local engine while fewer
+    than ``max_queue`` transcriptions are waiting for it: for them the API
+    time is mostly upload and queueing. Longer clips, clips of unknown
+    length, clips arriving while the local pool is busy and every clip
+    after the model failed to load go to the API.
+    When an API call fails, e.g. on a flaky network, the clip is
+    transcribed locally instead.
+
+    Args:
+        local (LocalWhisperSTT): Local engine
+        remote (WhisperSTT): API engine
+        max_local_seconds (float): Longest clip sent to the local engine
+        max_queue (int): Local queue depth from which clips go to the API
+    """
+
+    def __init__(self, local, remote, max_local_seconds=15.0, max_queue=2):
+        self.local = local
+        self.remote = remote
+        self.max_local_seconds = max_local_seconds
+        self.max_queue = max_queue
+
+    def route(self, audio):
+        """
+        Returns:
+            str: ``LOCAL`` or ``API``
+        """
+        seconds = clip_seconds(audio)
+        depth = self.local.model.queue_depth
+        engine = API
+        if (self.local.model.error is None and seconds is not None and seconds <= self.max_local_seconds
+                and depth < self.max_queue):
+            engine = LOCAL
+        with span("stt.route", engine=engine, queue_depth=depth) as attributes:
+            attributes["audio_s"] = seconds
+        return engine
+
+    def transcribe(self, audio, language=None, fmt=None, downsample=None):
+        if self.route(audio) == LOCAL:
+            return self.local.transcribe(audio, language=language)
+        try:
+            return self.remote.transcribe(audio, language=language, fmt=fmt, downsample=downsample)
+        except NoSpeechError:
+            raise
+        except Exception as e:
+            logger.warning("Whisper API failed (%s); transcribing locally", e)
+            return self.local.transcribe(audio, language=language)
+
+
+class AsyncSTTRouter(STTRouter):
+    """:class:`STTRouter` over :class:`AsyncLocalWhisperSTT` and :class:`simple_speech_ai.stt.AsyncWhisperSTT`."""
+
+    async def transcribe(self, audio, language=None, fmt=None, downsample=None):
+        if self.route(audio) == LOCAL:
+            return await self.local.transcribe(audio, language=language)
+        try:
+            return await self.remote.transcribe(audio, language=language, fmt=fmt, downsample=downsample)
+        except NoSpeechError:
+            raise
+        except Exception as e:
+            logger.warning("Whisper API failed (%s); transcribing locally", e)
+            return await self.local.transcribe(audio, language=language)
+
+
+def build_local_stt(config, remote, asynchronous=False):
+    """
+    Build the local engine, or the router when ``config.stt_engine`` is ``"auto"``,
+    and start warming up the model.
+
+    Args:
+        remote (WhisperSTT): API engine the router sends clips to
+
+    Returns:
+        SpeechToText: Local engine or router
+    """
+    local = (AsyncLocalWhisperSTT if asynchronous else LocalWhisperSTT)(config)
+    local.model.warm()
+    if config.stt_engine == LOCAL:
+        return local
+    router = AsyncSTTRouter if asynchronous else STTRouter
+    return router(local, remote, max_local_seconds=config.stt_route_max_seconds,
+                  max_queue=config.stt_route_max_queue)
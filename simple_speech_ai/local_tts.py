@@ -0,0 +1,187 @@
+"""
+Text-to-speech with a local engine, for offline use and as a hedge.
+
+:class:`EspeakTTS` runs `espeak-ng <https://github.com/espeak-ng/espeak-ng>`_
+and :class:`PiperTTS` runs `piper <https://github.com/rhasspy/piper>`_ as a
+subprocess per text. Neither needs a network or an API key, so they keep
+the voice loop working offline and in tests, and they are a fast backup for
+:class:`simple_speech_ai.hedging.HedgedTTS`. Clips are written to the audio
+directory and transcoded like Typecast clips.
+
+Raising from ``on_poll``, which is called every ``POLL_INTERVAL`` seconds
+while the engine runs, kills the process; the coroutine versions kill it
+when the task is cancelled.
+"""
+
+import asyncio
+import os
+import subprocess
+import time
+
+from simple_speech_ai.telemetry import span
+from simple_speech_ai.transcode import Transcoder
+from simple_speech_ai.tts import TextToSpeech
+from simple_speech_ai.typecast import unique_filename
+
+POLL_INTERVAL = 0.05
+
+# espeak-ng speaks at 175 words per minute unless told otherwise
+ESPEAK_WORDS_PER_MINUTE = 175
+
+
+class LocalTTSError(Exception):
+    """Raised when a local speech engine is missing or fails."""
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class CommandTTS(TextToSpeech):
+    """
+    Synthesis by a local command that reads the text on stdin and writes a WAV.
+
+    Args:
+        config (PipelineConfig): Pipeline configuration
+    """
+
+    provider = None
+
+    def __init__(self, config):
+        self.config = config
+        os.makedirs(config.audio_dir, exist_ok=True)
+        self.transcoder = Transcoder.from_config(config)
+
+    def command(self, output):
+        """Return the command line that writes the clip to ``output``."""
+        raise NotImplementedError
+
+    def _failed(self, returncode, stderr):
+        return LocalTTSError(stderr.decode("utf-8", "replace").strip()
+                             or f"{self.provider} exited with {returncode}")
+
+    def _run(self, text, output, on_poll):
+        command = self.command(output)
+        try:
+            process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                       stderr=subprocess.PIPE)
+        except OSError as e:
+            raise LocalTTSError(f"Could not run {command[0]}: {e}") from e
+        started = time.monotonic()
+        text_input = text.encode("utf-8")
+        try:
+            while True:
+                try:
+                    _, stderr = process.communicate(text_input, timeout=POLL_INTERVAL)
+                    break
+                except subprocess.TimeoutExpired:
+                    # communicate() keeps the input it has not written yet
+                    text_input = None
+                    elapsed = time.monotonic() - started
+                    if elapsed > self.config.poll_deadline:
+                        raise LocalTTSError(f"{self.provider} not done after {self.config.poll_deadline:.0f} seconds")
+                    if on_poll:
+                        on_poll(elapsed, self.config.poll_deadline)
+        except BaseException:
+            process.kill()
+            process.wait()
+            _remove(output)
+            raise
+        if process.returncode != 0:
+            _remove(output)
+            raise self._failed(process.returncode, stderr)
+
+    def synthesize(self, text, on_poll=None, progressive=False):
+        audio_file = unique_filename(self.config.audio_dir)
+        with span("tts.synthesize", provider=self.provider, chars=len(text)):
+            self._run(text, audio_file, on_poll)
+        if self.transcoder is not None:
+            audio_file = self.transcoder.transcode(audio_file)
+        return audio_file
+
+    def close(self):
+        if self.transcoder is not None:
+            self.transcoder.close()
+
+
+class AsyncCommandTTS(CommandTTS):
+    """:class:`CommandTTS` with coroutine :meth:`synthesize` and :meth:`close`; ``on_poll`` is not called."""
+
+    async def _run_async(self, text, output):
+        command = self.command(output)
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        except OSError as e:
+            raise LocalTTSError(f"Could not run {command[0]}: {e}") from e
+        try:
+            _, stderr = await asyncio.wait_for(process.communicate(text.encode("utf-8")),
+                                               timeout=self.config.poll_deadline)
+        except BaseException as e:
+            if process.returncode is None:
+                process.kill()
+                await asyncio.shield(process.wait())
+            _remove(output)
+            if isinstance(e, asyncio.TimeoutError):
+                raise LocalTTSError(f"{self.provider} not done after {self.config.poll_deadline:.0f} seconds")
+            raise
+        if process.returncode != 0:
+            _remove(output)
+            raise self._failed(process.returncode, stderr)
+
+    async def synthesize(self, text, on_poll=None, progressive=False):
+        audio_file = unique_filename(self.config.audio_dir)
+        with span("tts.synthesize", provider=self.provider, chars=len(text)):
+            await self._run_async(text, audio_file)
+        if self.transcoder is not None:
+            audio_file = await self.transcoder.transcode_async(audio_file)
+        return audio_file
+
+    async def close(self):
+        super().close()
+
+
+class EspeakTTS(CommandTTS):
+    """
+    espeak-ng with ``config.espeak_voice``; ``tts_tempo`` and ``tts_volume``
+    map to its speed and amplitude.
+    """
+
+    provider = "espeak"
+
+    def command(self, output):
+        return [self.config.espeak_binary, "-v", self.config.espeak_voice,
+                "-s", str(round(ESPEAK_WORDS_PER_MINUTE * self.config.tts_tempo)),
+                "-a", str(self.config.tts_volume), "-w", output, "--stdin"]
+
+
+class PiperTTS(CommandTTS):
+    """
+    piper with the voice model at ``config.piper_model``; ``tts_tempo`` maps
+    to its length scale.
+    """
+
+    provider = "piper"
+
+    def __init__(self, config):
+        if not config.piper_model:
+            raise ValueError("PIPER_MODEL is required for the piper speech provider")
+        super().__init__(config)
+
+    def command(self, output):
+        return [self.config.piper_binary, "--model", self.config.piper_model, "--output_file", output,
+                "--length_scale", f"{1 / self.config.tts_tempo:g}"]
+
+
+class AsyncEspeakTTS(AsyncCommandTTS, EspeakTTS):
+    """:class:`EspeakTTS` for the asyncio engine."""
+
+
+class AsyncPiperTTS(AsyncCommandTTS, PiperTTS):
+    """:class:`PiperTTS` for the asyncio engine."""
+
+
+PROVIDERS = {"espeak": (EspeakTTS, AsyncEspeakTTS), "piper": (PiperTTS, AsyncPiperTTS)}
@@ -0,0 +1,228 @@
+"""
+Pre-synthesized clips for a persona's fixed phrases.
+
+The Gyeongsang-do persona opens and closes nearly every reply with the same
+lines ("할매요, 안녕하십니꺼!", "더 도와드릴 거 있습니꺼?"). The phrase bank
+renders those once, offline:
+
+    python -m simple_speech_ai.phrase_bank build
+    python -m simple_speech_ai.phrase_bank build --phrases my_phrases.txt
+
+Clips are stored in the audio directory as ``phrase_<key>.wav``, where the
+key is the TTS cache key of the phrase with the configured voice, so a bank
+built for another voice, tempo or pitch is simply not found. At synthesis
+time :meth:`PhraseBank.split` peels known phrases off the start and end of
+a text; only the variable middle goes to Typecast, and :func:`stitch` joins
+the pieces into one WAV with short fades at the seams.
+"""
+
+import argparse
+import json
+import logging
+import os
+import wave
+
+from simple_speech_ai.audio_server import PARTIAL_SUFFIX
+from simple_speech_ai.prompts import GYEONGSANG_PHRASES
+from simple_speech_ai.tts_cache import cache_key, normalize_text
+from simple_speech_ai.typecast import build_payload
+
+logger = logging.getLogger(__name__)
+
+PHRASE_PREFIX = "phrase_"
+MANIFEST_NAME = "phrase_bank.json"
+
+# Characters that may separate a fixed phrase from the rest of the text
+SEPARATORS = set(" \t\n,.!?~…")
+
+
+def voice_payload(config, text):
+    """Return the Typecast payload ``text`` is synthesized with under ``config``."""
+    return build_payload(text, actor_id=config.typecast_actor_id, tempo=config.tts_tempo,
+                         volume=config.tts_volume, pitch=config.tts_pitch,
+                         model_version=config.tts_model_version)
+
+
+def clip_path(config, text):
+    """Return where the bank clip of ``text`` for the configured voice lives."""
+    return os.path.join(config.audio_dir, f"{PHRASE_PREFIX}{cache_key(voice_payload(config, text))}.wav")
+
+
+class PhraseBank:
+    """
+    Fixed phrases with pre-rendered clips.
+
+    Args:
+        clips (dict): Normalized phrase -> WAV path
+    """
+
+    def __init__(self, clips):
+        self.clips = clips
+        # Longest first, so "안녕하십니꺼! 손주입니더." wins over "안녕하십니꺼!"
+        self._phrases = sorted(clips, key=len, reverse=True)
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Load the bank built for the configured voice.
+
+        Returns:
+            PhraseBank: The bank, or None if none was built or no clip matches the voice
+        """
+        manifest = os.path.join(config.audio_dir, MANIFEST_NAME)
+        if not os.path.exists(manifest):
+            return None
+        with open(manifest, encoding="utf-8") as f:
+            phrases = json.load(f)["phrases"]
+        clips = {}
+        for phrase in phrases:
+            path = clip_path(config, phrase)
+            if os.path.exists(path):
+                clips[normalize_text(phrase)] = path
+        if not clips:
+            logger.warning("Phrase bank in %s has no clips for the configured voice", config.audio_dir)
+            return None
+        return cls(clips)
+
+    def __len__(self):
+        return len(self.clips)
+
+    def split(self, text):
+        """
+        Peel fixed phrases off the start and end of ``text``.
+
+        Returns:
+            tuple: ``(leading_clips, middle_text, trailing_clips)``; the
+            middle is empty when the whole text is made of fixed phrases
+        """
+        rest = normalize_text(text)
+        leading = []
+        trailing = []
+        matched = True
+        while matched and rest:
+            matched = False
+            for phrase in self._phrases:
+                if rest.startswith(phrase) and (len(rest) == len(phrase) or rest[len(phrase)] in SEPARATORS
+                                                or phrase[-1] in SEPARATORS):
+                    leading.append(self.clips[phrase])
+                    rest = rest[len(phrase):].strip()
+                    matched = True
+                    break
+        matched = True
+        while matched and rest:
+            matched = False
+            for phrase in self._phrases:
+                cut = len(rest) - len(phrase)
+                if rest.endswith(phrase) and (cut == 0 or rest[cut - 1] in SEPARATORS):
+                    trailing.insert(0, self.clips[phrase])
+                    rest = rest[:cut].strip()
+                    matched = True
+                    break
+        return leading, rest, trailing
+
+
+def stitch(paths, output, fade_ms=8):
+    """
+    Concatenate WAV clips with short fades at the seams, so the joins do not click.
+
+    Raises:
+        ValueError: The clips differ in sample rate, width or channels
+
+    Returns:
+        str: ``output``
+    """
+    import numpy as np
+
+    params = None
+    pieces = []
+    for path in paths:
+        with wave.open(path, "rb") as wav:
+            current = (wav.getnchannels(), wav.getsampwidth(), wav.getframerate())
+            if params is None:
+                params = current
+            elif current != params:
+                raise ValueError(f"Cannot stitch {path}: {current} differs from {params}")
+            pieces.append(wav.readframes(wav.getnframes()))
+
+    channels, width, rate = params
+    if width != 2:
+        frames = b"".join(pieces)
+    else:
+        fade = int(rate * fade_ms / 1000)
+        ramp = np.linspace(0.0, 1.0, fade)[:, None] if fade else None
+        joined = []
+        for i, piece in enumerate(pieces):
+            samples = np.frombuffer(piece, dtype="<i2").reshape(-1, channels).astype(np.float32)
+            if ramp is not None and len(samples) > 2 * fade:
+                if i > 0:
+                    samples[:fade] *= ramp
+                if i < len(pieces) - 1:
+                    samples[-fade:] *= ramp[::-1]
+            joined.append(samples.astype("<i2"))
+        frames = np.concatenate(joined).tobytes()
+
+    partial = output + PARTIAL_SUFFIX
+    with wave.open(partial, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(width)
+        wav.setframerate(rate)
+        wav.writeframes(frames)
+    os.replace(partial, output)
+    return output
+
+
+def build(config, phrases):
+    """
+    Synthesize every phrase that has no clip for the configured voice yet
+    and record the phrase list in the manifest.
+
+    Returns:
+        int: Number of clips synthesized
+    """
+    from simple_speech_ai.typecast import TypecastClient
+
+    os.makedirs(config.audio_dir, exist_ok=True)
+    client = TypecastClient(api_key=config.typecast_api_key, speak_url=config.typecast_speak_url)
+    built = 0
+    try:
+        for phrase in phrases:
+            path = clip_path(config, phrase)
+            if os.path.exists(path):
+                continue
+            speak_url = client.request_speech(voice_payload(config, phrase))
+            audio_url = client.poll_speech(speak_url, text_length=len(phrase))
+            client.download_audio(audio_url, filename=path)
+            built += 1
+            print(f"{os.path.basename(path)}  {phrase}")
+    finally:
+        client.close()
+
+    manifest = os.path.join(config.audio_dir, MANIFEST_NAME)
+    with open(manifest, "w", encoding="utf-8") as f:
+        json.dump({"phrases": list(phrases)}, f, ensure_ascii=False, indent=2)
+    return built
+
+
+def main():
+    from simple_speech_ai.config import PipelineConfig
+
+    parser = argparse.ArgumentParser(description="Pre-synthesize the persona's fixed phrases.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_command = commands.add_parser("build", help="Synthesize missing clips and write the manifest")
+    build_command.add_argument("--phrases", help="Text file with one phrase per line; "
+                                                 "defaults to the Gyeongsang-do persona's phrases")
+    build_command.add_argument("--tempo", type=float, help="Voice tempo the app uses (TTS tempo)")
+    args = parser.parse_args()
+
+    config = PipelineConfig.from_env(tts_tempo=args.tempo)
+    if args.phrases:
+        with open(args.phrases, encoding="utf-8") as f:
+            phrases = [line.strip() for line in f if line.strip()]
+    else:
+        phrases = list(GYEONGSANG_PHRASES)
+    built = build(config, phrases)
+    print(f"{built} clips synthesized, {len(phrases)} phrases in {config.audio_dir}/{MANIFEST_NAME}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,474 @@
+"""
+The speech loop: speech-to-text, chat completion and text-to-speech.
+
+:class:`Pipeline` wires the three stages together and is free of Streamlit,
+so it can be driven by the Streamlit apps, a CLI or a headless benchmark.
+One pipeline is shared by every session in a process; per-session state
+lives in :class:`Conversation`.
+"""
+
+import os
+import secrets
+import weakref
+from collections import namedtuple
+from contextlib import contextmanager
+
+from simple_speech_ai.audio_store import AudioStore
+from simple_speech_ai.context import ConversationContext, count_tokens, make_summarizer
+from simple_speech_ai.llm import OpenAIChat, lazy_openai_client
+from simple_speech_ai.ratelimit import BACKGROUND, priority
+from simple_speech_ai.replay import Replay, Replayer, adjust, classify
+from simple_speech_ai.speech_stream import SentencePipeline
+from simple_speech_ai.stt import AsyncWhisperSTT, WhisperSTT
+from simple_speech_ai.telemetry import Tracer, span
+from simple_speech_ai.tts import AsyncTypecastTTS, TypecastTTS
+from simple_speech_ai.turn_store import TurnStore
+
+# Events yielded by Pipeline.stream_turn
+TextDelta = namedtuple("TextDelta", ["text"])
+SpokenSentence = namedtuple("SpokenSentence", ["sentence", "audio_file", "error"])
+
+
+def build_stt(config, client, asynchronous=False):
+    """
+    Build the configured speech-to-text stage; faster-whisper is only imported
+    for the local engine.
+
+    Returns:
+        SpeechToText: Whisper API, local engine or a router between the two
+    """
+    remote = (AsyncWhisperSTT if asynchronous else WhisperSTT)(client, config)
+    if config.stt_engine == "api":
+        return remote
+    from simple_speech_ai.local_stt import build_local_stt
+    return build_local_stt(config, remote, asynchronous=asynchronous)
+
+
+def _tts_provider(config, name, asynchronous):
+    if name == "typecast":
+        return (AsyncTypecastTTS if asynchronous else TypecastTTS)(config)
+    from simple_speech_ai.local_tts import PROVIDERS
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown speech provider: {name!r}")
+    return PROVIDERS[name][1 if asynchronous else 0](config)
+
+
+def build_tts(config, asynchronous=False):
+    """
+    Build the configured text-to-speech stage, hedged with a backup provider
+    if ``config.tts_hedge_provider`` is set.
+
+    Returns:
+        TextToSpeech: Provider, or the hedge in front of it
+    """
+    primary = _tts_provider(config, config.tts_provider, asynchronous)
+    if not config.tts_hedge_provider:
+        return primary
+    backup = primary
+    if config.tts_hedge_provider != config.tts_provider:
+        backup = _tts_provider(config, config.tts_hedge_provider, asynchronous)
+    from simple_speech_ai.hedging import AsyncHedgedTTS, HedgedTTS
+    return (AsyncHedgedTTS if asynchronous else HedgedTTS).from_config(config, primary, backup)
+
+
+def build_response_cache(config):
+    """
+    Build the response cache if it is enabled; NumPy is only imported then.
+
+    Returns:
+        ResponseCache: Cache, or None if disabled
+    """
+    if not config.response_cache:
+        return None
+    from simple_speech_ai.response_cache import ResponseCache
+    return ResponseCache.from_config(config)
+
+
+class Conversation:
+    """
+    Per-session conversation state.
+
+    Each turn is kept as a history entry ``{"user", "assistant",
+    "user_tokens", "assistant_tokens", "audio_files"}``; the token counts are
+    taken once, when the turn is added. With a turn store the entries are
+    also appended to it, so the session can be resumed after a reconnect.
+    The session ID is then all it takes to read and continue the
+    conversation, so generated IDs are unguessable tokens.
+
+    Args:
+        context (ConversationContext): Builds budgeted prompts from the history
+        session_id (str): ID to use; a new random token is generated if omitted
+        store (TurnStore): Where turns are persisted; None keeps them in memory only
+    """
+
+    def __init__(self, context, session_id=None, store=None):
+        self.history = []
+        self.context = context
+        self.session_id = session_id or secrets.token_urlsafe(16)
+        self.store = store
+        # Timing spans of the most recent turn, for display
+        self.last_trace = None
+
+    def build_messages(self, user_input):
+        """Build the chat messages for the next turn."""
+        return self.context.build_messages(self.history, user_input)
+
+    def add_turn(self, user_input, reply, audio_files=()):
+        """
+        Record a finished turn.
+
+        Args:
+            audio_files (list): Clips the reply was spoken with
+        """
+        entry = {"user": user_input, "assistant": reply, "user_tokens": count_tokens(user_input),
+                 "assistant_tokens": count_tokens(reply), "audio_files": list(audio_files)}
+        if self.store is not None:
+            entry["turn_id"] = self.store.append(self.session_id, entry)
+        self.history.append(entry)
+
+    def attach_audio(self, audio_file):
+        """Record a clip spoken for the latest turn, e.g. after :meth:`Pipeline.speak`."""
+        if not audio_file or not self.history:
+            return
+        entry = self.history[-1]
+        entry["audio_files"].append(audio_file)
+        if self.store is not None and "turn_id" in entry:
+            self.store.set_audio(entry["turn_id"], entry["audio_files"])
+
+    def recent(self, count):
+        """Return the last ``count`` turns, for rendering a page of the history."""
+        return self.history[-count:] if count > 0 else []
+
+    def clear(self):
+        """Forget the history, its stored turns and the running summary."""
+        self.history = []
+        self.context.reset()
+        if self.store is not None:
+            self.store.delete(self.session_id)
+
+
+class _StreamedTurn:
+    """
+    Bookkeeping of one streamed turn: the reply so far, the clips spoken for
+    it and the sentence pipeline synthesizing them. Shared by
+    :meth:`Pipeline.stream_turn` and its coroutine version, which differ only
+    in how they wait.
+    """
+
+    def __init__(self, pipeline, conversation, sentences):
+        self.pipeline = pipeline
+        self.conversation = conversation
+        self.sentences = sentences
+        self.reply = ""
+        self.spoken = []
+
+    def text(self, delta):
+        """Take a piece of the reply and queue its complete sentences for synthesis."""
+        self.reply += delta
+        self.sentences.feed(delta)
+        return TextDelta(delta)
+
+    def clip(self, clip):
+        """Record a finished clip of the reply."""
+        spoken = self.pipeline._spoken(self.conversation, clip)
+        self.spoken.append(spoken)
+        return spoken
+
+    def cached(self, cached):
+        """
+        Take a cached reply.
+
+        Returns:
+            list: Its clips, or None if they are being synthesized again
+        """
+        self.reply = cached.reply
+        clips = self.pipeline._cached_clips(cached)
+        if clips is None:
+            self.sentences.feed(self.reply)
+            self.sentences.close()
+        return clips
+
+    def finished(self):
+        """
+        Stop the synthesis still running.
+
+        Returns:
+            tuple: Arguments of :meth:`Conversation.add_turn`, or None if there is no reply
+        """
+        self.sentences.shutdown()
+        if not self.reply:
+            return None
+        return self.reply, [s.audio_file for s in self.spoken if s.audio_file]
+
+
+class Pipeline:
+    """
+    STT -> LLM -> TTS pipeline.
+
+    Stages default to Whisper, OpenAI chat and Typecast, but any object
+    implementing :class:`simple_speech_ai.stt.SpeechToText`,
+    :class:`simple_speech_ai.llm.ChatModel` or
+    :class:`simple_speech_ai.tts.TextToSpeech` can be passed in.
+
+    Args:
+        config (PipelineConfig): Pipeline configuration
+        stt (SpeechToText): Speech-to-text stage
+        llm (ChatModel): Chat completion stage
+        tts (TextToSpeech): Text-to-speech stage
+        tracer (Tracer): Receives stage timing spans; built from the config if omitted
+        audio_store (AudioStore): Retention for the audio directory; built from the config if omitted
+        response_cache (ResponseCache): Cache of replies to repeated questions; built from the
+            config (and disabled by default) if omitted
+        turn_store (TurnStore): Persistent conversation turns; built from the config (and
+            disabled by default) if omitted
+    """
+
+    # Overridden by the coroutine pipeline to build the async stages
+    asynchronous = False
+    chat_class = OpenAIChat
+    sentence_class = SentencePipeline
+
+    def __init__(self, config, stt=None, llm=None, tts=None, tracer=None, audio_store=None,
+                 response_cache=None, turn_store=None):
+        self.config = config
+        self.tracer = tracer or Tracer.from_config(config)
+        self.audio_store = audio_store or AudioStore.from_config(config)
+        self.response_cache = response_cache or build_response_cache(config)
+        self.turn_store = turn_store or TurnStore.from_config(config)
+        self.replayer = Replayer.from_config(config)
+        self.openai_client = None
+        if stt is None or llm is None:
+            self.openai_client = lazy_openai_client(config, asynchronous=self.asynchronous)
+        self.stt = stt or build_stt(config, self.openai_client, asynchronous=self.asynchronous)
+        self.llm = llm or self.chat_class(self.openai_client, config)
+        self.tts = tts or build_tts(config, asynchronous=self.asynchronous)
+
+    def new_conversation(self, session_id=None):
+        """
+        Start a conversation using the configured system prompt and budget.
+
+        With a turn store, passing the ``session_id`` of an earlier
+        conversation resumes it with its stored turns, and its audio files
+        are left to the audio directory's quotas. An ID with no stored turns
+        gets a new conversation under a new ID, so nobody can start a
+        conversation under an ID they chose and read it later. Without one, the
+        conversation's audio files are deleted once it is garbage collected,
+        i.e. when its session ends, and ``session_id`` is ignored.
+
+        Returns:
+            Conversation: Per-session state
+        """
+        context = ConversationContext(
+            self.config.system_prompt,
+            token_budget=self.config.context_token_budget,
+            keep_turns=self.config.context_keep_turns,
+            summarize=make_summarizer(self._summarize)
+        )
+        if self.turn_store is None:
+            conversation = Conversation(context)
+            weakref.finalize(conversation, self.audio_store.release, conversation.session_id).atexit = False
+            return conversation
+        history = self.turn_store.turns(session_id) if session_id else []
+        conversation = Conversation(context, session_id=session_id if history else None, store=self.turn_store)
+        conversation.history = history
+        return conversation
+
+    def release_audio(self, conversation):
+        """
+        Delete the audio files produced for ``conversation``.
+
+        Returns:
+            int: Number of files deleted
+        """
+        return self.audio_store.release(conversation.session_id)
+
+    def _summarize(self, messages):
+        # Runs on the context's background thread, behind the turns waiting for the model
+        with priority(BACKGROUND):
+            return self.llm.complete(messages, model=self.config.summary_model, temperature=0, max_tokens=450)
+
+    @contextmanager
+    def turn(self, conversation=None):
+        """
+        Group the stages called inside the block into one timed turn.
+
+        Every stage method opens a turn on its own; wrapping a transcription
+        and the reply it triggers in one block gives them the same turn ID.
+
+        Yields:
+            Trace: Spans of the turn
+        """
+        with self.tracer.turn(conversation.session_id if conversation else None) as trace:
+            if conversation is not None:
+                conversation.last_trace = trace
+            yield trace
+
+    def transcribe(self, audio, language=None, fmt=None, downsample=None):
+        """
+        Transcribe a recording.
+
+        Returns:
+            Transcription: Text and number of bytes uploaded
+        """
+        with self.turn():
+            return self.stt.transcribe(audio, language=language, fmt=fmt, downsample=downsample)
+
+    def respond(self, conversation, user_input):
+        """
+        Generate the full reply for ``user_input`` and record the turn.
+
+        A near-duplicate of an earlier question, asked after the same question,
+        is answered from the response cache, if enabled.
+
+        Returns:
+            str: Assistant reply
+        """
+        with self.turn(conversation):
+            cached = self._lookup(conversation, user_input)
+            if cached is not None:
+                reply = cached.reply
+            else:
+                reply = self.llm.complete(conversation.build_messages(user_input))
+                self._remember(conversation, user_input, reply)
+        conversation.add_turn(user_input, reply)
+        return reply
+
+    def speak(self, text, on_poll=None, progressive=False, conversation=None):
+        """
+        Synthesize a whole reply.
+
+        Args:
+            conversation (Conversation): Session the audio file belongs to
+
+        Returns:
+            str: Path of the audio file
+        """
+        with self.turn():
+            audio_file = self.tts.synthesize(text, on_poll=on_poll, progressive=progressive)
+        if conversation is not None:
+            self.audio_store.add(conversation.session_id, audio_file)
+            conversation.attach_audio(audio_file)
+        return audio_file
+
+    def replay(self, conversation, user_input):
+        """
+        Answer a request to repeat the last reply, or to say it slower or
+        louder, by playing its clips again; nothing is sent to OpenAI or
+        Typecast. Call it before :meth:`respond` or :meth:`stream_turn`.
+
+        The request and the replayed reply are recorded as a turn. Later
+        requests start from the clips the reply was first spoken with, so
+        adjustments compound without re-rendering a rendered clip.
+
+        Returns:
+            Replay: Intent, reply text and clips to play, or None if
+            ``user_input`` is not such a request or the clips are gone
+        """
+        if self.replayer is None or not conversation.history:
+            return None
+        entry = conversation.history[-1]
+        intent = classify(user_input, entry.get("assistant"))
+        source = entry.get("replay_source", entry["audio_files"])
+        if intent is None or not source:
+            return None
+        if not all(os.path.exists(path) for path in source):
+            return None
+
+        with self.turn(conversation):
+            with span("replay", intent=intent):
+                tempo, gain_db = adjust(intent, *entry.get("playback", (1.0, 0.0)))
+                audio_files = self.replayer.render(source, tempo, gain_db)
+        for path in audio_files:
+            self.audio_store.add(conversation.session_id, path)
+        conversation.add_turn(user_input, entry["assistant"], audio_files)
+        conversation.history[-1].update(playback=(tempo, gain_db), replay_source=source)
+        return Replay(intent, entry["assistant"], audio_files)
+
+    def stream_turn(self, conversation, user_input, progressive=False):
+        """
+        Stream the reply and speak it sentence by sentence.
+
+        Sentences are synthesized concurrently while later ones are still
+        being generated; clips are yielded strictly in sentence order, as
+        soon as each is ready. The turn is recorded when the generator
+        finishes or is closed. A cached reply is yielded in one piece, with
+        its cached clips when they are all still on disk.
+
+        Yields:
+            TextDelta or SpokenSentence: Reply text as it streams, and clips
+        """
+        turn = self._streamed_turn(conversation, progressive)
+        try:
+            with self.turn(conversation):
+                cached = self._lookup(conversation, user_input)
+                if cached is not None:
+                    yield TextDelta(cached.reply)
+                    clips = turn.cached(cached)
+                    for clip in turn.sentences.remaining() if clips is None else clips:
+                        yield turn.clip(clip)
+                    return
+
+                for delta in self.llm.stream(conversation.build_messages(user_input)):
+                    yield turn.text(delta)
+                    for clip in turn.sentences.ready():
+                        yield turn.clip(clip)
+                turn.sentences.close()
+                for clip in turn.sentences.remaining():
+                    yield turn.clip(clip)
+                self._remember(conversation, user_input, turn.reply, turn.spoken)
+        finally:
+            finished = turn.finished()
+            if finished:
+                conversation.add_turn(user_input, *finished)
+
+    def _streamed_turn(self, conversation, progressive):
+        sentences = self.sentence_class(
+            lambda sentence: self.tts.synthesize(sentence, progressive=progressive),
+            max_workers=self.config.sentence_workers
+        )
+        return _StreamedTurn(self, conversation, sentences)
+
+    @staticmethod
+    def _previous_question(conversation):
+        # The cache serves a question only after the question it was first asked after
+        return conversation.history[-1]["user"] if conversation.history else None
+
+    def _lookup(self, conversation, user_input):
+        if self.response_cache is None:
+            return None
+        with span("llm.cache") as attributes:
+            cached = self.response_cache.lookup(user_input, self._previous_question(conversation))
+            attributes["hit"] = cached is not None
+            if cached is not None:
+                attributes["score"] = round(cached.score, 4)
+        return cached
+
+    def _remember(self, conversation, user_input, reply, spoken=()):
+        # Replies with a failed clip are cached as text only. The clips belong
+        # to this session, so the cache keeps shared links that outlive it.
+        if self.response_cache is None:
+            return
+        clips = [(s.sentence, self.audio_store.share(s.audio_file)) for s in spoken if not s.error]
+        if len(clips) < len(spoken) or not all(path for _, path in clips):
+            clips = []
+        self.response_cache.store(user_input, reply, clips, self._previous_question(conversation))
+
+    @staticmethod
+    def _cached_clips(cached):
+        # Clips of a cached reply, or None if they must be synthesized again
+        if not cached.clips or not all(os.path.exists(path) for _, path in cached.clips):
+            return None
+        return [(sentence, path, None) for sentence, path in cached.clips]
+
+    def _spoken(self, conversation, clip):
+        spoken = SpokenSentence(*clip)
+        self.audio_store.add(conversation.session_id, spoken.audio_file)
+        return spoken
+
+    def close(self):
+        """Release network resources held by the stages and the telemetry sinks."""
+        self.tts.close()
+        self.tracer.close()
+        self.audio_store.close()
+        if self.turn_store is not None:
+            self.turn_store.close()
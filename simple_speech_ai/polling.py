@@ -0,0 +1,165 @@
+"""
+Adaptive polling for Typecast synthesis jobs.
+
+Instead of sleeping a fixed interval between polls, :class:`AdaptivePoller`
+predicts how long a job will take from the text length and the completion
+times it has seen before. It checks once quickly (short or cached jobs
+finish almost immediately), then sleeps until just before the predicted
+completion, and after that backs off exponentially with jitter. Polling
+stops at a deadline in seconds rather than after a number of attempts.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+
+
+class PollTimeout(Exception):
+    """Raised when a job is still not done at the deadline."""
+
+
+class AdaptivePoller:
+    """
+    Poll a job with predicted waits, exponential backoff and jitter.
+
+    One poller is meant to be shared by all sessions in a process so its
+    completion-time model keeps learning. It is thread-safe.
+
+    Args:
+        deadline (float): Seconds after which polling gives up
+        first_check (float): Delay before the first poll
+        min_interval (float): Smallest delay between polls
+        max_interval (float): Largest delay between polls
+        backoff (float): Multiplier applied to the delay after each miss
+        jitter (float): Relative random spread applied to each delay
+        lead (float): Fraction of the predicted time to wait before the
+            first predicted check, so we arrive slightly early rather than late
+        history_size (int): Number of completion times kept for the model
+        base_seconds (float): Prior fixed cost of a job
+        seconds_per_char (float): Prior per-character cost of a job
+        sleep (callable): Sleep function, replaceable for tests
+        clock (callable): Monotonic clock, replaceable for tests
+    """
+
+    def __init__(self, deadline=30.0, first_check=0.3, min_interval=0.25, max_interval=3.0,
+                 backoff=1.6, jitter=0.2, lead=0.9, history_size=200,
+                 base_seconds=1.0, seconds_per_char=0.02, sleep=time.sleep, clock=time.monotonic):
+        self.deadline = deadline
+        self.first_check = first_check
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.lead = lead
+        self.base_seconds = base_seconds
+        self.seconds_per_char = seconds_per_char
+        self._sleep = sleep
+        self._clock = clock
+        self._history = deque(maxlen=history_size)
+        self._lock = threading.Lock()
+
+    def predict(self, text_length):
+        """
+        Predict how long a job for ``text_length`` characters takes.
+
+        A least-squares line through the recorded completion times is used
+        once there are enough samples with varying lengths; until then the
+        prior ``base_seconds + seconds_per_char * text_length`` is used.
+
+        Returns:
+            float: Predicted seconds from submission to completion
+        """
+        with self._lock:
+            samples = list(self._history)
+
+        base, per_char = self.base_seconds, self.seconds_per_char
+        if len(samples) >= 5:
+            n = len(samples)
+            mean_x = sum(x for x, _ in samples) / n
+            mean_y = sum(y for _, y in samples) / n
+            var_x = sum((x - mean_x) ** 2 for x, _ in samples)
+            if var_x > 0:
+                per_char = max(0.0, sum((x - mean_x) * (y - mean_y) for x, y in samples) / var_x)
+                base = max(0.0, mean_y - per_char * mean_x)
+            else:
+                base, per_char = mean_y, 0.0
+        return base + per_char * text_length
+
+    def record(self, text_length, seconds):
+        """Record how long a finished job took."""
+        with self._lock:
+            self._history.append((text_length, seconds))
+
+    def wait(self, check, text_length=0, on_poll=None, started=None):
+        """
+        Call ``check`` until it reports completion.
+
+        Args:
+            check (callable): ``check() -> (done, value)``
+            text_length (int): Length of the synthesized text
+            on_poll (callable): Optional ``on_poll(elapsed, deadline)`` progress hook
+            started (float): Clock value when the job was submitted; defaults to now
+
+        Returns:
+            The ``value`` returned by ``check`` once ``done`` is true
+        """
+        start = self._clock() if started is None else started
+        for delay in self._delays(start, text_length):
+            self._sleep(delay)
+            elapsed = self._clock() - start
+            if on_poll:
+                on_poll(elapsed, self.deadline)
+            done, value = check()
+            if done:
+                self.record(text_length, elapsed)
+                return value
+
+    async def wait_async(self, check, text_length=0, on_poll=None, started=None):
+        """
+        Coroutine version of :meth:`wait` for the asyncio engine.
+
+        Args:
+            check (callable): Coroutine function ``check() -> (done, value)``
+
+        Returns:
+            The ``value`` returned by ``check`` once ``done`` is true
+        """
+        start = self._clock() if started is None else started
+        for delay in self._delays(start, text_length):
+            await asyncio.sleep(delay)
+            elapsed = self._clock() - start
+            if on_poll:
+                on_poll(elapsed, self.deadline)
+            done, value = await check()
+            if done:
+                self.record(text_length, elapsed)
+                return value
+
+    def _delays(self, start, text_length):
+        # Yields the sleep before each check; raises PollTimeout at the deadline
+        predicted = self.predict(text_length) * self.lead
+        delay = self.first_check
+        interval = self.min_interval
+        checks = 0
+
+        while True:
+            remaining = self.deadline - (self._clock() - start)
+            if remaining <= 0:
+                raise PollTimeout(f"Speech synthesis not done after {self.deadline:.0f} seconds")
+            yield min(self._jittered(delay), remaining)
+            checks += 1
+
+            elapsed = self._clock() - start
+            if checks == 1 and predicted > elapsed + self.min_interval:
+                # Skip straight to just before the predicted completion time
+                delay = predicted - elapsed
+            else:
+                delay = interval
+                interval = min(interval * self.backoff, self.max_interval)
+
+    def _jittered(self, delay):
+        if not self.jitter:
+            return delay
+        return max(0.0, delay * (1 + random.uniform(-self.jitter, self.jitter)))
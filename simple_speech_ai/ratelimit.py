@@ -0,0 +1,359 @@
+"""
+Request rate limits per provider endpoint, shared by every session.
+
+Each endpoint (OpenAI chat, Whisper, Typecast submissions, Typecast polls)
+gets one :class:`RateLimiter` per process: a token bucket refilled at
+``rpm / 60`` tokens per second, holding up to ``rate_limit_burst_seconds``
+worth of requests, with a scheduler in front of it. A caller that finds the
+bucket empty is queued instead of being sent off to collect a 429. The
+queue is served by priority, then in arrival order:
+
+- ``INTERACTIVE``: a user is waiting on the turn (the default)
+- ``BACKGROUND``: conversation summaries
+- ``BATCH``: :mod:`simple_speech_ai.batch` jobs
+
+The priority is a context variable, so it follows a turn onto the worker
+threads and tasks it spawns; set it with :func:`priority`. Typecast polls
+have their own bucket, so polling for running jobs never uses up the quota
+for new submissions.
+
+With ``rate_limit_dir`` set, the bucket state lives in a file there,
+guarded by ``fcntl`` locks, so every process on the host (app replicas, a
+batch run) draws from the same quota. With ``shared_state`` set instead,
+the buckets live in the shared state (see
+:mod:`simple_speech_ai.shared_state`), which also covers workers on other
+hosts. Priorities are only honoured within a process.
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+from simple_speech_ai.shared_state import SharedState
+from simple_speech_ai.telemetry import record
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BACKGROUND = 1
+BATCH = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background", BATCH: "batch"}
+
+# Endpoint name -> PipelineConfig field with its requests per minute
+ENDPOINTS = {
+    "openai.chat": "openai_chat_rpm",
+    "openai.stt": "openai_stt_rpm",
+    "typecast.submit": "typecast_submit_rpm",
+    "typecast.poll": "typecast_poll_rpm",
+}
+
+_priority = contextvars.ContextVar("rate_limit_priority", default=INTERACTIVE)
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+@contextmanager
+def priority(level):
+    """Run the block's provider requests at ``level``."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """
+    In-process token bucket.
+
+    Args:
+        rate (float): Tokens added per second
+        burst (float): Bucket capacity
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """
+        Take one token if there is one.
+
+        Returns:
+            float: 0 if a token was taken, else seconds until one will be available
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens, wait = self._refill(self._tokens, now - self._updated)
+            self._updated = now
+            return wait
+
+    def _refill(self, tokens, elapsed):
+        tokens = min(self.burst, tokens + max(0.0, elapsed) * self.rate)
+        if tokens >= 1:
+            return tokens - 1, 0.0
+        return tokens, (1 - tokens) / self.rate
+
+
+class FileTokenBucket(TokenBucket):
+    """
+    Token bucket kept in a file, shared by every process on the host.
+
+    Args:
+        path (str): State file; created on first use
+        rate (float): Tokens added per second
+        burst (float): Bucket capacity
+    """
+
+    _STATE = struct.Struct("<dd")
+
+    def __init__(self, path, rate, burst):
+        super().__init__(rate, burst)
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def take(self):
+        # flock is per open file, so threads of this process serialize on the lock first
+        with self._lock:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                now = time.time()
+                raw = os.pread(fd, self._STATE.size, 0)
+                if len(raw) == self._STATE.size:
+                    tokens, updated = self._STATE.unpack(raw)
+                else:
+                    tokens, updated = self.burst, now
+                tokens, wait = self._refill(tokens, now - updated)
+                os.pwrite(fd, self._STATE.pack(tokens, now), 0)
+                return wait
+            finally:
+                os.close(fd)
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    Token bucket in a :class:`simple_speech_ai.shared_state.SharedState`,
+    shared by every worker process using it.
+
+    Args:
+        state (SharedState): Backend
+        name (str): Endpoint name
+        rate (float): Tokens added per second
+        burst (float): Bucket capacity
+    """
+
+    def __init__(self, state, name, rate, burst):
+        super().__init__(rate, burst)
+        self.state = state
+        self.name = name
+
+    def take(self):
+        return self.state.take(f"ratelimit:{self.name}", self.rate, self.burst)
+
+
+class _Waiter:
+    __slots__ = ("grant", "cancelled")
+
+    def __init__(self, grant):
+        self.grant = grant
+        self.cancelled = False
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class RateLimiter:
+    """
+    Token bucket with a priority queue in front.
+
+    A dispatcher thread, started when the first caller has to wait, hands
+    out tokens to queued callers as the bucket refills. Threads block in
+    :meth:`acquire`; coroutines await :meth:`acquire_async`.
+
+    Args:
+        name (str): Endpoint name, e.g. ``"typecast.poll"``
+        bucket (TokenBucket): Quota to draw from
+    """
+
+    def __init__(self, name, bucket):
+        self.name = name
+        self.bucket = bucket
+        self._queue = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._dispatcher = None
+        self.granted = 0
+        self.waited = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    @classmethod
+    def from_config(cls, config, name):
+        """
+        Return the process-wide limiter for an endpoint.
+
+        Stages built from equal settings share one limiter, so every
+        pipeline in the process draws from the same quota.
+
+        Args:
+            name (str): Key of :data:`ENDPOINTS`
+
+        Returns:
+            RateLimiter: The limiter, or None if the endpoint is not limited
+        """
+        per_minute = getattr(config, ENDPOINTS[name])
+        if not per_minute:
+            return None
+        rate = per_minute / 60.0
+        burst = max(1.0, rate * config.rate_limit_burst_seconds)
+        path = None
+        if config.shared_state:
+            path = config.shared_state
+        elif config.rate_limit_dir:
+            if fcntl is None:
+                logger.warning("rate_limit_dir needs fcntl; %s is limited per process", name)
+            else:
+                path = os.path.join(config.rate_limit_dir, f"{name}.bucket")
+        key = (name, rate, burst, path)
+        with _registry_lock:
+            limiter = _registry.get(key)
+            if limiter is None:
+                if config.shared_state:
+                    bucket = SharedTokenBucket(SharedState.from_config(config), name, rate, burst)
+                elif path is None:
+                    bucket = TokenBucket(rate, burst)
+                else:
+                    bucket = FileTokenBucket(path, rate, burst)
+                limiter = _registry[key] = cls(name, bucket)
+            return limiter
+
+    def _try_now(self):
+        # Caller holds the condition; queued callers go first
+        if not self._queue and self.bucket.take() == 0:
+            self.granted += 1
+            return True
+        return False
+
+    def _enqueue(self, waiter, level):
+        heapq.heappush(self._queue, (level, next(self._seq), waiter))
+        if self._dispatcher is None:
+            self._dispatcher = threading.Thread(target=self._dispatch, name=f"ratelimit-{self.name}",
+                                                daemon=True)
+            self._dispatcher.start()
+        self._cond.notify()
+        return len(self._queue)
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                waiter = self._queue[0][2]
+                if waiter.cancelled:
+                    heapq.heappop(self._queue)
+                    continue
+                wait = self.bucket.take()
+                if wait == 0:
+                    heapq.heappop(self._queue)
+                    self.granted += 1
+                    waiter.grant()
+                    continue
+            # Sleep unlocked, so an urgent caller can take the head of the queue meanwhile
+            time.sleep(wait)
+
+    def _waited(self, start, started, level, depth):
+        waited = time.perf_counter() - started
+        with self._cond:
+            self.waited += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        record("ratelimit.wait", start, waited, endpoint=self.name,
+               priority=PRIORITY_NAMES.get(level, level), queue_depth=depth)
+        return waited
+
+    def acquire(self):
+        """
+        Block until a request may be sent.
+
+        Returns:
+            float: Seconds spent queued
+        """
+        level = _priority.get()
+        with self._cond:
+            if self._try_now():
+                return 0.0
+            start = time.time()
+            started = time.perf_counter()
+            granted = threading.Event()
+            depth = self._enqueue(_Waiter(granted.set), level)
+        granted.wait()
+        return self._waited(start, started, level, depth)
+
+    async def acquire_async(self):
+        """
+        Wait on the event loop until a request may be sent.
+
+        Returns:
+            float: Seconds spent queued
+        """
+        level = _priority.get()
+        with self._cond:
+            if self._try_now():
+                return 0.0
+            start = time.time()
+            started = time.perf_counter()
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            waiter = _Waiter(lambda: loop.call_soon_threadsafe(_resolve, future))
+            depth = self._enqueue(waiter, level)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._cond:
+                waiter.cancelled = True
+            raise
+        return self._waited(start, started, level, depth)
+
+    def stats(self):
+        """
+        Returns:
+            dict: queued, granted, waited, wait_avg_s and wait_max_s
+        """
+        with self._cond:
+            return {
+                "queued": len(self._queue),
+                "granted": self.granted,
+                "waited": self.waited,
+                "wait_avg_s": self.wait_total / self.waited if self.waited else 0.0,
+                "wait_max_s": self.wait_max,
+            }
+
+
+def stats():
+    """
+    Return the counters of every limiter in the process.
+
+    Returns:
+        dict: Endpoint name -> :meth:`RateLimiter.stats`
+    """
+    with _registry_lock:
+        limiters = list(_registry.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
@@ -0,0 +1,248 @@
+"""
+Instant replies to "say that again", "slower, please" and "louder, please".
+
+The personas invite these requests ("다시 설명해 드릴까예?"), and sending
+them through the chat model and Typecast costs seconds and two API calls
+only to produce a slightly different take of the same reply.
+:func:`classify` recognizes them with local rules (Korean, Gyeongsang-do
+dialect and English) and :class:`Replayer` plays the last reply's clips
+again, re-rendered with ffmpeg's ``atempo`` and ``volume`` filters when the
+user asked for slower or louder speech. Repeated requests compound: each
+"slower" takes the tempo down another step, and "again" replays the clips
+as last adjusted.
+
+Only whole short utterances are considered: after punctuation and fillers
+("어", "sorry") are dropped, the message must be nothing but the request
+("다시 말해줘", "소리 좀 키워줘", "louder"). So "병원에 뭐라고 말해야 돼?",
+"TV 소리 좀 키워줘" and "what did you say about bus 7" still go to the
+model.
+"""
+
+import logging
+import os
+import re
+import subprocess
+import uuid
+from collections import namedtuple
+
+from simple_speech_ai.audio_server import PARTIAL_SUFFIX
+from simple_speech_ai.telemetry import span
+from simple_speech_ai.transcode import OUTPUT_FORMATS
+
+logger = logging.getLogger(__name__)
+
+REPEAT = "repeat"
+SLOWER = "slower"
+LOUDER = "louder"
+
+REPLAY_PREFIX = "replay_"
+
+# Replays are short-lived, so compressed ones favour encoding speed over size
+FAST_ENCODER_OPTIONS = {"opus": ["-compression_level", "0"], "mp3": ["-compression_level", "9"]}
+
+# Longer texts are treated as real questions
+MAX_REQUEST_CHARS = 40
+
+# Adjustment per request, and the limits they compound to
+TEMPO_STEP = 0.8
+MIN_TEMPO = 0.5
+GAIN_STEP_DB = 6.0
+MAX_GAIN_DB = 12.0
+
+# Asking for something, in standard Korean and Gyeongsang-do dialect ("해도", "해 주이소")
+_DO = r"(해|하이소|하세요|해라)"
+_GIVE = r"(\s*(줘|주세요|주이소|주소|주라|줄래|주실래|주시겠어|주|도|봐|보이소|달라))?"
+_END = r"(요|예)?"
+# Saying, reading or playing something
+_SPEECH = r"((말|얘기|이야기|설명|말씀)\s*([좀쫌]\s*)?" + _DO + r"|읽어|들려|틀어)" + _GIVE + _END
+# The voice itself, with its particle ("말이", "소리가"), which slower and louder requests are about
+_VOICE = r"(말|얘기|설명|소리|목소리|볼륨)(이|가|을|를|은|는|도)?\s*"
+# Politeness around the request ("천천히 좀요", "could you slow down please")
+_POLITE = r"([좀쫌]\s*)?"
+_ASK = r"((could|can|would|will) you (please )?|please )?"
+_PLEASE = r"( please)?"
+
+# Each pattern must match the whole message, once fillers are dropped, so
+# "병원에 뭐라고 말해야 돼?" and "TV 소리 좀 키워줘" still go to the model.
+# Checked in order, so "천천히 다시 말해줘" is a request for slower speech
+RULES = (
+    (SLOWER, (
+        _POLITE + r"(천천히|느리게)\s*" + _POLITE + r"(다시\s*)?(" + _SPEECH + r"|" + _DO + _GIVE + _END + r")",
+        _POLITE + _VOICE + _POLITE + r"(너무\s*)?(빨라|빠르|빠릅)\S{0,3}",
+        _POLITE + _VOICE + _POLITE + r"(더\s*)?(천천히|느리게)(\s*" + _DO + _GIVE + r")?" + _END,
+        _POLITE + r"(천천히|느리게|너무\s*빨라)\s*" + _POLITE + _END,
+        _ASK + r"(speak|talk|say it|read it|say that)( a bit| a little)?( more)? slow(er|ly)" + _PLEASE,
+        r"(you'?re|you are) (speaking |talking )?too fast",
+        _ASK + r"(slow down|slower)" + _PLEASE,
+    )),
+    (LOUDER, (
+        _POLITE + r"(더\s*)?크게\s*" + _POLITE + r"(다시\s*)?(" + _SPEECH + r"|" + _DO + _GIVE + _END + r")",
+        _POLITE + _VOICE + _POLITE + r"(더\s*)?(크게|키워|키아|올려)(\s*" + _DO + r")?" + _GIVE + _END,
+        _POLITE + _VOICE + r"(너무\s*)?(작아|작다|작네|작습니더)" + _END,
+        r"(" + _VOICE + r")?(잘\s*)?안\s*들(려|리|린)\S{0,3}",
+        _POLITE + r"크게\s*" + _POLITE + _END,
+        _ASK + r"(speak|talk|say it|read it)( a bit| a little)? louder" + _PLEASE,
+        _ASK + r"speak up" + _PLEASE,
+        r"i can'?t hear (you|that|it)",
+        _ASK + r"(turn (it|the volume|the sound) up|turn up the (volume|sound)|volume up)" + _PLEASE,
+        r"(you'?re|your voice is|the sound is) too quiet",
+        _ASK + r"louder" + _PLEASE,
+    )),
+    (REPEAT, (
+        _POLITE + r"다시\s*(한\s*번\s*)?" + _POLITE + _SPEECH,
+        r"한\s*번\s*더(\s*" + _SPEECH + r")?" + _END,
+        r"(뭐|머|무)라(고|꼬|카노|카나|캤노|캤나|캤어|켔노|했어|했노|했나|하셨어|하셨나|고\s*(했|하셨)(어|나|노)?)" + _END,
+        r"다시" + _END,
+        _ASK + r"(say|read|play) (that|it) again" + _PLEASE,
+        _ASK + r"repeat( that| it| yourself)?" + _PLEASE,
+        r"come again|pardon( me)?|what did you say|(again|one more time)" + _PLEASE,
+    )),
+)
+
+# Interjections before a request ("어 다시 말해줘", "sorry, what did you say")
+FILLERS = re.compile(r"^((어+|음+|아+|저기요?|네|예|응|sorry|um+|uh+|oh|hey|excuse me)\s+)+")
+
+# A bare "yes" answers the assistant's offer to repeat itself
+OFFER = re.compile(r"다시\s*(한\s*번\s*)?(설명|말씀|말|얘기|이야기)\S*\s*(해\s*)?(드릴|줄|할)까|"
+                   r"\b(repeat|say) (that|it) again\?", re.IGNORECASE)
+AFFIRM = re.compile(r"^(응|어|예|네|넵|그래|그래요|그래예|좋아|좋지|해\s*줘|해\s*도|부탁해|"
+                    r"yes|yeah|yep|please|sure|ok|okay)(\s*([좀쫌]|please|요|예))?$", re.IGNORECASE)
+
+_RULES = [(intent, [re.compile(f"^({pattern})$", re.IGNORECASE) for pattern in patterns])
+          for intent, patterns in RULES]
+
+Replay = namedtuple("Replay", ["intent", "text", "audio_files"])
+
+
+def _normalize(text):
+    return " ".join(re.sub(r"[^\w\s']", " ", text.lower()).split())
+
+
+def classify(text, last_reply=None):
+    """
+    Recognize a request to replay the last reply.
+
+    Args:
+        text (str): The user's message
+        last_reply (str): The assistant's previous reply, so a bare "응"
+            after "다시 설명해 드릴까예?" counts as a repeat request
+
+    Returns:
+        str: ``REPEAT``, ``SLOWER`` or ``LOUDER``, or None for anything else
+    """
+    text = _normalize(text)
+    if not text or len(text) > MAX_REQUEST_CHARS:
+        return None
+    request = FILLERS.sub("", text)
+    for intent, patterns in _RULES:
+        if any(pattern.match(request) for pattern in patterns):
+            return intent
+    if last_reply and AFFIRM.match(text) and OFFER.search(last_reply):
+        return REPEAT
+    return None
+
+
+def adjust(intent, tempo, gain_db):
+    """
+    Apply one request to the current playback settings.
+
+    Returns:
+        tuple: New ``(tempo, gain_db)``
+    """
+    if intent == SLOWER:
+        tempo = max(MIN_TEMPO, round(tempo * TEMPO_STEP, 3))
+    elif intent == LOUDER:
+        gain_db = min(MAX_GAIN_DB, gain_db + GAIN_STEP_DB)
+    return tempo, gain_db
+
+
+class Replayer:
+    """
+    Re-renders clips at another tempo or gain with ffmpeg.
+
+    Rendered clips are written next to the originals as
+    ``replay_<name>_t<tempo>_g<gain>`` with the same extension and reused
+    while they exist. Without ffmpeg the original clip is returned.
+
+    Args:
+        ffmpeg (str): ffmpeg executable
+        bitrate (str): Bitrate for compressed clips, in ffmpeg syntax
+    """
+
+    def __init__(self, ffmpeg="ffmpeg", bitrate="32k"):
+        self.ffmpeg = ffmpeg
+        self.bitrate = bitrate
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Returns:
+            Replayer: Replayer, or None if replays are disabled
+        """
+        if not config.replay:
+            return None
+        return cls(config.ffmpeg_binary, bitrate=config.audio_bitrate)
+
+    def target_for(self, path, tempo, gain_db):
+        """Return where ``path`` rendered at ``tempo`` and ``gain_db`` is written."""
+        directory, name = os.path.split(path)
+        stem, extension = os.path.splitext(name)
+        return os.path.join(directory, f"{REPLAY_PREFIX}{stem}_t{tempo:g}_g{gain_db:g}{extension}")
+
+    def _command(self, path, output, tempo, gain_db):
+        stem, extension = os.path.splitext(path)
+        codec = ["-f", "wav"]
+        for fmt, (muxer, format_extension, encoder, options) in OUTPUT_FORMATS.items():
+            if extension == format_extension:
+                codec = (["-c:a", encoder, "-b:a", self.bitrate] + options + FAST_ENCODER_OPTIONS[fmt]
+                         + ["-f", muxer])
+                # Decoding is cheaper from the WAV a cached clip keeps next to its compressed copy
+                if os.path.exists(stem + ".wav"):
+                    path = stem + ".wav"
+        return [self.ffmpeg, "-hide_banner", "-loglevel", "error", "-y", "-i", path,
+                "-filter:a", f"atempo={tempo:g},volume={gain_db:g}dB"] + codec + [output]
+
+    def render(self, paths, tempo=1.0, gain_db=0.0):
+        """
+        Render clips at ``tempo`` (pitch unchanged) and ``gain_db``.
+
+        The clips of a reply are rendered by concurrent ffmpeg processes, so
+        a streamed reply takes about as long as its longest sentence.
+
+        Returns:
+            list: Paths of the rendered clips; a clip is returned unchanged
+            when nothing changes or ffmpeg fails on it
+        """
+        if tempo == 1.0 and gain_db == 0.0:
+            return list(paths)
+        rendered = list(paths)
+        running = []
+        with span("replay.render", tempo=tempo, gain_db=gain_db) as attributes:
+            for i, path in enumerate(paths):
+                target = self.target_for(path, tempo, gain_db)
+                if os.path.exists(target):
+                    rendered[i] = target
+                    continue
+                partial = f"{target}.{uuid.uuid4().hex[:8]}{PARTIAL_SUFFIX}"
+                try:
+                    process = subprocess.Popen(self._command(path, partial, tempo, gain_db),
+                                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+                except OSError as e:
+                    logger.warning("Replaying %s unchanged: %s", path, e)
+                    continue
+                running.append((i, target, partial, process))
+            attributes["clips"] = len(running)
+
+            for i, target, partial, process in running:
+                _, stderr = process.communicate()
+                if process.returncode == 0:
+                    os.replace(partial, target)
+                    rendered[i] = target
+                    continue
+                logger.warning("Replaying %s unchanged: %s", paths[i],
+                               stderr.decode("utf-8", "replace").strip() or f"ffmpeg exited with {process.returncode}")
+                try:
+                    os.remove(partial)
+                except OSError:
+                    pass
+        return rendered
@@ -0,0 +1,361 @@
+"""
+Semantic cache of complete replies for frequently asked questions.
+
+Users ask the same handful of things over and over. :class:`ResponseCache`
+embeds each question, looks up the most similar earlier question and, above
+a similarity threshold, hands back the earlier reply together with its
+synthesized sentences, so the turn costs neither a chat completion nor TTS.
+
+- Embedders are pluggable: :class:`HashingEmbedder` (character n-grams, no
+  model, deterministic) or :class:`SentenceTransformerEmbedder` (a local
+  ``sentence-transformers`` model). Anything with ``embed(texts)`` works.
+- :class:`NumpyIndex` scores every entry with one matrix-vector product.
+  An approximate index (e.g. hnswlib or faiss) can replace it by offering
+  the same ``add``/``remove``/``search`` methods.
+- The same question can need a different answer further into a
+  conversation, so entries are also keyed by the question asked before it,
+  normalized (see :func:`context_key`): "그럼 병원은?" after "약국 어디 있노?"
+  is not the same question as after "버스 몇 번 타노?". Opening questions
+  share one context.
+- Replies depend on the system prompt and the chat model too, so each
+  cache has a fingerprint of both (see :func:`prompt_fingerprint`) that is
+  part of every key and of every shared entry; two apps with different
+  personas never serve each other's replies.
+- Entries expire after a TTL. Questions matching the exclusion patterns are
+  neither served nor stored: by default anything time-sensitive (the next
+  bus, today's weather) and follow-ups that only make sense in context.
+- With a shared state (see :mod:`simple_speech_ai.shared_state`), stored
+  replies are also published there under increasing sequence numbers, and
+  each worker process adds the ones it has not seen before a lookup. Every
+  process embeds and searches its own copy, so lookups stay local.
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+from simple_speech_ai.shared_state import SharedState
+
+# Time-sensitive or context-dependent questions, in Korean (incl. Gyeongsang-do) and English
+DEFAULT_EXCLUDE = (
+    r"지금|오늘|내일|어제|이번|다음\s*(버스|차|열차)|몇\s*시|언제|며칠|날씨|요일",
+    r"\b(now|today|tonight|tomorrow|yesterday|next|when|what time|weather)\b",
+    r"다시|아까|그거|그게|그것|방금|\b(again|repeat)\b",
+)
+
+CachedReply = namedtuple("CachedReply", ["question", "reply", "clips", "score"])
+_Entry = namedtuple("_Entry", ["question", "reply", "clips", "stored_at", "context"])
+
+
+def _normalize(text):
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+def prompt_fingerprint(system_prompt, model):
+    """
+    Short hash of what shapes a reply besides the question: the system
+    prompt and the chat model.
+    """
+    return hashlib.sha1(f"{model}\n{system_prompt}".encode("utf-8")).hexdigest()[:12]
+
+
+def context_key(previous_question, fingerprint=""):
+    """
+    Key of the place in a conversation a question is asked: the
+    fingerprint, and the question asked before it without case,
+    punctuation or extra spaces (nothing at the start of a conversation).
+    """
+    return f"{fingerprint}:{_normalize(previous_question or '')}"
+
+
+class HashingEmbedder:
+    """
+    Hashed character n-gram vectors.
+
+    Needs no model and gives the same vectors in every process, so it
+    suits offline tests; it matches rephrasings only when they share most
+    of their characters.
+
+    Args:
+        dim (int): Vector size
+        ngrams (tuple): N-gram lengths to hash
+    """
+
+    def __init__(self, dim=1024, ngrams=(1, 2, 3)):
+        self.dim = dim
+        self.ngrams = ngrams
+
+    def embed(self, texts):
+        """
+        Returns:
+            numpy.ndarray: One L2-normalized row per text
+        """
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            normalized = _normalize(text)
+            for n in self.ngrams:
+                for i in range(len(normalized) - n + 1):
+                    vectors[row, zlib.crc32(normalized[i:i + n].encode("utf-8")) % self.dim] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class SentenceTransformerEmbedder:
+    """
+    Embeddings from a local ``sentence-transformers`` model.
+
+    Args:
+        model_name (str): Model name or path
+    """
+
+    def __init__(self, model_name="paraphrase-multilingual-MiniLM-L12-v2"):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+
+    def embed(self, texts):
+        return np.asarray(self.model.encode(list(texts), normalize_embeddings=True), dtype=np.float32)
+
+
+class NumpyIndex:
+    """
+    Exact cosine search over normalized vectors in one matrix.
+
+    Args:
+        dim (int): Vector size
+        capacity (int): Rows allocated up front; doubled when full
+    """
+
+    def __init__(self, dim, capacity=4):
+        self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self._valid = np.zeros(capacity, dtype=bool)
+        self._free = []
+        self._size = 0
+
+    def add(self, vector):
+        """
+        Returns:
+            int: Slot of the vector, for :meth:`remove`
+        """
+        if self._free:
+            slot = self._free.pop()
+        else:
+            if self._size == len(self._matrix):
+                self._matrix = np.concatenate([self._matrix, np.zeros_like(self._matrix)])
+                self._valid = np.concatenate([self._valid, np.zeros_like(self._valid)])
+            slot = self._size
+            self._size += 1
+        self._matrix[slot] = vector
+        self._valid[slot] = True
+        return slot
+
+    def remove(self, slot):
+        self._valid[slot] = False
+        self._free.append(slot)
+
+    def search(self, vector):
+        """
+        Returns:
+            tuple: ``(slot, score)`` of the most similar vector, or ``(None, 0.0)``
+        """
+        if not self._valid[:self._size].any():
+            return None, 0.0
+        scores = self._matrix[:self._size] @ vector
+        scores[~self._valid[:self._size]] = -np.inf
+        slot = int(np.argmax(scores))
+        return slot, float(scores[slot])
+
+
+class ResponseCache:
+    """
+    Thread-safe semantic reply cache with a TTL.
+
+    Args:
+        embedder: Object with ``embed(texts)``; defaults to :class:`HashingEmbedder`
+        index_factory: Called with the vector size to build an index, an object with
+            ``add``/``remove``/``search``, for each context; defaults to :class:`NumpyIndex`
+        threshold (float): Minimum cosine similarity for a hit
+        ttl (float): Seconds an entry is served
+        max_entries (int): Oldest entries are dropped beyond this
+        exclude (tuple): Regular expressions; matching questions bypass the cache
+        state (SharedState): Where entries are shared with other processes; None keeps them local
+        fingerprint (str): :func:`prompt_fingerprint` of the replies; entries with another
+            one, e.g. published by an app with another persona, are never served
+    """
+
+    ENTRIES = "response_cache"
+    SEQUENCE = "response_cache:seq"
+
+    def __init__(self, embedder=None, index_factory=NumpyIndex, threshold=0.9, ttl=86400.0, max_entries=1000,
+                 exclude=DEFAULT_EXCLUDE, state=None, fingerprint=""):
+        self.embedder = embedder or HashingEmbedder()
+        self.index_factory = index_factory
+        # context key -> index and its number of entries; entries are keyed by (context key, slot)
+        self._indexes = {}
+        self._sizes = {}
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._exclude = [re.compile(pattern, re.IGNORECASE) for pattern in exclude]
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.excluded = 0
+        self.state = state
+        self.fingerprint = fingerprint
+        # Highest shared sequence number added here, and those this process published
+        self._synced = 0
+        self._published = set()
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build the cache enabled in the configuration.
+
+        Returns:
+            ResponseCache: Cache, or None if disabled
+        """
+        if not config.response_cache:
+            return None
+        if config.response_cache_embedder == "hashing":
+            embedder = HashingEmbedder()
+        else:
+            embedder = SentenceTransformerEmbedder(config.response_cache_embedder)
+        return cls(embedder, threshold=config.response_cache_threshold,
+                   ttl=config.response_cache_ttl, max_entries=config.response_cache_max_entries,
+                   state=SharedState.from_config(config),
+                   fingerprint=prompt_fingerprint(config.system_prompt, config.chat_model))
+
+    def is_excluded(self, question):
+        return any(pattern.search(question) for pattern in self._exclude)
+
+    def _embed(self, question):
+        return self.embedder.embed([question])[0]
+
+    def lookup(self, question, previous_question=None):
+        """
+        Find the reply to a near-duplicate of ``question`` asked after the same question.
+
+        Args:
+            question (str): User utterance
+            previous_question (str): Question asked before it; None at the start of a conversation
+
+        Returns:
+            CachedReply: The cached reply, or None
+        """
+        if self.is_excluded(question):
+            with self._lock:
+                self.excluded += 1
+            return None
+        if self.state is not None:
+            self._sync()
+        vector = self._embed(question)
+        context = context_key(previous_question, self.fingerprint)
+        with self._lock:
+            self._expire()
+            index = self._indexes.get(context)
+            slot, score = (None, 0.0) if index is None else index.search(vector)
+            entry = self._entries.get((context, slot))
+            if entry is None or score < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return CachedReply(entry.question, entry.reply, entry.clips, score)
+
+    def store(self, question, reply, clips=(), previous_question=None):
+        """
+        Remember the reply to ``question``.
+
+        Args:
+            question (str): User utterance
+            reply (str): Complete reply
+            clips (list): ``(sentence, audio_file)`` pairs of the spoken reply
+            previous_question (str): Question asked before it; None at the start of a conversation
+        """
+        if not reply or self.is_excluded(question):
+            return
+        vector = self._embed(question)
+        context = context_key(previous_question, self.fingerprint)
+        with self._lock:
+            self._add(vector, _Entry(question, reply, list(clips), time.monotonic(), context))
+        if self.state is not None:
+            self._publish(question, reply, clips, context)
+
+    def _add(self, vector, entry):
+        # Caller holds the lock
+        index = self._indexes.get(entry.context)
+        if index is not None:
+            slot, score = index.search(vector)
+            if slot is not None and score >= 0.999:
+                self._drop((entry.context, slot))
+        # Dropping the last entry of a context drops its index too
+        index = self._indexes.get(entry.context)
+        if index is None:
+            index = self._indexes[entry.context] = self.index_factory(len(vector))
+        slot = index.add(vector)
+        self._entries[(entry.context, slot)] = entry
+        self._sizes[entry.context] = self._sizes.get(entry.context, 0) + 1
+        while len(self._entries) > self.max_entries:
+            self._drop(min(self._entries, key=lambda key: self._entries[key].stored_at))
+
+    def _publish(self, question, reply, clips, context):
+        seq = self.state.incr(self.SEQUENCE)
+        with self._lock:
+            self._published.add(seq)
+        record = {"question": question, "reply": reply, "clips": [list(clip) for clip in clips],
+                  "stored_at": time.time(), "context": context, "fingerprint": self.fingerprint}
+        self.state.hset(self.ENTRIES, str(seq), json.dumps(record, ensure_ascii=False))
+        if seq > self.max_entries:
+            self.state.hdel(self.ENTRIES, str(seq - self.max_entries))
+
+    def _sync(self):
+        # Adds the entries other processes published since the last lookup
+        latest = self.state.incr(self.SEQUENCE, 0)
+        with self._lock:
+            first = max(self._synced + 1, latest - self.max_entries + 1)
+            self._synced = max(self._synced, latest)
+            pending = [seq for seq in range(first, latest + 1) if seq not in self._published]
+            self._published.difference_update(range(first, latest + 1))
+        for seq in pending:
+            raw = self.state.hget(self.ENTRIES, str(seq))
+            if raw is None:
+                continue
+            record = json.loads(raw)
+            age = time.time() - record["stored_at"]
+            if age > self.ttl or record.get("fingerprint") != self.fingerprint:
+                continue
+            vector = self._embed(record["question"])
+            entry = _Entry(record["question"], record["reply"], [tuple(clip) for clip in record["clips"]],
+                           time.monotonic() - age, record["context"])
+            with self._lock:
+                self._add(vector, entry)
+
+    def _expire(self):
+        # Caller holds the lock. Entries added from other processes can be
+        # older than ones stored here before, so all of them are checked.
+        deadline = time.monotonic() - self.ttl
+        for key in [key for key, entry in self._entries.items() if entry.stored_at < deadline]:
+            self._drop(key)
+
+    def _drop(self, key):
+        if self._entries.pop(key, None) is not None:
+            context, slot = key
+            self._indexes[context].remove(slot)
+            self._sizes[context] -= 1
+            if not self._sizes[context]:
+                del self._indexes[context], self._sizes[context]
+
+    def stats(self):
+        """
+        Returns:
+            dict: hits, misses, excluded and entries
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "excluded": self.excluded,
+                    "entries": len(self._entries)}
@@ -0,0 +1,357 @@
+"""
+State shared by every worker process of a deployment.
+
+Each Streamlit worker keeps its own caches and counters, so behind a load
+balancer a session that lands on another worker loses its history, a clip
+synthesized by one worker is a cache miss on the others, and every worker
+spends the whole provider quota on its own. With ``config.shared_state``
+set, these move to a store all workers see:
+
+- conversation turns (:class:`simple_speech_ai.turn_store.SharedTurnStore`)
+- the voice cache index (:class:`simple_speech_ai.tts_cache.SharedTTSCache`)
+  and the reply cache entries (:class:`simple_speech_ai.response_cache.ResponseCache`)
+- the rate-limit buckets (:class:`simple_speech_ai.ratelimit.SharedTokenBucket`)
+
+Two backends implement the small hash/list/counter interface of
+:class:`SharedState`:
+
+- :class:`SQLiteState` (``sqlite:///path/state.db``): one database file in
+  WAL mode, for the worker processes on one host
+- :class:`RedisState` (``redis://host:6379/0``): any server speaking the
+  Redis protocol, for workers on several hosts; needs ``pip install redis``.
+  The audio directory must then be shared storage as well.
+
+Every operation is a single small read or write that no worker holds on to,
+so workers do not wait on each other for long and throughput grows with
+their number until the store itself is saturated.
+"""
+
+import math
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (name TEXT NOT NULL, field TEXT NOT NULL, value TEXT NOT NULL,
+                                   PRIMARY KEY (name, field));
+CREATE TABLE IF NOT EXISTS lists (name TEXT NOT NULL, position INTEGER NOT NULL, value TEXT NOT NULL,
+                                  PRIMARY KEY (name, position));
+CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL);
+"""
+
+
+class SharedState:
+    """
+    Interface of the shared-state backends. Values are strings; callers
+    encode anything else as JSON.
+    """
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Return the process-wide backend for ``config.shared_state``.
+
+        Returns:
+            SharedState: Backend, or None if no shared state is configured
+        """
+        if not config.shared_state:
+            return None
+        return open_state(config.shared_state)
+
+    def hget(self, name, field):
+        """Return a field of a hash, or None."""
+        raise NotImplementedError
+
+    def hset(self, name, field, value):
+        """
+        Set a field of a hash.
+
+        Returns:
+            int: 1 if the field is new, 0 if it was overwritten
+        """
+        raise NotImplementedError
+
+    def hdel(self, name, *fields):
+        """
+        Delete fields of a hash.
+
+        Returns:
+            int: Number of fields that existed
+        """
+        raise NotImplementedError
+
+    def hgetall(self, name):
+        """Return a hash as a dict."""
+        raise NotImplementedError
+
+    def rpush(self, name, value):
+        """
+        Append to a list.
+
+        Returns:
+            int: Length of the list afterwards
+        """
+        raise NotImplementedError
+
+    def lrange(self, name, start=0, stop=-1):
+        """Return list items ``start`` to ``stop``, both inclusive; negative indexes count from the end."""
+        raise NotImplementedError
+
+    def lset(self, name, index, value):
+        raise NotImplementedError
+
+    def incr(self, name, amount=1):
+        """
+        Add ``amount`` to a counter; 0 reads it.
+
+        Returns:
+            int: The new value
+        """
+        raise NotImplementedError
+
+    def delete(self, name):
+        """Delete a hash, list or counter."""
+        raise NotImplementedError
+
+    def ldelete(self, name):
+        """
+        Delete a list in one atomic step.
+
+        Returns:
+            int: Number of items it held
+        """
+        raise NotImplementedError
+
+    def take(self, name, rate, burst):
+        """
+        Take a token from the named bucket if there is one.
+
+        Returns:
+            float: 0 if a token was taken, else seconds until one will be available
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release the connection."""
+
+
+class SQLiteState(SharedState):
+    """
+    Shared state in an SQLite database, for the processes on one host.
+
+    Args:
+        path (str): Database file; created with its directory on first use
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # One connection in autocommit mode per process; threads take turns on the lock
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+
+    def _one(self, query, params=()):
+        with self._lock:
+            row = self._conn.execute(query, params).fetchone()
+        return row[0] if row else None
+
+    def hget(self, name, field):
+        return self._one("SELECT value FROM hashes WHERE name = ? AND field = ?", (name, field))
+
+    def hset(self, name, field, value):
+        with self._transaction() as conn:
+            updated = conn.execute("UPDATE hashes SET value = ? WHERE name = ? AND field = ?",
+                                   (value, name, field)).rowcount
+            if not updated:
+                conn.execute("INSERT INTO hashes (name, field, value) VALUES (?, ?, ?)", (name, field, value))
+        return 0 if updated else 1
+
+    def hdel(self, name, *fields):
+        with self._transaction() as conn:
+            return sum(conn.execute("DELETE FROM hashes WHERE name = ? AND field = ?", (name, field)).rowcount
+                       for field in fields)
+
+    def hgetall(self, name):
+        with self._lock:
+            rows = self._conn.execute("SELECT field, value FROM hashes WHERE name = ?", (name,)).fetchall()
+        return dict(rows)
+
+    @contextmanager
+    def _transaction(self):
+        # Holds the database's write lock, so other processes wait for the block
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def rpush(self, name, value):
+        with self._transaction() as conn:
+            conn.execute("INSERT INTO lists (name, position, value) "
+                         "SELECT ?, COALESCE(MAX(position), -1) + 1, ? FROM lists WHERE name = ?",
+                         (name, value, name))
+            return conn.execute("SELECT MAX(position) FROM lists WHERE name = ?", (name,)).fetchone()[0] + 1
+
+    def lrange(self, name, start=0, stop=-1):
+        with self._lock:
+            values = [row[0] for row in self._conn.execute(
+                "SELECT value FROM lists WHERE name = ? ORDER BY position", (name,))]
+        stop = len(values) + stop if stop < 0 else stop
+        start = max(0, len(values) + start if start < 0 else start)
+        return values[start:stop + 1]
+
+    def lset(self, name, index, value):
+        with self._lock:
+            updated = self._conn.execute("UPDATE lists SET value = ? WHERE name = ? AND position = ?",
+                                         (value, name, index)).rowcount
+        if not updated:
+            raise IndexError(f"{name}[{index}] does not exist")
+
+    def incr(self, name, amount=1):
+        if amount == 0:
+            return self._one("SELECT value FROM counters WHERE name = ?", (name,)) or 0
+        with self._transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO counters (name, value) VALUES (?, 0)", (name,))
+            conn.execute("UPDATE counters SET value = value + ? WHERE name = ?", (amount, name))
+            return conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()[0]
+
+    def delete(self, name):
+        with self._transaction() as conn:
+            for table in ("hashes", "lists", "counters", "buckets"):
+                conn.execute(f"DELETE FROM {table} WHERE name = ?", (name,))
+
+    def ldelete(self, name):
+        with self._transaction() as conn:
+            return conn.execute("DELETE FROM lists WHERE name = ?", (name,)).rowcount
+
+    def take(self, name, rate, burst):
+        # An exact token bucket: the read and the write are one transaction
+        with self._transaction() as conn:
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+            tokens, updated = row if row else (burst, now)
+            tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            conn.execute("INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                         (name, tokens, now))
+        return wait
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RedisState(SharedState):
+    """
+    Shared state on a Redis-protocol server, for workers on several hosts.
+
+    Rate-limit buckets are fixed windows of ``burst / rate`` seconds that
+    admit ``burst`` requests each: one ``INCR`` per request, with no server
+    scripting needed, at the cost of up to two windows' worth of requests
+    around a window boundary.
+
+    Args:
+        url (str): Server URL, e.g. ``redis://localhost:6379/0``
+        prefix (str): Prefix of every key, so deployments can share a server
+    """
+
+    def __init__(self, url, prefix="simple_speech_ai:"):
+        import redis
+
+        self.url = url
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url, decode_responses=True)
+
+    def _key(self, name):
+        return self.prefix + name
+
+    def hget(self, name, field):
+        return self._client.hget(self._key(name), field)
+
+    def hset(self, name, field, value):
+        return self._client.hset(self._key(name), field, value)
+
+    def hdel(self, name, *fields):
+        if not fields:
+            return 0
+        return self._client.hdel(self._key(name), *fields)
+
+    def hgetall(self, name):
+        return self._client.hgetall(self._key(name))
+
+    def rpush(self, name, value):
+        return self._client.rpush(self._key(name), value)
+
+    def lrange(self, name, start=0, stop=-1):
+        return self._client.lrange(self._key(name), start, stop)
+
+    def lset(self, name, index, value):
+        self._client.lset(self._key(name), index, value)
+
+    def incr(self, name, amount=1):
+        return self._client.incrby(self._key(name), amount)
+
+    def delete(self, name):
+        self._client.delete(self._key(name))
+
+    def ldelete(self, name):
+        pipeline = self._client.pipeline(transaction=True)
+        pipeline.llen(self._key(name))
+        pipeline.delete(self._key(name))
+        count, _ = pipeline.execute()
+        return count
+
+    def take(self, name, rate, burst):
+        window = burst / rate
+        now = time.time()
+        slot = int(now // window)
+        key = self._key(f"{name}:{slot}")
+        pipeline = self._client.pipeline(transaction=False)
+        pipeline.incr(key)
+        pipeline.expire(key, math.ceil(window * 2))
+        count, _ = pipeline.execute()
+        if count <= burst:
+            return 0.0
+        return (slot + 1) * window - now
+
+    def close(self):
+        self._client.close()
+
+
+def open_state(url):
+    """
+    Return the process-wide backend for ``url``.
+
+    Args:
+        url (str): ``redis://``, ``rediss://`` or ``unix://`` URL, ``sqlite:///path`` or a plain file path
+
+    Returns:
+        SharedState: Backend
+    """
+    with _registry_lock:
+        state = _registry.get(url)
+        if state is None:
+            if url.startswith(("redis://", "rediss://", "unix://")):
+                state = RedisState(url)
+            else:
+                path = url[len("sqlite:///"):] if url.startswith("sqlite:///") else url
+                state = SQLiteState(path)
+            _registry[url] = state
+        return state
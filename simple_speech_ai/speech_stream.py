@@ -0,0 +1,233 @@
+"""
+Sentence-level pipelining of streamed replies into text-to-speech.
+
+The chat completion is streamed token by token. :class:`SentenceSplitter`
+cuts that stream into sentences as soon as a boundary is certain, and
+:class:`SentencePipeline` sends each sentence to TTS on a worker pool while
+later sentences are still being generated. Finished clips are handed back
+strictly in sentence order so they can be played back in sequence.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from simple_speech_ai.cancellation import track
+from simple_speech_ai.telemetry import submit
+
+# Korean sentence-final syllables (standard and Gyeongsang-do endings such as
+# "~합니더", "~할까예", "~습니꺼", "~하이소").
+KOREAN_ENDINGS = set("다요까예더꺼소제")
+TERMINATORS = set(".!?~…。！？")
+CLOSERS = set("\"'”’)]」』")
+
+# Latin abbreviations that end in a period but rarely end a sentence.
+ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "st", "no", "vs", "etc", "e.g", "i.e"}
+
+
+class SentenceSplitter:
+    """
+    Incrementally split streamed text into sentences.
+
+    A boundary is a run of terminal punctuation followed by whitespace, or
+    terminal punctuation directly after a Korean sentence ending, or a line
+    break. Numbered list markers ("1.") and common abbreviations are not
+    treated as boundaries. Sentences shorter than ``min_chars`` are merged
+    into the following one so TTS is not called for tiny fragments.
+    """
+
+    def __init__(self, min_chars=8):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text):
+        """
+        Add streamed text.
+
+        Returns:
+            list: Sentences that are now complete
+        """
+        self._buffer += text
+        return self._drain()
+
+    def flush(self):
+        """
+        Return whatever is left once the stream has ended.
+
+        Returns:
+            list: The remaining sentence, if any
+        """
+        rest = self._buffer.strip()
+        self._buffer = ""
+        return [rest] if rest else []
+
+    def _drain(self):
+        sentences = []
+        start = 0
+        i = 0
+        buffer = self._buffer
+
+        while i < len(buffer):
+            end = self._boundary_end(buffer, start, i)
+            if end is None:
+                # Not enough text yet to decide whether this is a boundary.
+                break
+            if end:
+                sentence = buffer[start:end].strip()
+                if len(sentence) >= self.min_chars:
+                    sentences.append(sentence)
+                    start = end
+                i = end
+            else:
+                i += 1
+
+        self._buffer = buffer[start:]
+        return sentences
+
+    def _boundary_end(self, buffer, start, i):
+        """
+        Decide whether a sentence ends at ``buffer[i]``.
+
+        Returns:
+            int: Index just past the boundary, 0 if there is no boundary here,
+                or None if more text is needed to decide
+        """
+        char = buffer[i]
+        if char == "\n":
+            return i + 1
+        if char not in TERMINATORS:
+            return 0
+
+        j = i
+        while j < len(buffer) and (buffer[j] in TERMINATORS or buffer[j] in CLOSERS):
+            j += 1
+        if j == len(buffer):
+            return None
+
+        previous = buffer[i - 1] if i > start else ""
+        if previous in KOREAN_ENDINGS:
+            return j
+        if not buffer[j].isspace():
+            return 0
+
+        word = buffer[start:i].split()[-1].lower() if buffer[start:i].split() else ""
+        if char == "." and (word.isdigit() or word in ABBREVIATIONS):
+            return 0
+        return j
+
+
+class SentencePipeline:
+    """
+    Synthesize sentences concurrently while keeping playback order.
+
+    Args:
+        synthesize (callable): ``synthesize(sentence) -> audio_file``; must not
+            use Streamlit since it runs on worker threads
+        max_workers (int): Number of sentences synthesized at once
+        min_chars (int): Minimum sentence length passed to the splitter
+    """
+
+    def __init__(self, synthesize, max_workers=3, min_chars=8):
+        self._synthesize = synthesize
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._splitter = SentenceSplitter(min_chars=min_chars)
+        self._jobs = []
+        self._next = 0
+
+    def feed(self, delta):
+        """Pass a streamed text delta; complete sentences are submitted right away."""
+        for sentence in self._splitter.feed(delta):
+            self._submit(sentence)
+
+    def close(self):
+        """Submit the trailing sentence once the stream has ended."""
+        for sentence in self._splitter.flush():
+            self._submit(sentence)
+
+    def ready(self):
+        """
+        Yield clips that are finished and next in order, without blocking.
+
+        Yields:
+            tuple: (sentence, audio_file or None, exception or None)
+        """
+        while self._next < len(self._jobs) and self._jobs[self._next][1].done():
+            yield self._pop()
+
+    def remaining(self):
+        """
+        Yield every outstanding clip in order, waiting for each one.
+
+        Yields:
+            tuple: (sentence, audio_file or None, exception or None)
+        """
+        while self._next < len(self._jobs):
+            yield self._pop()
+
+    def shutdown(self):
+        """Stop the worker pool, dropping sentences that have not started."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, sentence):
+        self._jobs.append((sentence, submit(self._executor, self._synthesize, sentence)))
+
+    def _pop(self):
+        sentence, future = self._jobs[self._next]
+        self._next += 1
+        try:
+            return sentence, future.result(), None
+        except Exception as e:
+            return sentence, None, e
+
+
+class AsyncSentencePipeline(SentencePipeline):
+    """
+    Asyncio version of :class:`SentencePipeline`.
+
+    Sentences are synthesized as tasks on the running event loop, at most
+    ``max_workers`` at a time; :meth:`remaining` is an async generator.
+
+    Args:
+        synthesize (callable): Coroutine function ``synthesize(sentence) -> audio_file``
+        max_workers (int): Number of sentences synthesized at once
+        min_chars (int): Minimum sentence length passed to the splitter
+    """
+
+    def __init__(self, synthesize, max_workers=3, min_chars=8):
+        self._synthesize = synthesize
+        self._slots = asyncio.Semaphore(max_workers)
+        self._splitter = SentenceSplitter(min_chars=min_chars)
+        self._jobs = []
+        self._next = 0
+
+    async def remaining(self):
+        """
+        Yield every outstanding clip in order, waiting for each one.
+
+        Yields:
+            tuple: (sentence, audio_file or None, exception or None)
+        """
+        while self._next < len(self._jobs):
+            await asyncio.wait([self._jobs[self._next][1]])
+            yield self._pop()
+
+    def shutdown(self):
+        """Cancel sentences that are still being synthesized."""
+        for _, task in self._jobs[self._next:]:
+            task.cancel()
+
+    async def _run(self, sentence):
+        async with self._slots:
+            return await self._synthesize(sentence)
+
+    def _submit(self, sentence):
+        self._jobs.append((sentence, track(asyncio.ensure_future(self._run(sentence)))))
+
+    def _pop(self):
+        sentence, task = self._jobs[self._next]
+        self._next += 1
+        if task.cancelled():
+            return sentence, None, asyncio.CancelledError()
+        error = task.exception()
+        if error is not None:
+            return sentence, None, error
+        return sentence, task.result(), None
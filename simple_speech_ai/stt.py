@@ -0,0 +1,196 @@
+"""
+Speech-to-text stage.
+
+Recordings are encoded into an in-memory buffer and handed to the OpenAI
+client as a ``(filename, bytes, mime_type)`` tuple, so nothing touches disk.
+Silence is trimmed first (see :mod:`simple_speech_ai.vad`), and long
+recordings can be split at pauses and transcribed in parallel. Optionally
+the audio is then downsampled to 16 kHz mono (what Whisper uses internally
+anyway) and/or compressed to Opus or MP3, which shrinks the upload
+considerably.
+"""
+
+import asyncio
+import io
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from simple_speech_ai.ratelimit import RateLimiter
+from simple_speech_ai.telemetry import span, submit
+from simple_speech_ai.vad import trim_silence
+
+WHISPER_SAMPLE_RATE = 16000
+
+# format name -> (pydub export format, file extension, MIME type, export options)
+UPLOAD_FORMATS = {
+    "wav": ("wav", "wav", "audio/wav", {}),
+    "opus": ("ogg", "ogg", "audio/ogg", {"codec": "libopus", "bitrate": "24k"}),
+    "mp3": ("mp3", "mp3", "audio/mpeg", {"bitrate": "32k"}),
+}
+
+# engine is "api" or "local" (see simple_speech_ai.local_stt)
+Transcription = namedtuple("Transcription", ["text", "upload_bytes", "trimmed_seconds", "engine"],
+                           defaults=(0.0, "api"))
+
+
+def encode_for_upload(segment, fmt="wav", downsample=True):
+    """
+    Encode a pydub ``AudioSegment`` for upload.
+
+    Opus and MP3 need ffmpeg (pydub calls it); WAV does not.
+
+    Args:
+        segment (AudioSegment): The recording
+        fmt (str): One of ``UPLOAD_FORMATS``
+        downsample (bool): Convert to 16 kHz mono first
+
+    Returns:
+        tuple: ``(filename, bytes, mime_type)`` accepted by
+            ``client.audio.transcriptions.create(file=...)``
+    """
+    export_format, extension, mime_type, options = UPLOAD_FORMATS[fmt]
+    if downsample:
+        segment = segment.set_frame_rate(WHISPER_SAMPLE_RATE).set_channels(1)
+
+    buffer = io.BytesIO()
+    segment.export(buffer, format=export_format, **options)
+    return f"speech.{extension}", buffer.getvalue(), mime_type
+
+
+def join_texts(texts):
+    """Join the transcripts of consecutive chunks."""
+    return " ".join(text.strip() for text in texts if text and text.strip())
+
+
+class SpeechToText:
+    """Interface for speech-to-text stages."""
+
+    def transcribe(self, audio, language=None, fmt=None, downsample=None):
+        """
+        Transcribe a recording.
+
+        Args:
+            audio: pydub ``AudioSegment``, WAV bytes, or a prepared
+                ``(filename, bytes, mime_type)`` upload
+            language (str): ISO language code, or None to auto-detect
+            fmt (str): Upload format override
+            downsample (bool): Downsampling override
+
+        Returns:
+            Transcription: Text, number of bytes sent and seconds of silence trimmed
+
+        Raises:
+            NoSpeechError: The recording holds too little speech
+        """
+        raise NotImplementedError
+
+
+class WhisperSTT(SpeechToText):
+    """
+    OpenAI Whisper API.
+
+    Args:
+        client (OpenAI): OpenAI client
+        config (PipelineConfig): Pipeline configuration
+    """
+
+    def __init__(self, client, config):
+        self.client = client
+        self.config = config
+        self.limiter = RateLimiter.from_config(config, "openai.stt")
+
+    def trim(self, audio):
+        """
+        Trim silence from a recording and split it at pauses, as configured.
+
+        Uploads that are already encoded are passed through.
+
+        Returns:
+            tuple: ``(chunks, trimmed_seconds)``
+        """
+        if not self.config.stt_vad or isinstance(audio, (tuple, bytes, bytearray)):
+            return [audio], 0.0
+        with span("stt.vad") as attributes:
+            result = trim_silence(
+                audio,
+                min_speech_ms=self.config.vad_min_speech_ms,
+                max_pause_ms=self.config.vad_max_pause_ms,
+                split_ms=int(self.config.vad_split_seconds * 1000) or None,
+                silence_db=self.config.vad_silence_db
+            )
+            trimmed = (result.original_ms - result.kept_ms) / 1000
+            attributes.update(trimmed_s=trimmed, kept_s=result.kept_ms / 1000, chunks=len(result.chunks))
+        return result.chunks, trimmed
+
+    def prepare(self, audio, fmt=None, downsample=None):
+        """
+        Turn ``audio`` into an upload tuple.
+
+        Returns:
+            tuple: ``(filename, bytes, mime_type)``
+        """
+        if isinstance(audio, tuple):
+            return audio
+        if isinstance(audio, (bytes, bytearray)):
+            return "speech.wav", bytes(audio), "audio/wav"
+        fmt = fmt or self.config.stt_format
+        with span("stt.encode", format=fmt) as attributes:
+            upload = encode_for_upload(
+                audio,
+                fmt=fmt,
+                downsample=self.config.stt_downsample if downsample is None else downsample
+            )
+            attributes["bytes"] = len(upload[1])
+        return upload
+
+    def transcribe(self, audio, language=None, fmt=None, downsample=None):
+        chunks, trimmed = self.trim(audio)
+        uploads = [self.prepare(chunk, fmt=fmt, downsample=downsample) for chunk in chunks]
+        if len(uploads) == 1:
+            texts = [self._upload(uploads[0], language)]
+        else:
+            with ThreadPoolExecutor(max_workers=len(uploads)) as executor:
+                futures = [submit(executor, self._upload, upload, language) for upload in uploads]
+                texts = [future.result() for future in futures]
+        return Transcription(join_texts(texts), sum(len(upload[1]) for upload in uploads), trimmed)
+
+    def _upload(self, upload, language):
+        if self.limiter is not None:
+            self.limiter.acquire()
+        with span("stt.upload", model=self.config.stt_model, bytes=len(upload[1])):
+            transcript = self.client.audio.transcriptions.create(
+                model=self.config.stt_model,
+                file=upload,
+                language=language
+            )
+        return transcript.text
+
+
+class AsyncWhisperSTT(WhisperSTT):
+    """
+    Whisper on ``AsyncOpenAI``; :meth:`transcribe` is a coroutine. Encoding
+    runs on a worker thread so it does not stall the event loop.
+
+    Args:
+        client (AsyncOpenAI): Async OpenAI client
+        config (PipelineConfig): Pipeline configuration
+    """
+
+    async def transcribe(self, audio, language=None, fmt=None, downsample=None):
+        chunks, trimmed = await asyncio.to_thread(self.trim, audio)
+        uploads = await asyncio.gather(*[
+            asyncio.to_thread(self.prepare, chunk, fmt=fmt, downsample=downsample) for chunk in chunks
+        ])
+        texts = await asyncio.gather(*[self._upload(upload, language) for upload in uploads])
+        return Transcription(join_texts(texts), sum(len(upload[1]) for upload in uploads), trimmed)
+
+    async def _upload(self, upload, language):
+        if self.limiter is not None:
+            await self.limiter.acquire_async()
+        with span("stt.upload", model=self.config.stt_model, bytes=len(upload[1])):
+            transcript = await self.client.audio.transcriptions.create(
+                model=self.config.stt_model,
+                file=upload,
+                language=language
+            )
+        return transcript.text
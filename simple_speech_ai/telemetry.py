@@ -0,0 +1,396 @@
+"""
+Timing spans for the speech pipeline.
+
+Stages wrap their work in :func:`span`. Spans belong to the :class:`Trace`
+of the current turn, which carries the session and turn IDs and is found
+through a context variable, so the stages do not need to pass it around.
+Worker threads pick it up when they are started with a copy of the caller's
+context (see :func:`submit`).
+
+Finished spans go to the :class:`Tracer`'s sinks:
+
+- :class:`JSONLSink` appends one JSON object per span to a log file
+- :class:`PrometheusSink` keeps per-stage histograms and serves them in
+  the Prometheus text format on ``/metrics``
+- :class:`OpenTelemetrySink` re-emits spans through an OpenTelemetry tracer,
+  so any configured OTel exporter receives them
+
+Stage names used by the pipeline:
+
+    stt.vad             silence trimming (``trimmed_s``, ``kept_s``, ``chunks``)
+    stt.encode          audio export before upload
+    stt.upload          Whisper request
+    stt.route           local or API engine chosen (``engine``, ``queue_depth``, ``audio_s``)
+    stt.local           local faster-whisper transcription of one chunk (``audio_s``)
+    stt.local.load      local model load
+    llm.cache           semantic reply cache lookup (``hit``, ``score``)
+    llm.first_token     chat completion, until the first token
+    llm.completion      chat completion, whole reply
+    tts.synthesize      one synthesized text, including cache lookups (``provider``)
+    tts.hedge           a text sent to the primary provider and maybe a backup (``delay``,
+                        ``hedged``, ``winner``)
+    typecast.submit     job submission
+    typecast.poll       one status check
+    typecast.download   clip download
+    audio.transcode     WAV -> Opus/MP3 encode (``bytes_in``, ``bytes_out``, ``audio_seconds``)
+    replay              repeat/slower/louder request answered from the last clips (``intent``)
+    replay.render       the reply's clips re-rendered at another tempo or gain (``tempo``,
+                        ``gain_db``, ``clips``)
+    turn.cancel         superseded turn cancelled by a barge-in (``tasks`` attribute)
+    ratelimit.wait      time queued for a provider's rate limit (``endpoint``,
+                        ``priority``, ``queue_depth``)
+"""
+
+import asyncio
+import bisect
+import contextvars
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+Span = namedtuple("Span", ["name", "session_id", "turn_id", "start", "duration", "attributes"])
+
+# Trace of the turn being handled by the current thread or task
+_current = contextvars.ContextVar("simple_speech_ai_trace", default=None)
+
+
+class Trace:
+    """
+    Spans of one turn.
+
+    Args:
+        tracer (Tracer): Receives every finished span
+        session_id (str): Session the turn belongs to
+        turn_id (str): Unique turn ID
+    """
+
+    def __init__(self, tracer, session_id=None, turn_id=None):
+        self.tracer = tracer
+        self.session_id = session_id
+        self.turn_id = turn_id or uuid.uuid4().hex[:12]
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def record(self, name, start, duration, attributes=None):
+        """
+        Record a finished span.
+
+        Args:
+            name (str): Stage name
+            start (float): Start time as a Unix timestamp
+            duration (float): Duration in seconds
+            attributes (dict): Extra span attributes
+        """
+        finished = Span(name, self.session_id, self.turn_id, start, duration, dict(attributes or {}))
+        with self._lock:
+            self.spans.append(finished)
+        self.tracer.export(finished)
+
+    def breakdown(self):
+        """
+        Summarize the turn by stage, in order of first appearance.
+
+        Spans of sentences synthesized in parallel overlap, so the stage
+        totals can add up to more than the turn's wall time.
+
+        Returns:
+            list: ``(stage, count, total_seconds)`` tuples
+        """
+        with self._lock:
+            spans = list(self.spans)
+        totals = {}
+        for finished in spans:
+            count, total = totals.get(finished.name, (0, 0.0))
+            totals[finished.name] = (count + 1, total + finished.duration)
+        return [(name, count, total) for name, (count, total) in totals.items()]
+
+    def elapsed(self):
+        """Seconds from the first span's start to the last span's end."""
+        with self._lock:
+            if not self.spans:
+                return 0.0
+            return (max(s.start + s.duration for s in self.spans)
+                    - min(s.start for s in self.spans))
+
+
+def current_trace():
+    """Return the active :class:`Trace`, or None outside a turn."""
+    return _current.get()
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Time a block as a span of the current turn.
+
+    Yields the attribute dict, so the block can add attributes it only
+    learns while running. Exceptions are recorded as an ``error``
+    attribute and cancellation as ``cancelled``, and both are re-raised;
+    outside a turn nothing is recorded.
+    """
+    trace = _current.get()
+    start = time.time()
+    started = time.perf_counter()
+    try:
+        yield attributes
+    except (GeneratorExit, asyncio.CancelledError):
+        attributes["cancelled"] = True
+        raise
+    except BaseException as e:
+        attributes["error"] = type(e).__name__
+        raise
+    finally:
+        if trace is not None:
+            trace.record(name, start, time.perf_counter() - started, attributes)
+
+
+@contextmanager
+def activate(trace):
+    """Make ``trace`` (possibly None) the current turn for the duration of the block."""
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+def record(name, start, duration, **attributes):
+    """Record an already measured span on the current turn, if any."""
+    trace = _current.get()
+    if trace is not None:
+        trace.record(name, start, duration, attributes)
+
+
+def submit(executor, fn, *args, **kwargs):
+    """
+    ``executor.submit`` that runs ``fn`` in a copy of the caller's context,
+    so spans from worker threads land in the caller's turn.
+    """
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+class Tracer:
+    """
+    Opens turns and fans finished spans out to sinks.
+
+    Args:
+        sinks (list): Objects with ``export(span)`` and optionally ``close()``
+    """
+
+    def __init__(self, sinks=()):
+        self.sinks = list(sinks)
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build the sinks enabled in the configuration.
+
+        Returns:
+            Tracer: Tracer, possibly without sinks
+        """
+        sinks = []
+        if config.telemetry_log:
+            sinks.append(JSONLSink(config.telemetry_log))
+        if config.metrics_port is not None:
+            sinks.append(PrometheusSink().serve(config.metrics_host, config.metrics_port))
+        if config.telemetry_otel:
+            sinks.append(OpenTelemetrySink())
+        return cls(sinks)
+
+    @contextmanager
+    def turn(self, session_id=None):
+        """
+        Make a new turn current for the duration of the block.
+
+        Re-entering while a turn of this tracer is already active reuses it,
+        so a transcription and the reply it triggers share one turn ID.
+
+        Yields:
+            Trace: The active turn
+        """
+        active = _current.get()
+        if active is not None and active.tracer is self:
+            yield active
+            return
+        trace = Trace(self, session_id)
+        token = _current.set(trace)
+        try:
+            yield trace
+        finally:
+            try:
+                _current.reset(token)
+            except ValueError:
+                # A generator holding the turn was closed from another context
+                pass
+
+    def export(self, finished):
+        for sink in self.sinks:
+            try:
+                sink.export(finished)
+            except Exception:
+                logger.exception("Telemetry sink %r failed", sink)
+
+    def close(self):
+        for sink in self.sinks:
+            close = getattr(sink, "close", None)
+            if close:
+                close()
+
+
+class JSONLSink:
+    """
+    Append spans to a file as JSON lines.
+
+    Args:
+        path (str): Log file path
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, finished):
+        line = json.dumps(finished._asdict(), ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class PrometheusSink:
+    """
+    Per-stage latency histograms in the Prometheus text format.
+
+    Args:
+        buckets (tuple): Histogram upper bounds in seconds
+    """
+
+    DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0)
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._histograms = {}
+        self._errors = {}
+        self._cancelled = {}
+        self._lock = threading.Lock()
+        self._httpd = None
+
+    def export(self, finished):
+        with self._lock:
+            counts, total = self._histograms.get(finished.name, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, finished.duration)] += 1
+            self._histograms[finished.name] = (counts, total + finished.duration)
+            if "error" in finished.attributes:
+                self._errors[finished.name] = self._errors.get(finished.name, 0) + 1
+            if finished.attributes.get("cancelled"):
+                self._cancelled[finished.name] = self._cancelled.get(finished.name, 0) + 1
+
+    def render(self):
+        """
+        Returns:
+            str: Metrics in the Prometheus text exposition format
+        """
+        lines = [
+            "# HELP speech_stage_duration_seconds Duration of speech pipeline stages.",
+            "# TYPE speech_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            histograms = {name: (list(counts), total) for name, (counts, total) in self._histograms.items()}
+            errors = dict(self._errors)
+            cancelled = dict(self._cancelled)
+        for name in sorted(histograms):
+            counts, total = histograms[name]
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'speech_stage_duration_seconds_bucket{{stage="{name}",le="{le}"}} {cumulative}')
+            lines.append(f'speech_stage_duration_seconds_sum{{stage="{name}"}} {total:.6f}')
+            lines.append(f'speech_stage_duration_seconds_count{{stage="{name}"}} {cumulative}')
+        lines += [
+            "# HELP speech_stage_errors_total Failed speech pipeline stages.",
+            "# TYPE speech_stage_errors_total counter",
+        ]
+        for name in sorted(errors):
+            lines.append(f'speech_stage_errors_total{{stage="{name}"}} {errors[name]}')
+        lines += [
+            "# HELP speech_stage_cancelled_total Speech pipeline stages cut short by a cancelled turn.",
+            "# TYPE speech_stage_cancelled_total counter",
+        ]
+        for name in sorted(cancelled):
+            lines.append(f'speech_stage_cancelled_total{{stage="{name}"}} {cancelled[name]}')
+        return "\n".join(lines) + "\n"
+
+    def serve(self, host="127.0.0.1", port=0):
+        """
+        Serve :meth:`render` on ``http://host:port/metrics`` from a daemon thread.
+
+        Returns:
+            PrometheusSink: self
+        """
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = sink.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    @property
+    def port(self):
+        return self._httpd.server_address[1] if self._httpd else None
+
+    def close(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+
+class OpenTelemetrySink:
+    """
+    Re-emit spans through OpenTelemetry.
+
+    Requires ``opentelemetry-api``; exporters are configured the usual way
+    (e.g. ``opentelemetry-instrument`` or an SDK ``TracerProvider``).
+
+    Args:
+        tracer: OpenTelemetry tracer; defaults to one from the global provider
+    """
+
+    def __init__(self, tracer=None):
+        if tracer is None:
+            from opentelemetry import trace
+            tracer = trace.get_tracer("simple_speech_ai")
+        self.tracer = tracer
+
+    def export(self, finished):
+        attributes = {
+            "session.id": finished.session_id or "",
+            "turn.id": finished.turn_id or "",
+        }
+        for key, value in finished.attributes.items():
+            attributes[key] = value if isinstance(value, (str, bool, int, float)) else str(value)
+        start_ns = int(finished.start * 1e9)
+        otel_span = self.tracer.start_span(finished.name, start_time=start_ns, attributes=attributes)
+        otel_span.end(end_time=start_ns + int(finished.duration * 1e9))
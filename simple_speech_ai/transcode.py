@@ -0,0 +1,153 @@
+"""
+Compressed output for synthesized speech.
+
+Typecast delivers uncompressed WAV, which is large to push to a phone on
+mobile data. :class:`Transcoder` re-encodes downloaded clips to Opus or MP3
+with ffmpeg in a small worker pool, so encoding never runs on a session's
+script thread or on the event loop. The compressed file replaces the WAV
+next to it; cached and phrase bank WAVs are kept, and their compressed
+sibling is reused the next time they are served.
+"""
+
+import asyncio
+import os
+import subprocess
+import uuid
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+from simple_speech_ai.audio_server import PARTIAL_SUFFIX
+from simple_speech_ai.phrase_bank import PHRASE_PREFIX
+from simple_speech_ai.telemetry import span, submit
+from simple_speech_ai.tts_cache import CACHE_PREFIX
+
+# Shared WAVs that are kept after encoding: cache entries and phrase bank clips
+SHARED_PREFIXES = (CACHE_PREFIX, PHRASE_PREFIX)
+
+# format name -> (ffmpeg muxer, file extension, encoder, extra encoder options)
+OUTPUT_FORMATS = {
+    "opus": ("ogg", ".ogg", "libopus", ["-application", "voip"]),
+    "mp3": ("mp3", ".mp3", "libmp3lame", []),
+}
+
+
+class TranscodeError(Exception):
+    """Raised when ffmpeg fails to encode a clip."""
+
+
+def wav_duration(path):
+    """
+    Return the length of a WAV file in seconds, or None if it is not readable.
+    """
+    try:
+        with wave.open(path, "rb") as wav:
+            return wav.getnframes() / float(wav.getframerate())
+    except (OSError, EOFError, wave.Error):
+        return None
+
+
+class Transcoder:
+    """
+    ffmpeg-based WAV -> Opus/MP3 encoder with a bounded worker pool.
+
+    Args:
+        fmt (str): One of ``OUTPUT_FORMATS``
+        bitrate (str): Target bitrate in ffmpeg syntax, e.g. ``"32k"``
+        workers (int): Maximum concurrent ffmpeg processes
+        ffmpeg (str): ffmpeg executable
+    """
+
+    def __init__(self, fmt="opus", bitrate="32k", workers=2, ffmpeg="ffmpeg"):
+        if fmt not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported output format: {fmt}")
+        self.fmt = fmt
+        self.bitrate = bitrate
+        self.ffmpeg = ffmpeg
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="transcode")
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build the transcoder for ``config.audio_format``.
+
+        Returns:
+            Transcoder: Transcoder, or None when clips are served as WAV
+        """
+        if config.audio_format == "wav":
+            return None
+        return cls(config.audio_format, bitrate=config.audio_bitrate,
+                   workers=config.transcode_workers, ffmpeg=config.ffmpeg_binary)
+
+    @property
+    def extension(self):
+        return OUTPUT_FORMATS[self.fmt][1]
+
+    def target_for(self, path):
+        """Return the compressed file path for the WAV at ``path``."""
+        return os.path.splitext(path)[0] + self.extension
+
+    def encode(self, path):
+        """
+        Encode ``path`` on the calling thread.
+
+        The result is written to a private ``.part`` file and renamed when
+        complete, so sessions encoding the same cached clip do not collide.
+        The WAV is deleted afterwards unless it is shared.
+
+        Returns:
+            str: Path of the compressed file
+        """
+        target = self.target_for(path)
+        if os.path.basename(path).startswith(SHARED_PREFIXES) and os.path.exists(target):
+            return target
+
+        muxer, _, encoder, options = OUTPUT_FORMATS[self.fmt]
+        partial = f"{target}.{uuid.uuid4().hex[:8]}{PARTIAL_SUFFIX}"
+        command = [self.ffmpeg, "-hide_banner", "-loglevel", "error", "-y", "-i", path,
+                   "-c:a", encoder, "-b:a", self.bitrate] + options + ["-f", muxer, partial]
+
+        with span("audio.transcode", format=self.fmt, bitrate=self.bitrate) as attributes:
+            attributes["audio_seconds"] = wav_duration(path)
+            attributes["bytes_in"] = os.path.getsize(path)
+            try:
+                result = subprocess.run(command, capture_output=True)
+                if result.returncode != 0:
+                    raise TranscodeError(result.stderr.decode("utf-8", "replace").strip()
+                                         or f"ffmpeg exited with {result.returncode}")
+                os.replace(partial, target)
+            except BaseException:
+                try:
+                    os.remove(partial)
+                except OSError:
+                    pass
+                raise
+            attributes["bytes_out"] = os.path.getsize(target)
+
+        if not os.path.basename(path).startswith(SHARED_PREFIXES):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return target
+
+    def transcode(self, path):
+        """
+        Encode ``path`` in the worker pool and wait for it.
+
+        Returns:
+            str: Path of the compressed file
+        """
+        return submit(self._executor, self.encode, path).result()
+
+    async def transcode_async(self, path):
+        """
+        Coroutine version of :meth:`transcode`; the event loop keeps running
+        while ffmpeg works.
+
+        Returns:
+            str: Path of the compressed file
+        """
+        return await asyncio.wrap_future(submit(self._executor, self.encode, path))
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,213 @@
+"""
+Text-to-speech stage.
+"""
+
+import asyncio
+import logging
+import os
+import wave
+
+from simple_speech_ai.phrase_bank import PhraseBank, stitch
+from simple_speech_ai.polling import AdaptivePoller
+from simple_speech_ai.ratelimit import RateLimiter
+from simple_speech_ai.telemetry import span
+from simple_speech_ai.transcode import SHARED_PREFIXES, Transcoder
+from simple_speech_ai.tts_cache import TTSCache, cache_key
+from simple_speech_ai.typecast import TypecastClient, build_payload, unique_filename
+
+logger = logging.getLogger(__name__)
+
+
+class TextToSpeech:
+    """Interface for text-to-speech stages."""
+
+    # Name used in spans and latency statistics
+    provider = None
+
+    def synthesize(self, text, on_poll=None, progressive=False):
+        """
+        Synthesize ``text`` into an audio file.
+
+        Args:
+            text (str): Text to speak
+            on_poll (callable): Optional ``on_poll(elapsed, deadline)`` progress hook
+            progressive (bool): Return while the file is still being written
+
+        Returns:
+            str: Path of the audio file
+        """
+        raise NotImplementedError
+
+    def cached(self, text):
+        """Return whether ``text`` would be served without synthesizing anything."""
+        return False
+
+    def stats(self):
+        """Return stage counters for display."""
+        return {}
+
+    def close(self):
+        """Release network resources."""
+
+
+class TypecastTTS(TextToSpeech):
+    """
+    Typecast synthesis through a pooled client, with the on-disk cache and
+    the adaptive poller shared by every caller of this instance. Clips are
+    transcoded when ``config.audio_format`` is not WAV; progressive
+    playback then waits for the complete download.
+
+    If a phrase bank was built for the configured voice, fixed phrases at
+    the start and end of a text are served from it and only the rest is
+    synthesized; the pieces are stitched into one clip.
+
+    Args:
+        config (PipelineConfig): Pipeline configuration
+    """
+
+    provider = "typecast"
+
+    def __init__(self, config):
+        self.config = config
+        os.makedirs(config.audio_dir, exist_ok=True)
+        self.client = TypecastClient(
+            api_key=config.typecast_api_key,
+            pool_size=config.typecast_pool_size,
+            connect_timeout=config.typecast_connect_timeout,
+            read_timeout=config.typecast_read_timeout,
+            retries=config.typecast_retries,
+            speak_url=config.typecast_speak_url,
+            submit_limiter=RateLimiter.from_config(config, "typecast.submit"),
+            poll_limiter=RateLimiter.from_config(config, "typecast.poll")
+        )
+        self.cache = TTSCache.from_config(config)
+        self.poller = AdaptivePoller(deadline=config.poll_deadline)
+        self.transcoder = Transcoder.from_config(config)
+        self.phrases = PhraseBank.from_config(config) if config.phrase_bank else None
+
+    def _split(self, text):
+        if self.phrases is None:
+            return [], text, []
+        return self.phrases.split(text)
+
+    def _request(self, text, on_poll, progressive):
+        return self.client.synthesize(
+            text,
+            actor_id=self.config.typecast_actor_id,
+            tempo=self.config.tts_tempo,
+            volume=self.config.tts_volume,
+            pitch=self.config.tts_pitch,
+            model_version=self.config.tts_model_version,
+            poller=self.poller,
+            output_dir=self.config.audio_dir,
+            on_poll=on_poll,
+            cache=self.cache,
+            progressive=progressive and self.transcoder is None
+        )
+
+    def cached(self, text):
+        leading, middle, trailing = self._split(text)
+        if (leading or trailing) and not middle:
+            return True
+        payload = build_payload(middle if leading or trailing else text, actor_id=self.config.typecast_actor_id,
+                                tempo=self.config.tts_tempo, volume=self.config.tts_volume,
+                                pitch=self.config.tts_pitch, model_version=self.config.tts_model_version)
+        return cache_key(payload) in self.cache
+
+    def _stitch(self, clips, middle_file):
+        """
+        Join phrase clips and the synthesized middle into a new clip.
+
+        Returns:
+            str: Path of the joined WAV, or None if the clips do not match
+        """
+        try:
+            output = stitch(clips, unique_filename(self.config.audio_dir))
+        except (ValueError, wave.Error, EOFError) as e:
+            logger.warning("Phrase bank clips not used: %s", e)
+            return None
+        if middle_file and not os.path.basename(middle_file).startswith(SHARED_PREFIXES):
+            os.remove(middle_file)
+        return output
+
+    def synthesize(self, text, on_poll=None, progressive=False):
+        leading, middle, trailing = self._split(text)
+        audio_file = None
+        if leading or trailing:
+            middle_file = None
+            if middle:
+                with span("tts.synthesize", provider="typecast", chars=len(middle),
+                          phrases=len(leading) + len(trailing)):
+                    middle_file = self._request(middle, on_poll, progressive=False)
+            clips = leading + ([middle_file] if middle_file else []) + trailing
+            audio_file = clips[0] if len(clips) == 1 else self._stitch(clips, middle_file)
+        if audio_file is None:
+            with span("tts.synthesize", provider="typecast", chars=len(text)):
+                audio_file = self._request(text, on_poll, progressive)
+        if self.transcoder is not None:
+            audio_file = self.transcoder.transcode(audio_file)
+        return audio_file
+
+    def stats(self):
+        return self.cache.stats()
+
+    def close(self):
+        self.client.close()
+        if self.transcoder is not None:
+            self.transcoder.close()
+
+
+class AsyncTypecastTTS(TypecastTTS):
+    """
+    Typecast synthesis on :class:`simple_speech_ai.typecast_async.AsyncTypecastClient`;
+    :meth:`synthesize` and :meth:`close` are coroutines.
+
+    Args:
+        config (PipelineConfig): Pipeline configuration
+    """
+
+    def __init__(self, config):
+        from simple_speech_ai.typecast_async import AsyncTypecastClient
+
+        self.config = config
+        os.makedirs(config.audio_dir, exist_ok=True)
+        self.client = AsyncTypecastClient(
+            api_key=config.typecast_api_key,
+            pool_size=config.typecast_async_pool_size,
+            connect_timeout=config.typecast_connect_timeout,
+            read_timeout=config.typecast_read_timeout,
+            retries=config.typecast_retries,
+            speak_url=config.typecast_speak_url,
+            submit_limiter=RateLimiter.from_config(config, "typecast.submit"),
+            poll_limiter=RateLimiter.from_config(config, "typecast.poll")
+        )
+        self.cache = TTSCache.from_config(config)
+        self.poller = AdaptivePoller(deadline=config.poll_deadline)
+        self.transcoder = Transcoder.from_config(config)
+        self.phrases = PhraseBank.from_config(config) if config.phrase_bank else None
+
+    async def synthesize(self, text, on_poll=None, progressive=False):
+        leading, middle, trailing = self._split(text)
+        audio_file = None
+        if leading or trailing:
+            middle_file = None
+            if middle:
+                with span("tts.synthesize", provider="typecast", chars=len(middle),
+                          phrases=len(leading) + len(trailing)):
+                    middle_file = await self._request(middle, on_poll, progressive=False)
+            clips = leading + ([middle_file] if middle_file else []) + trailing
+            if len(clips) == 1:
+                audio_file = clips[0]
+            else:
+                audio_file = await asyncio.to_thread(self._stitch, clips, middle_file)
+        if audio_file is None:
+            with span("tts.synthesize", provider="typecast", chars=len(text)):
+                audio_file = await self._request(text, on_poll, progressive)
+        if self.transcoder is not None:
+            audio_file = await self.transcoder.transcode_async(audio_file)
+        return audio_file
+
+    async def close(self):
+        await self.client.close()
+        if self.transcoder is not None:
+            self.transcoder.close()
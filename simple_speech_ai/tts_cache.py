@@ -0,0 +1,336 @@
+"""
+Content-addressed on-disk cache for synthesized speech.
+
+Clips are stored in the audio directory under a name derived from a hash of
+everything that changes the audio (normalized text, actor, tempo, pitch,
+volume and model version), so repeated phrases such as greetings and
+closings are served from disk without calling Typecast. An in-memory index
+keeps entries in least-recently-used order and evicts the oldest ones once
+the byte budget is exceeded. The compressed copies the transcoder keeps next
+to a cached clip count towards the budget and are evicted with it. With ``config.shared_state`` set,
+:class:`SharedTTSCache` keeps the index in the shared state instead, so a
+clip synthesized by one worker process is a hit on all of them.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from simple_speech_ai.shared_state import SharedState
+
+CACHE_PREFIX = "tts_"
+CACHE_SUFFIX = ".wav"
+# Compressed copies written next to a cached clip (see simple_speech_ai.transcode.OUTPUT_FORMATS)
+SIBLING_SUFFIXES = (".ogg", ".mp3")
+DEFAULT_MAX_BYTES = 500 * 1024 * 1024
+
+# Payload fields that change the synthesized audio
+KEY_FIELDS = ('actor_id', 'tempo', 'pitch', 'volume', 'model_version')
+
+
+def normalize_text(text):
+    """
+    Normalize text so trivially different spellings share a cache entry.
+
+    Returns:
+        str: NFC-normalized text with collapsed whitespace
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(payload):
+    """
+    Build the cache key for a Typecast synthesis payload.
+
+    Args:
+        payload (dict): Payload from :func:`simple_speech_ai.typecast.build_payload`
+
+    Returns:
+        str: Hex digest identifying the audio
+    """
+    material = {field: payload.get(field) for field in KEY_FIELDS}
+    material['text'] = normalize_text(payload['text'])
+    encoded = json.dumps(material, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:32]
+
+
+class TTSCache:
+    """
+    LRU cache of synthesized clips with a byte budget.
+
+    The cache is safe to share between sessions and worker threads. Entries
+    already on disk are picked up at start-up, oldest first.
+
+    Args:
+        directory (str): Directory holding the cached clips
+        max_bytes (int): Total size allowed before evicting old clips
+    """
+
+    def __init__(self, directory="./audio_files", max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = 0
+        self._index = OrderedDict()
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+        with self._lock:
+            self._evict()
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Return the cache for ``config.audio_dir``, indexed in
+        ``config.shared_state`` if one is set.
+
+        Returns:
+            TTSCache: The cache
+        """
+        state = SharedState.from_config(config)
+        if state is not None:
+            return SharedTTSCache(state, config.audio_dir, max_bytes=config.tts_cache_max_bytes)
+        return cls(config.audio_dir, max_bytes=config.tts_cache_max_bytes)
+
+    def path_for(self, key):
+        """Return the file path used for ``key``."""
+        return os.path.join(self.directory, f"{CACHE_PREFIX}{key}{CACHE_SUFFIX}")
+
+    def _paths(self, key):
+        # The clip and its compressed copies
+        stem = os.path.join(self.directory, f"{CACHE_PREFIX}{key}")
+        return [stem + suffix for suffix in (CACHE_SUFFIX,) + SIBLING_SUFFIXES]
+
+    def _size(self, key):
+        # Bytes of the clip and the compressed copies made of it so far
+        size = 0
+        for path in self._paths(key):
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+        return size
+
+    def _remove(self, key):
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def __contains__(self, key):
+        # A peek: neither counted as a hit or miss nor moved in the LRU order
+        with self._lock:
+            return key in self._index and os.path.exists(self.path_for(key))
+
+    def get(self, key):
+        """
+        Look up a clip.
+
+        Returns:
+            str: Path of the cached clip, or None on a miss
+        """
+        with self._lock:
+            if key in self._index and os.path.exists(self.path_for(key)):
+                self._index.move_to_end(key)
+                self.hits += 1
+                path = self.path_for(key)
+                # A compressed copy may have been made since the clip was stored
+                size = self._size(key)
+                self._bytes += size - self._index[key]
+                self._index[key] = size
+                self._evict(keep=key)
+            else:
+                self._drop(key)
+                self.misses += 1
+                return None
+
+        # Persist recency so the LRU order survives a restart
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def put(self, key, source_path):
+        """
+        Move a freshly downloaded clip into the cache.
+
+        Args:
+            key (str): Cache key from :func:`cache_key`
+            source_path (str): Downloaded clip; it is renamed, not copied
+
+        Returns:
+            str: Path of the cached clip
+        """
+        path = self.path_for(key)
+        if os.path.abspath(source_path) != os.path.abspath(path):
+            os.replace(source_path, path)
+        size = self._size(key)
+
+        with self._lock:
+            self._drop(key)
+            self._index[key] = size
+            self._bytes += size
+            self._evict(keep=key)
+        return path
+
+    def stats(self):
+        """
+        Return cache counters.
+
+        Returns:
+            dict: hits, misses, evictions, entries and bytes
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._index),
+                "bytes": self._bytes
+            }
+
+    def _load_index(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.startswith(CACHE_PREFIX) and name.endswith(CACHE_SUFFIX):
+                key = name[len(CACHE_PREFIX):-len(CACHE_SUFFIX)]
+                entries.append((os.path.getmtime(os.path.join(self.directory, name)), key, self._size(key)))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._bytes += size
+
+    def _drop(self, key):
+        size = self._index.pop(key, None)
+        if size is not None:
+            self._bytes -= size
+
+    def _evict(self, keep=None):
+        # Caller holds the lock
+        while self._bytes > self.max_bytes and self._index:
+            key = next(iter(self._index))
+            if key == keep:
+                break
+            self._drop(key)
+            self.evictions += 1
+            self._remove(key)
+
+
+class SharedTTSCache(TTSCache):
+    """
+    :class:`TTSCache` indexed in a shared state, for several worker processes.
+
+    The index maps keys to clip sizes, with counters of entries and bytes
+    next to it. The clips stay in the audio directory, which every worker
+    must see; their modification times give the LRU order. Hit and miss
+    counts are per process.
+
+    Args:
+        state (SharedState): Backend holding the index
+        directory (str): Directory holding the cached clips
+        max_bytes (int): Total size allowed before evicting old clips
+    """
+
+    INDEX = "tts_cache"
+    ENTRIES = "tts_cache:entries"
+    BYTES = "tts_cache:bytes"
+
+    def __init__(self, state, directory="./audio_files", max_bytes=DEFAULT_MAX_BYTES):
+        self.state = state
+        super().__init__(directory, max_bytes)
+
+    def __contains__(self, key):
+        return self.state.hget(self.INDEX, key) is not None and os.path.exists(self.path_for(key))
+
+    def get(self, key):
+        path = self.path_for(key)
+        stored = self.state.hget(self.INDEX, key)
+        if stored is not None:
+            try:
+                os.utime(path)
+            except OSError:
+                # Deleted behind the index's back
+                self._drop(key)
+            else:
+                # A compressed copy may have been made since the clip was stored
+                size = self._size(key)
+                if size != int(stored):
+                    self.state.hset(self.INDEX, key, str(size))
+                    self.state.incr(self.BYTES, size - int(stored))
+                with self._lock:
+                    self.hits += 1
+                    self._evict(keep=key)
+                return path
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, source_path):
+        path = self.path_for(key)
+        if os.path.abspath(source_path) != os.path.abspath(path):
+            os.replace(source_path, path)
+        self._add(key, self._size(key))
+        with self._lock:
+            self._evict(keep=key)
+        return path
+
+    def stats(self):
+        with self._lock:
+            hits, misses, evictions = self.hits, self.misses, self.evictions
+        return {
+            "hits": hits,
+            "misses": misses,
+            "evictions": evictions,
+            "entries": self.state.incr(self.ENTRIES, 0),
+            "bytes": self.state.incr(self.BYTES, 0)
+        }
+
+    def _add(self, key, size):
+        # Rewriting a key writes the same audio, so only new keys change the totals
+        if self.state.hset(self.INDEX, key, str(size)):
+            self.state.incr(self.ENTRIES)
+            self.state.incr(self.BYTES, size)
+
+    def _load_index(self):
+        # Adopt clips another worker or an earlier run left in the directory
+        for name in os.listdir(self.directory):
+            if name.startswith(CACHE_PREFIX) and name.endswith(CACHE_SUFFIX):
+                key = name[len(CACHE_PREFIX):-len(CACHE_SUFFIX)]
+                if self.state.hget(self.INDEX, key) is None:
+                    self._add(key, self._size(key))
+
+    def _drop(self, key):
+        size = self.state.hget(self.INDEX, key)
+        # Only the worker whose delete went through adjusts the totals
+        if size is not None and self.state.hdel(self.INDEX, key):
+            self.state.incr(self.ENTRIES, -1)
+            self.state.incr(self.BYTES, -int(size))
+
+    def _mtime(self, key):
+        try:
+            return os.path.getmtime(self.path_for(key))
+        except OSError:
+            return 0.0
+
+    def _evict(self, keep=None):
+        # Caller holds the lock
+        if self.state.incr(self.BYTES, 0) <= self.max_bytes:
+            return
+        index = self.state.hgetall(self.INDEX)
+        total = sum(int(size) for size in index.values())
+        for key in sorted(index, key=self._mtime):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= int(index[key])
+            self._drop(key)
+            self.evictions += 1
+            self._remove(key)
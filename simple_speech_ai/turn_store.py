@@ -0,0 +1,186 @@
+"""
+Persistent, append-only store of conversation turns.
+
+Without it a conversation lives only in the Streamlit session and is lost
+when the browser reconnects. :class:`TurnStore` keeps one compact record
+per turn in SQLite: the user and assistant text, their token counts and the
+paths of the reply's clips (the audio itself stays in the audio directory).
+A session reloaded from the store comes back with its token counts, so
+nothing is tokenized again.
+
+The database runs in WAL mode, so the app processes on a host can append
+turns while others read, and each append is a single small insert. Without
+a path but with ``config.shared_state`` set, :class:`SharedTurnStore` keeps
+the same records in the shared state, so a session can resume on any worker.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from simple_speech_ai.shared_state import SharedState
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    user TEXT NOT NULL,
+    assistant TEXT,
+    user_tokens INTEGER NOT NULL,
+    assistant_tokens INTEGER NOT NULL,
+    audio TEXT,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS turns_session ON turns (session_id, id);
+"""
+
+
+def _entry(turn_id, user, assistant, user_tokens, assistant_tokens, audio_files):
+    entry = {"user": user, "user_tokens": user_tokens, "turn_id": turn_id, "audio_files": audio_files}
+    if assistant is not None:
+        entry["assistant"] = assistant
+        entry["assistant_tokens"] = assistant_tokens
+    return entry
+
+
+class TurnStore:
+    """
+    SQLite-backed turn records, shared by every session in a process.
+
+    Args:
+        path (str): Database file; created with its directory on first use
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # One connection in autocommit mode; sessions take turns on the lock
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Open the store at ``config.turn_store_path``, or else the one in
+        ``config.shared_state``.
+
+        Returns:
+            TurnStore: The store, or None if neither is configured
+        """
+        if config.turn_store_path:
+            return cls(config.turn_store_path)
+        state = SharedState.from_config(config)
+        if state is None:
+            return None
+        return SharedTurnStore(state)
+
+    def append(self, session_id, entry):
+        """
+        Record a finished turn.
+
+        Args:
+            entry (dict): History entry with ``user``, ``assistant``, their
+                token counts and ``audio_files``
+
+        Returns:
+            int: ID of the stored turn
+        """
+        audio = json.dumps(entry.get("audio_files") or [])
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO turns (session_id, user, assistant, user_tokens, assistant_tokens, audio, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (session_id, entry["user"], entry.get("assistant"), entry["user_tokens"],
+                 entry.get("assistant_tokens", 0), audio, time.time())
+            )
+            return cursor.lastrowid
+
+    def set_audio(self, turn_id, audio_files):
+        """Replace the clip paths recorded for a turn."""
+        with self._lock:
+            self._conn.execute("UPDATE turns SET audio = ? WHERE id = ?", (json.dumps(audio_files), turn_id))
+
+    def turns(self, session_id):
+        """
+        Load a session's turns, oldest first.
+
+        Returns:
+            list: History entries, each with its ``turn_id``
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, user, assistant, user_tokens, assistant_tokens, audio FROM turns "
+                "WHERE session_id = ? ORDER BY id", (session_id,)
+            ).fetchall()
+        return [_entry(*row[:5], json.loads(row[5]) if row[5] else []) for row in rows]
+
+    def delete(self, session_id):
+        """
+        Delete a session's turns, e.g. when its conversation is cleared.
+
+        Returns:
+            int: Number of turns deleted
+        """
+        with self._lock:
+            return self._conn.execute("DELETE FROM turns WHERE session_id = ?", (session_id,)).rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class SharedTurnStore:
+    """
+    Turn records in a :class:`simple_speech_ai.shared_state.SharedState`,
+    one list per session, seen by every worker process.
+
+    Turn IDs are ``"<session_id>:<index>"``.
+
+    Args:
+        state (SharedState): Backend
+    """
+
+    def __init__(self, state):
+        self.state = state
+
+    @staticmethod
+    def _name(session_id):
+        return f"turns:{session_id}"
+
+    def append(self, session_id, entry):
+        record = {"user": entry["user"], "assistant": entry.get("assistant"),
+                  "user_tokens": entry["user_tokens"], "assistant_tokens": entry.get("assistant_tokens", 0),
+                  "audio": entry.get("audio_files") or [], "created": time.time()}
+        length = self.state.rpush(self._name(session_id), json.dumps(record))
+        return f"{session_id}:{length - 1}"
+
+    def set_audio(self, turn_id, audio_files):
+        session_id, index = turn_id.rsplit(":", 1)
+        name = self._name(session_id)
+        index = int(index)
+        for raw in self.state.lrange(name, index, index):
+            record = json.loads(raw)
+            record["audio"] = list(audio_files)
+            self.state.lset(name, index, json.dumps(record))
+
+    def turns(self, session_id):
+        entries = []
+        for index, raw in enumerate(self.state.lrange(self._name(session_id))):
+            record = json.loads(raw)
+            entries.append(_entry(f"{session_id}:{index}", record["user"], record["assistant"],
+                                  record["user_tokens"], record["assistant_tokens"], record["audio"]))
+        return entries
+
+    def delete(self, session_id):
+        return self.state.ldelete(self._name(session_id))
+
+    def close(self):
+        # The backend is shared by the whole process
+        pass
@@ -0,0 +1,396 @@
+"""
+Client for the Typecast text-to-speech API.
+
+Nothing in this module touches Streamlit, so the client is safe to use from
+worker threads (for example to synthesize sentences while the GPT reply is
+still streaming). UI code reports progress through the optional ``on_poll``
+callback instead.
+
+All traffic goes through one pooled, keep-alive ``requests.Session`` per
+:class:`TypecastClient`, so the submit, every poll and the download reuse
+the same TCP/TLS connections instead of opening a new one per call.
+"""
+
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from simple_speech_ai.audio_server import PARTIAL_SUFFIX
+from simple_speech_ai.config import DEFAULT_ACTOR_ID, DEFAULT_SPEAK_URL
+from simple_speech_ai.polling import AdaptivePoller
+from simple_speech_ai.telemetry import span, submit
+from simple_speech_ai.tts_cache import cache_key
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class TypecastError(Exception):
+    """Raised when the Typecast API returns something we cannot use."""
+
+
+# Used when callers do not bring their own poller
+default_poller = AdaptivePoller()
+
+
+def build_headers(api_key):
+    """
+    Build the headers for Typecast API requests.
+
+    Args:
+        api_key (str): Typecast API key
+
+    Returns:
+        dict: Headers for Typecast API requests
+    """
+    return {
+        'Authorization': f'Bearer {api_key}',
+        'Content-Type': 'application/json'
+    }
+
+
+def build_payload(text, actor_id=DEFAULT_ACTOR_ID, tempo=1, volume=100, pitch=0, model_version='latest'):
+    """
+    Build the request body for a speech synthesis job.
+
+    Returns:
+        dict: JSON payload for ``POST /api/speak``
+    """
+    return {
+        'text': text,
+        'lang': 'auto',
+        'actor_id': actor_id,
+        'xapi_hd': True,
+        'model_version': model_version,
+        'tempo': tempo,
+        'volume': volume,
+        'pitch': pitch
+    }
+
+
+def parse_poll_response(poll_data):
+    """
+    Extract the job status and audio URL from a poll response.
+
+    Typecast has returned the status both at the top level and nested under
+    ``result``, so both locations are checked.
+
+    Returns:
+        tuple: (status, audio_download_url or None)
+    """
+    result = poll_data.get('result', {})
+    status = poll_data.get('status') or result.get('status')
+    audio_url = result.get('audio_download_url') or poll_data.get('audio_download_url')
+    return status, audio_url
+
+
+def claim_partial(filename, stale_after=None):
+    """
+    Create ``<filename>.part`` unless another download already owns it.
+
+    Args:
+        filename (str): Destination path
+        stale_after (float): Seconds after which an unchanged ``.part`` file
+            counts as abandoned (its download died with its process) and is
+            taken over; None never takes one over
+
+    Returns:
+        bool: True if this caller created the file
+    """
+    partial = filename + PARTIAL_SUFFIX
+    try:
+        os.close(os.open(partial, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except FileExistsError:
+        if stale_after is None or not _remove_abandoned(partial, stale_after):
+            return False
+    # Another session may have taken the name over first
+    return claim_partial(filename)
+
+
+def _remove_abandoned(partial, stale_after):
+    # Moves the file aside before deleting it, and checks its age again once
+    # moved: a download that claimed the name in between gets it back
+    try:
+        if time.time() - os.path.getmtime(partial) < stale_after:
+            return False
+        abandoned = f"{partial}.{uuid.uuid4().hex[:8]}.abandoned"
+        os.rename(partial, abandoned)
+    except OSError:
+        return False
+    try:
+        if time.time() - os.path.getmtime(abandoned) < stale_after:
+            os.link(abandoned, partial)
+            return False
+        return True
+    except OSError:
+        return False
+    finally:
+        os.remove(abandoned)
+
+
+def abandoned_after(connect_timeout, read_timeout, retries):
+    """
+    Seconds a live download can go without writing to its ``.part`` file:
+    every attempt waiting out both timeouts, with a minute to spare.
+    """
+    return (connect_timeout + read_timeout) * (retries + 1) + 60
+
+
+def unique_filename(output_dir):
+    # Random rather than time-based: sessions and sentences finishing in the
+    # same second must never share a file
+    return os.path.join(output_dir, f"speech_{uuid.uuid4().hex}.wav")
+
+
+class TypecastClient:
+    """
+    Pooled HTTP client for Typecast.
+
+    Idempotent requests (polls and downloads) are retried on connection
+    errors and on 429/5xx responses with exponential backoff, honouring
+    ``Retry-After``. Job submissions are only retried when the connection
+    could not be established, so a job is never created twice.
+
+    Args:
+        api_key (str): Typecast API key; if omitted, ``TYPECAST_API_KEY`` is used
+        pool_size (int): Maximum connections kept open per host
+        connect_timeout (float): Seconds to wait for a connection
+        read_timeout (float): Seconds to wait for a response
+        retries (int): Retry attempts for failed requests
+        backoff_factor (float): Base delay for the retry backoff
+        speak_url (str): Job submission endpoint; defaults to the public Typecast endpoint
+        submit_limiter (RateLimiter): Rate limit for job submissions, or None
+        poll_limiter (RateLimiter): Rate limit for polls, or None
+
+    A cache entry's ``.part`` file left by a crashed process is taken over
+    once it has gone unchanged longer than these timeouts allow (see
+    :func:`abandoned_after`).
+    """
+
+    def __init__(self, api_key=None, pool_size=10, connect_timeout=3.05, read_timeout=15,
+                 retries=2, backoff_factor=0.3, speak_url=None, submit_limiter=None, poll_limiter=None):
+        # Imported here: the asyncio engine only needs this module's helpers
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        if api_key:
+            headers = build_headers(api_key)
+        else:
+            from utils.api_config import get_typecast_headers
+            headers = get_typecast_headers()
+
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.timeout = (connect_timeout, read_timeout)
+        self.abandoned_after = abandoned_after(connect_timeout, read_timeout, retries)
+        self.speak_url = speak_url or DEFAULT_SPEAK_URL
+        self.submit_limiter = submit_limiter
+        self.poll_limiter = poll_limiter
+        self._downloads = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="typecast-download")
+
+    def close(self):
+        """Wait for background downloads and close all pooled connections."""
+        self._downloads.shutdown(wait=True)
+        self.session.close()
+
+    def request_speech(self, payload):
+        """
+        Submit a synthesis job.
+
+        Returns:
+            str: URL to poll for the job status
+        """
+        if self.submit_limiter is not None:
+            self.submit_limiter.acquire()
+        with span("typecast.submit", chars=len(payload.get('text', ''))):
+            r = self.session.post(self.speak_url, json=payload, timeout=self.timeout)
+            r.raise_for_status()
+            response_data = r.json()
+
+        result = response_data.get('result', {})
+        if 'speak_v2_url' in result:
+            return result['speak_v2_url']
+        if 'speak_url' in result:
+            return result['speak_url']
+        raise TypecastError("Could not find speak URL in response")
+
+    def poll_speech(self, speak_url, poller=None, text_length=0, on_poll=None):
+        """
+        Poll a synthesis job until it is done.
+
+        Args:
+            speak_url (str): URL returned by :meth:`request_speech`
+            poller (AdaptivePoller): Poller deciding when to check; a shared
+                default is used if omitted
+            text_length (int): Length of the synthesized text, used to predict the wait
+            on_poll (callable): Optional ``on_poll(elapsed, deadline)`` progress hook
+
+        Returns:
+            str: Audio download URL
+        """
+        def check():
+            if self.poll_limiter is not None:
+                self.poll_limiter.acquire()
+            with span("typecast.poll") as attributes:
+                poll_response = self.session.get(speak_url, timeout=self.timeout)
+                poll_response.raise_for_status()
+                status, audio_url = parse_poll_response(poll_response.json())
+                attributes["status"] = status
+            if status == 'done' and not audio_url:
+                raise TypecastError("Could not find audio_download_url in response")
+            return status == 'done', audio_url
+
+        poller = poller or default_poller
+        return poller.wait(check, text_length=text_length, on_poll=on_poll)
+
+    def download_audio(self, audio_url, output_dir="./audio_files", filename=None):
+        """
+        Stream a finished clip to disk in chunks.
+
+        The clip is written to ``<filename>.part`` and renamed when complete,
+        so only one chunk is held in memory and readers never see a
+        half-written file under the final name.
+
+        Args:
+            audio_url (str): Download URL from :meth:`poll_speech`
+            output_dir (str): Directory for a generated file name
+            filename (str): Exact destination path, e.g. a cache entry
+
+        Returns:
+            str: Path of the saved WAV file
+        """
+        if filename is None:
+            filename = unique_filename(output_dir)
+        partial = filename + PARTIAL_SUFFIX
+
+        try:
+            # The download URL is pre-signed, so our API key is not sent along
+            with span("typecast.download") as attributes, \
+                    self.session.get(audio_url, timeout=self.timeout, stream=True,
+                                     headers={'Authorization': None}) as audio_response:
+                audio_response.raise_for_status()
+                size = 0
+                with open(partial, 'wb') as f:
+                    for chunk in audio_response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+                        f.flush()
+                        size += len(chunk)
+                attributes["bytes"] = size
+            os.replace(partial, filename)
+        except BaseException:
+            try:
+                os.remove(partial)
+            except OSError:
+                pass
+            raise
+        return filename
+
+    def start_download(self, audio_url, filename, on_done=None):
+        """
+        Download a clip in the background.
+
+        The ``.part`` file exists as soon as this returns, so
+        :class:`simple_speech_ai.audio_server.AudioServer` can start streaming it to the
+        player right away.
+
+        Args:
+            audio_url (str): Download URL from :meth:`poll_speech`
+            filename (str): Destination path
+            on_done (callable): Called with ``filename`` after a successful download
+
+        Returns:
+            concurrent.futures.Future: Resolves to ``filename``
+        """
+        open(filename + PARTIAL_SUFFIX, 'wb').close()
+
+        def run():
+            self.download_audio(audio_url, filename=filename)
+            if on_done:
+                on_done(filename)
+            return filename
+
+        return submit(self._downloads, run)
+
+    def synthesize(self, text, actor_id=DEFAULT_ACTOR_ID, tempo=1, volume=100, pitch=0, model_version='latest',
+                   poller=None, output_dir="./audio_files", on_poll=None, cache=None, progressive=False):
+        """
+        Run a full submit -> poll -> download round trip.
+
+        If a :class:`simple_speech_ai.tts_cache.TTSCache` is given, a cached clip is returned
+        without any network call and new clips are downloaded straight into it.
+
+        Args:
+            progressive (bool): Return as soon as the download has started
+                instead of when it has finished; only useful when the clip is
+                played through :class:`simple_speech_ai.audio_server.AudioServer`
+
+        Returns:
+            str: Path of the WAV file (possibly still being written if ``progressive``)
+        """
+        payload = build_payload(text, actor_id=actor_id, tempo=tempo, volume=volume,
+                                pitch=pitch, model_version=model_version)
+        on_done = None
+        filename = None
+        if cache is not None:
+            key = cache_key(payload)
+            cached = cache.get(key)
+            if cached:
+                return cached
+            filename = cache.path_for(key)
+            on_done = lambda path: cache.put(key, path)
+
+        speak_url = self.request_speech(payload)
+        audio_url = self.poll_speech(speak_url, poller=poller,
+                                     text_length=len(text), on_poll=on_poll)
+
+        return self.save_audio(audio_url, filename, output_dir=output_dir,
+                               on_done=on_done, progressive=progressive)
+
+    def save_audio(self, audio_url, filename=None, output_dir="./audio_files", on_done=None, progressive=False):
+        """
+        Download a finished clip, either now or in the background.
+
+        Args:
+            audio_url (str): Download URL from :meth:`poll_speech`
+            filename (str): Preferred destination, e.g. a cache entry
+            output_dir (str): Directory for a generated file name
+            on_done (callable): Called with the path once the file is complete
+                under ``filename``; may return the path the file was moved to
+            progressive (bool): Start the download and return immediately
+
+        Returns:
+            str: Path of the WAV file (possibly still being written if ``progressive``)
+        """
+        if filename is None or not claim_partial(filename, self.abandoned_after):
+            # No preferred name, or another session is already downloading it.
+            # The clip keeps a unique name: the other download fills the cache
+            # entry, and moving this file there would pull it from under the
+            # caller (and the player, if progressive)
+            filename = unique_filename(output_dir)
+            claim_partial(filename)
+            on_done = None
+
+        if progressive:
+            self.start_download(audio_url, filename, on_done=on_done)
+            return filename
+
+        filename = self.download_audio(audio_url, output_dir, filename=filename)
+        if on_done:
+            filename = on_done(filename) or filename
+        return filename
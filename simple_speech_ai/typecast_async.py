@@ -0,0 +1,241 @@
+"""
+Asyncio client for the Typecast text-to-speech API.
+
+Same protocol and behaviour as :class:`simple_speech_ai.typecast.TypecastClient`,
+on ``httpx.AsyncClient``: waiting for a job costs a suspended coroutine
+instead of a blocked thread, so one event loop can keep hundreds of
+syntheses in flight.
+"""
+
+import asyncio
+import os
+import random
+
+import httpx
+
+from simple_speech_ai.audio_server import PARTIAL_SUFFIX
+from simple_speech_ai.cancellation import track
+from simple_speech_ai.config import DEFAULT_ACTOR_ID, DEFAULT_SPEAK_URL
+from simple_speech_ai.telemetry import span
+from simple_speech_ai.tts_cache import cache_key
+from simple_speech_ai.typecast import (DOWNLOAD_CHUNK_SIZE, TypecastError, abandoned_after, build_headers,
+                                       build_payload, claim_partial, default_poller, parse_poll_response,
+                                       unique_filename)
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class AsyncTypecastClient:
+    """
+    Pooled asyncio HTTP client for Typecast.
+
+    Connection errors are retried for every request. Polls and downloads are
+    also retried on 429/5xx responses with exponential backoff, honouring
+    ``Retry-After``; job submissions are not, so a job is never created twice.
+
+    Args:
+        api_key (str): Typecast API key; if omitted, ``TYPECAST_API_KEY`` is used
+        pool_size (int): Maximum open connections
+        connect_timeout (float): Seconds to wait for a connection
+        read_timeout (float): Seconds to wait for a response
+        retries (int): Retry attempts for failed requests
+        backoff_factor (float): Base delay for the retry backoff
+        speak_url (str): Job submission endpoint; defaults to the public Typecast endpoint
+        submit_limiter (RateLimiter): Rate limit for job submissions, or None
+        poll_limiter (RateLimiter): Rate limit for polls, or None
+    """
+
+    def __init__(self, api_key=None, pool_size=100, connect_timeout=3.05, read_timeout=15,
+                 retries=2, backoff_factor=0.3, speak_url=None, submit_limiter=None, poll_limiter=None):
+        if api_key:
+            headers = build_headers(api_key)
+        else:
+            from utils.api_config import get_typecast_headers
+            headers = get_typecast_headers()
+
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.abandoned_after = abandoned_after(connect_timeout, read_timeout, retries)
+        self.speak_url = speak_url or DEFAULT_SPEAK_URL
+        self.submit_limiter = submit_limiter
+        self.poll_limiter = poll_limiter
+        # Limits belong on the transport; AsyncClient ignores its own when given one
+        limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        self.client = httpx.AsyncClient(
+            headers=headers,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            transport=httpx.AsyncHTTPTransport(retries=retries, limits=limits)
+        )
+        self._downloads = set()
+
+    async def close(self):
+        """Wait for background downloads and close all pooled connections."""
+        if self._downloads:
+            await asyncio.gather(*self._downloads, return_exceptions=True)
+        await self.client.aclose()
+
+    async def _get(self, url, **kwargs):
+        # GET with retries on throttling and server errors
+        for attempt in range(self.retries + 1):
+            response = await self.client.get(url, **kwargs)
+            if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                return response
+            retry_after = response.headers.get("Retry-After")
+            await response.aclose()
+            try:
+                delay = float(retry_after)
+            except (TypeError, ValueError):
+                delay = self.backoff_factor * (2 ** attempt) * random.uniform(0.5, 1.5)
+            await asyncio.sleep(delay)
+
+    async def request_speech(self, payload):
+        """
+        Submit a synthesis job.
+
+        Returns:
+            str: URL to poll for the job status
+        """
+        if self.submit_limiter is not None:
+            await self.submit_limiter.acquire_async()
+        with span("typecast.submit", chars=len(payload.get('text', ''))):
+            r = await self.client.post(self.speak_url, json=payload)
+            r.raise_for_status()
+            response_data = r.json()
+
+        result = response_data.get('result', {})
+        if 'speak_v2_url' in result:
+            return result['speak_v2_url']
+        if 'speak_url' in result:
+            return result['speak_url']
+        raise TypecastError("Could not find speak URL in response")
+
+    async def poll_speech(self, speak_url, poller=None, text_length=0, on_poll=None):
+        """
+        Poll a synthesis job until it is done, sleeping cooperatively between checks.
+
+        Returns:
+            str: Audio download URL
+        """
+        async def check():
+            if self.poll_limiter is not None:
+                await self.poll_limiter.acquire_async()
+            with span("typecast.poll") as attributes:
+                poll_response = await self._get(speak_url)
+                poll_response.raise_for_status()
+                status, audio_url = parse_poll_response(poll_response.json())
+                attributes["status"] = status
+            if status == 'done' and not audio_url:
+                raise TypecastError("Could not find audio_download_url in response")
+            return status == 'done', audio_url
+
+        poller = poller or default_poller
+        return await poller.wait_async(check, text_length=text_length, on_poll=on_poll)
+
+    async def download_audio(self, audio_url, output_dir="./audio_files", filename=None):
+        """
+        Stream a finished clip to ``<filename>.part`` and rename it when complete.
+
+        Returns:
+            str: Path of the saved WAV file
+        """
+        if filename is None:
+            filename = unique_filename(output_dir)
+        partial = filename + PARTIAL_SUFFIX
+
+        try:
+            with span("typecast.download") as attributes:
+                # The download URL is pre-signed, so our API key is not sent along
+                request = self.client.build_request("GET", audio_url)
+                request.headers.pop("Authorization", None)
+                response = await self.client.send(request, stream=True)
+                try:
+                    response.raise_for_status()
+                    size = 0
+                    with open(partial, 'wb') as f:
+                        async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                            f.write(chunk)
+                            f.flush()
+                            size += len(chunk)
+                    attributes["bytes"] = size
+                finally:
+                    await response.aclose()
+            os.replace(partial, filename)
+        except BaseException:
+            try:
+                os.remove(partial)
+            except OSError:
+                pass
+            raise
+        return filename
+
+    def start_download(self, audio_url, filename, on_done=None):
+        """
+        Download a clip in a background task; the ``.part`` file exists on return.
+
+        Returns:
+            asyncio.Task: Resolves to ``filename``
+        """
+        partial = filename + PARTIAL_SUFFIX
+        open(partial, 'wb').close()
+
+        async def run():
+            await self.download_audio(audio_url, filename=filename)
+            if on_done:
+                on_done(filename)
+            return filename
+
+        def finished(task):
+            self._downloads.discard(task)
+            # Cancelled before it started, so download_audio never cleaned up
+            if task.cancelled() and os.path.exists(partial):
+                try:
+                    os.remove(partial)
+                except OSError:
+                    pass
+
+        # Registered with the session's cancel scope, so a barge-in stops it
+        task = track(asyncio.ensure_future(run()))
+        self._downloads.add(task)
+        task.add_done_callback(finished)
+        return task
+
+    async def synthesize(self, text, actor_id=DEFAULT_ACTOR_ID, tempo=1, volume=100, pitch=0,
+                         model_version='latest', poller=None, output_dir="./audio_files", on_poll=None,
+                         cache=None, progressive=False):
+        """
+        Run a full submit -> poll -> download round trip; see
+        :meth:`simple_speech_ai.typecast.TypecastClient.synthesize`.
+
+        Returns:
+            str: Path of the WAV file (possibly still being written if ``progressive``)
+        """
+        payload = build_payload(text, actor_id=actor_id, tempo=tempo, volume=volume,
+                                pitch=pitch, model_version=model_version)
+        on_done = None
+        filename = None
+        if cache is not None:
+            key = cache_key(payload)
+            cached = cache.get(key)
+            if cached:
+                return cached
+            filename = cache.path_for(key)
+            on_done = lambda path: cache.put(key, path)
+
+        speak_url = await self.request_speech(payload)
+        audio_url = await self.poll_speech(speak_url, poller=poller,
+                                           text_length=len(text), on_poll=on_poll)
+
+        if filename is None or not claim_partial(filename, self.abandoned_after):
+            # Another session is downloading the cache entry; see TypecastClient.save_audio
+            filename = unique_filename(output_dir)
+            claim_partial(filename)
+            on_done = None
+
+        if progressive:
+            self.start_download(audio_url, filename, on_done=on_done)
+            return filename
+
+        filename = await self.download_audio(audio_url, output_dir, filename=filename)
+        if on_done:
+            filename = on_done(filename) or filename
+        return filename
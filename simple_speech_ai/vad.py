@@ -0,0 +1,162 @@
+"""
+Energy-based voice activity detection for recordings.
+
+Recordings from ``audiorecorder`` typically start and end with seconds of
+silence while the user finds the button, and older users pause for long
+stretches mid-sentence. :func:`trim_silence` keeps only the speech (with a
+little padding), shortens long pauses, rejects recordings without enough
+speech before any API call is made, and can split long monologues at pauses
+so the parts are transcribed in parallel.
+
+Frames are classified by RMS level relative to the loudest frame of the
+recording, with an absolute floor, so the detector adapts to quiet
+microphones without a calibration step.
+"""
+
+from collections import namedtuple
+
+# Trimmed audio, as one segment per part to transcribe
+VADResult = namedtuple("VADResult", ["chunks", "original_ms", "kept_ms"])
+
+
+class NoSpeechError(Exception):
+    """Raised when a recording holds too little speech to transcribe."""
+
+
+def frame_levels(segment, frame_ms=30):
+    """
+    Return the RMS level of each frame in dBFS.
+
+    Args:
+        segment (AudioSegment): Recording
+        frame_ms (int): Frame length in milliseconds
+
+    Returns:
+        numpy.ndarray: One level per complete frame
+    """
+    import numpy as np
+
+    samples = np.array(segment.get_array_of_samples(), dtype=np.float64)
+    if segment.channels > 1:
+        samples = samples.reshape(-1, segment.channels).mean(axis=1)
+    frame_length = max(1, int(segment.frame_rate * frame_ms / 1000))
+    count = len(samples) // frame_length
+    if count == 0:
+        return np.empty(0)
+    frames = samples[:count * frame_length].reshape(count, frame_length)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-9) / segment.max_possible_amplitude)
+
+
+def voiced_regions(segment, frame_ms=30, silence_db=35.0, floor_db=-55.0, min_region_ms=120):
+    """
+    Find the runs of voiced frames in a recording.
+
+    Args:
+        segment (AudioSegment): Recording
+        frame_ms (int): Analysis frame length
+        silence_db (float): Frames this far below the loudest frame are silence
+        floor_db (float): Frames below this level (dBFS) are always silence
+        min_region_ms (int): Shorter bursts, such as button clicks, are ignored
+
+    Returns:
+        list: ``(start_ms, end_ms)`` tuples in order, without padding
+    """
+    import numpy as np
+
+    levels = frame_levels(segment, frame_ms)
+    if levels.size == 0:
+        return []
+    voiced = levels > max(levels.max() - silence_db, floor_db)
+
+    # Runs of voiced frames: +1 where a run starts, -1 after it ends
+    edges = np.diff(np.concatenate(([0], voiced.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    return [(int(start) * frame_ms, int(end) * frame_ms) for start, end in zip(starts, ends)
+            if (end - start) * frame_ms >= min_region_ms]
+
+
+def pad_regions(regions, length_ms, padding_ms=200):
+    """
+    Widen regions so word edges survive, merging those that then overlap.
+
+    Args:
+        regions (list): ``(start_ms, end_ms)`` tuples in order
+        length_ms (int): Length of the recording
+        padding_ms (int): Audio added on each side
+
+    Returns:
+        list: ``(start_ms, end_ms)`` tuples in order, not overlapping
+    """
+    padded = []
+    for start, end in regions:
+        start_ms = max(0, start - padding_ms)
+        end_ms = min(length_ms, end + padding_ms)
+        if padded and start_ms <= padded[-1][1]:
+            padded[-1] = (padded[-1][0], end_ms)
+        else:
+            padded.append((start_ms, end_ms))
+    return padded
+
+
+def speech_regions(segment, padding_ms=200, **detect_options):
+    """
+    Find the parts of a recording to keep: the voiced regions with padding.
+
+    Args:
+        segment (AudioSegment): Recording
+        padding_ms (int): Audio kept around each region so word edges survive
+        **detect_options: Passed to :func:`voiced_regions`
+
+    Returns:
+        list: ``(start_ms, end_ms)`` tuples in order, not overlapping
+    """
+    return pad_regions(voiced_regions(segment, **detect_options), len(segment), padding_ms)
+
+
+def trim_silence(segment, min_speech_ms=300, max_pause_ms=1000, split_ms=None, padding_ms=200,
+                 **detect_options):
+    """
+    Cut leading and trailing silence and shorten long pauses.
+
+    Args:
+        segment (AudioSegment): Recording
+        min_speech_ms (int): Less voiced audio than this, padding not counted,
+            raises :class:`NoSpeechError`
+        max_pause_ms (int): Pauses between regions are shortened to this length
+        split_ms (int): Start a new chunk at a pause once a chunk would grow
+            beyond this length; None keeps one chunk
+        padding_ms (int): Audio kept around each region so word edges survive
+        **detect_options: Passed to :func:`voiced_regions`
+
+    Returns:
+        VADResult: Chunks to transcribe and the lengths before and after trimming
+    """
+    voiced = voiced_regions(segment, **detect_options)
+    speech_ms = sum(end - start for start, end in voiced)
+    if speech_ms < min_speech_ms:
+        raise NoSpeechError(f"Only {speech_ms} ms of speech detected in {len(segment)} ms of audio")
+    regions = pad_regions(voiced, len(segment), padding_ms)
+
+    chunks = []
+    parts = []
+    length = 0
+    previous_end = None
+    for start, end in regions:
+        if previous_end is not None:
+            pause = min(start - previous_end, max_pause_ms)
+            if split_ms and length + pause + (end - start) > split_ms:
+                chunks.append(parts)
+                parts = []
+                length = 0
+            else:
+                parts.append(segment[previous_end:previous_end + pause])
+                length += pause
+        parts.append(segment[start:end])
+        length += end - start
+        previous_end = end
+    chunks.append(parts)
+
+    joined = [sum(parts[1:], parts[0]) for parts in chunks]
+    return VADResult(joined, len(segment), sum(len(chunk) for chunk in joined))
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The package and the stand-in servers in benchmarks/ are imported from the checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
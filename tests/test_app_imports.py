@@ -0,0 +1,24 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.bench_startup import APPS, HEAVY_MODULES, ROOT, app_imports
+
+
+@pytest.mark.parametrize("app", APPS)
+def test_app_imports_no_heavy_modules_eagerly(app):
+    imports = app_imports(app)
+    probe = (f"import json, sys\nexec({imports!r})\n"
+             f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))")
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    result = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, cwd=ROOT, env=env,
+                            check=True)
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == []
+
+
+@pytest.mark.parametrize("app", APPS)
+def test_recorder_is_imported_where_it_is_used(app):
+    assert "audiorecorder" not in app_imports(app)
@@ -0,0 +1,68 @@
+import os
+import threading
+import time
+
+from simple_speech_ai.audio_server import PARTIAL_SUFFIX
+from simple_speech_ai.hedging import HedgedTTS
+from simple_speech_ai.tts import TextToSpeech
+
+
+class FakeTTS(TextToSpeech):
+    """Writes a clip after ``seconds``, checking ``on_poll`` while it waits like Typecast does."""
+
+    def __init__(self, provider, seconds, directory, download_seconds=0.0, polls=True):
+        self.provider = provider
+        self.seconds = seconds
+        self.directory = directory
+        self.download_seconds = download_seconds
+        self.polls = polls
+
+    def synthesize(self, text, on_poll=None, progressive=False):
+        started = time.perf_counter()
+        while time.perf_counter() - started < self.seconds:
+            if on_poll and self.polls:
+                on_poll(time.perf_counter() - started, self.seconds)
+            time.sleep(0.01)
+        path = os.path.join(self.directory, f"speech_{self.provider}.wav")
+        open(path, "wb").close()
+        if progressive and self.download_seconds:
+            # The clip is returned while its download goes on in the background
+            open(path + PARTIAL_SUFFIX, "wb").close()
+            threading.Timer(self.download_seconds, os.remove, [path + PARTIAL_SUFFIX]).start()
+        return path
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def test_cancelled_loser_is_not_a_latency_sample(tmp_path):
+    primary = FakeTTS("slow", 1.0, str(tmp_path))
+    tts = HedgedTTS(primary, FakeTTS("fast", 0.05, str(tmp_path)), max_ratio=1.0, initial_delay=0.1)
+
+    path = tts.synthesize("할매요")
+
+    assert path.endswith("speech_fast.wav")
+    # Give the primary time to notice it was cancelled
+    time.sleep(0.2)
+    assert not os.path.exists(tmp_path / "speech_slow.wav")
+    assert tts.histogram("fast").samples == 1
+    assert tts.histogram("slow").samples == 0
+    tts.close()
+
+
+def test_progressive_loser_clip_is_deleted_after_its_download(tmp_path):
+    # The primary answers right after the backup, without noticing it lost
+    primary = FakeTTS("slow", 0.3, str(tmp_path), download_seconds=0.3, polls=False)
+    tts = HedgedTTS(primary, FakeTTS("fast", 0.1, str(tmp_path)), max_ratio=1.0, initial_delay=0.1)
+
+    path = tts.synthesize("할매요", progressive=True)
+
+    assert path.endswith("speech_fast.wav")
+    assert wait_for(lambda: os.path.exists(tmp_path / "speech_slow.wav"))
+    assert wait_for(lambda: not os.path.exists(tmp_path / "speech_slow.wav"))
+    assert os.path.exists(path)
+    tts.close()
@@ -0,0 +1,79 @@
+import time
+
+import pytest
+
+from benchmarks.fake_typecast import FakeTypecastServer
+from simple_speech_ai.polling import AdaptivePoller, PollTimeout
+from simple_speech_ai.typecast import TypecastClient, build_payload
+
+
+class RecordingSleep:
+    """Sleeps for real and keeps the requested delays."""
+
+    def __init__(self):
+        self.delays = []
+
+    def __call__(self, seconds):
+        self.delays.append(seconds)
+        time.sleep(seconds)
+
+
+def poll(latency, poller, text="안녕하십니꺼"):
+    # Submits one job with a scripted latency and polls it to completion
+    with FakeTypecastServer(latency=[latency]) as server:
+        client = TypecastClient(api_key="test", speak_url=server.speak_url)
+        try:
+            speak_url = client.request_speech(build_payload(text))
+            job = server.jobs[speak_url.rsplit("/", 1)[-1]]
+            try:
+                audio_url = client.poll_speech(speak_url, poller=poller, text_length=len(text))
+            finally:
+                noticed = time.monotonic()
+        finally:
+            client.close()
+        return audio_url, noticed - job["ready_at"], server.counts["polls"]
+
+
+def test_quick_job_is_found_by_the_first_check():
+    sleep = RecordingSleep()
+    poller = AdaptivePoller(first_check=0.05, jitter=0, base_seconds=2.0, sleep=sleep)
+
+    audio_url, _, polls = poll(0.0, poller)
+
+    assert audio_url.endswith(".wav")
+    assert polls == 1
+    # The first check comes quickly, not after the 2 s prediction
+    assert sleep.delays == [0.05]
+
+
+def test_waits_until_just_before_the_predicted_completion():
+    sleep = RecordingSleep()
+    poller = AdaptivePoller(first_check=0.05, min_interval=0.1, jitter=0, lead=0.9,
+                            base_seconds=0.6, seconds_per_char=0.0, sleep=sleep)
+
+    _, late, polls = poll(0.6, poller)
+
+    # First check, one sleep to 90% of the predicted 0.6 s, then short intervals
+    assert sleep.delays[0] == 0.05
+    assert sleep.delays[1] == pytest.approx(0.54 - 0.05, abs=0.05)
+    assert polls <= 4
+    assert late < 0.3
+
+
+def test_gives_up_at_the_deadline():
+    poller = AdaptivePoller(deadline=0.5, first_check=0.05, min_interval=0.1, max_interval=0.2,
+                            jitter=0, base_seconds=0.2, seconds_per_char=0.0)
+    started = time.monotonic()
+
+    with pytest.raises(PollTimeout):
+        poll(5.0, poller)
+
+    assert time.monotonic() - started < 1.5
+
+
+def test_prediction_learns_from_completed_jobs():
+    poller = AdaptivePoller(base_seconds=5.0, seconds_per_char=0.5)
+    for length in (10, 20, 30, 40, 50):
+        poller.record(length, 1.0 + 0.01 * length)
+
+    assert poller.predict(100) == pytest.approx(2.0)
@@ -0,0 +1,60 @@
+import pytest
+
+from simple_speech_ai.replay import classify
+
+
+@pytest.mark.parametrize("text, intent", [
+    ("다시 말해줘", "repeat"),
+    ("뭐라카노?", "repeat"),
+    ("한 번 더", "repeat"),
+    ("Say that again?", "repeat"),
+    ("can you repeat that", "repeat"),
+    ("말 좀 천천히 해주세요", "slower"),
+    ("말이 너무 빨라요", "slower"),
+    ("Could you slow down", "slower"),
+    ("you're talking too fast", "slower"),
+    ("소리 좀 키워줘", "louder"),
+    ("목소리가 작아요", "louder"),
+    ("소리가 잘 안 들려요", "louder"),
+    ("볼륨 좀 올려줘", "louder"),
+    ("can you speak louder", "louder"),
+    ("어, 다시 한번 말해 주이소", "repeat"),
+    ("Sorry, what did you say?", "repeat"),
+    ("천천히 다시 말해줘", "slower"),
+    ("크게 좀 말해도", "louder"),
+])
+def test_replay_requests(text, intent):
+    assert classify(text) == intent
+
+
+@pytest.mark.parametrize("text", [
+    "버스가 너무 빨리 가요",
+    "어느 길이 빠르다?",
+    "짐 좀 올려 줘",
+    "창문 좀 올려 줘",
+    "문이 잘 안 들어가요",
+    "천천히 가도 되나?",
+    "환승하고 다시 타야 되나?",
+    "다시 해야 되나?",
+    "볼륨 버튼 어디 있노?",
+    "what",
+    "which bus is slower",
+    "does the bus slow down",
+    "is it louder there",
+    "is the slow train cheaper",
+    "다시 한 번 말씀해 주실 수 있으신지요 그리고 버스는 몇 번인지도 궁금합니다",
+    "병원에 뭐라고 말해야 돼?",
+    "의사한테 뭐라캐야 되노?",
+    "버스 기사한테 뭐라고 해요?",
+    "what did you say about bus 7",
+    "one more time to the hospital",
+    "TV 소리 좀 키워줘",
+    "라디오 소리가 너무 작아",
+])
+def test_questions_are_not_replay_requests(text):
+    assert classify(text) is None
+
+
+def test_yes_to_an_offer_to_repeat():
+    assert classify("응", "할배, 제 말 잘 알아듣겠십니꺼? 다시 설명해 드릴까예?") == "repeat"
+    assert classify("응") is None
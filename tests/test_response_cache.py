@@ -0,0 +1,45 @@
+import time
+
+from simple_speech_ai.response_cache import ResponseCache, prompt_fingerprint
+from simple_speech_ai.shared_state import SQLiteState
+
+QUESTION = "약국 어디 있노?"
+FOLLOW_UP = "그럼 병원은?"
+
+
+def test_follow_up_is_keyed_by_the_previous_question():
+    cache = ResponseCache()
+    cache.store(FOLLOW_UP, "병원은 역 앞에 있십니더.", previous_question=QUESTION)
+
+    # Replies differ between runs; the earlier question, written differently, still matches
+    assert cache.lookup(FOLLOW_UP, previous_question="약국  어디 있노").reply == "병원은 역 앞에 있십니더."
+    assert cache.lookup(FOLLOW_UP, previous_question="버스 몇 번 타노?") is None
+    assert cache.lookup(FOLLOW_UP) is None
+
+
+def test_apps_with_other_prompts_do_not_share_replies(tmp_path):
+    state = SQLiteState(str(tmp_path / "state.db"))
+    assistant = ResponseCache(state=state, fingerprint=prompt_fingerprint("assistant", "gpt-4-turbo"))
+    persona = ResponseCache(state=state, fingerprint=prompt_fingerprint("gyeongsang", "gpt-4-turbo"))
+    other_model = ResponseCache(state=state, fingerprint=prompt_fingerprint("assistant", "gpt-4o"))
+    same_app = ResponseCache(state=state, fingerprint=prompt_fingerprint("assistant", "gpt-4-turbo"))
+
+    assistant.store(QUESTION, "The pharmacy is next to the station.")
+
+    assert persona.lookup(QUESTION) is None
+    assert other_model.lookup(QUESTION) is None
+    assert same_app.lookup(QUESTION).reply == "The pharmacy is next to the station."
+    state.close()
+
+
+def test_entries_expire_whatever_order_they_were_added_in():
+    cache = ResponseCache(ttl=60)
+    cache.store(QUESTION, "역 옆에 있십니더.")
+    cache.store(FOLLOW_UP, "역 앞에 있십니더.")
+    # An entry from another process is added after the newer local one
+    first, second = list(cache._entries)
+    cache._entries[second] = cache._entries[second]._replace(stored_at=time.monotonic() - 120)
+
+    assert cache.lookup(FOLLOW_UP) is None
+    assert cache.stats()["entries"] == 1
+    assert cache.lookup(QUESTION) is not None
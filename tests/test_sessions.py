@@ -0,0 +1,33 @@
+import pytest
+
+from simple_speech_ai.config import PipelineConfig
+from simple_speech_ai.pipeline import Pipeline
+from simple_speech_ai.tts import TextToSpeech
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    config = PipelineConfig(audio_dir=str(tmp_path / "audio"), turn_store_path=str(tmp_path / "turns.db"),
+                            audio_sweep_interval=0)
+    # No turn is run, so the stages are never called
+    pipeline = Pipeline(config, stt=object(), llm=object(), tts=TextToSpeech())
+    yield pipeline
+    pipeline.close()
+
+
+def test_stored_session_is_resumed(pipeline):
+    conversation = pipeline.new_conversation()
+    conversation.add_turn("할매 왔다", "어서 오이소!")
+
+    resumed = pipeline.new_conversation(conversation.session_id)
+
+    assert resumed.session_id == conversation.session_id
+    assert [turn["user"] for turn in resumed.history] == ["할매 왔다"]
+
+
+def test_unknown_session_id_is_not_adopted(pipeline):
+    conversation = pipeline.new_conversation("chosen-in-advance")
+
+    assert conversation.session_id != "chosen-in-advance"
+    assert len(conversation.session_id) >= 20
+    assert conversation.history == []
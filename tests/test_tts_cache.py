@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+from simple_speech_ai.shared_state import SQLiteState
+from simple_speech_ai.tts_cache import SharedTTSCache, TTSCache
+
+
+def clip(directory, name, size):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+    return path
+
+
+@pytest.fixture(params=["local", "shared"])
+def make_cache(request, tmp_path):
+    states = []
+
+    def make(max_bytes):
+        if request.param == "local":
+            return TTSCache(str(tmp_path), max_bytes=max_bytes)
+        states.append(SQLiteState(str(tmp_path / "state.db")))
+        return SharedTTSCache(states[-1], str(tmp_path), max_bytes=max_bytes)
+
+    yield make
+    for state in states:
+        state.close()
+
+
+def test_compressed_copies_count_and_are_evicted_with_the_clip(make_cache, tmp_path):
+    cache = make_cache(max_bytes=2500)
+    old = cache.put("old", clip(tmp_path, "download_old.wav", 1000))
+    # The transcoder keeps an Opus copy next to the cached WAV
+    clip(tmp_path, "tts_old.ogg", 500)
+    assert cache.get("old") == old
+    assert cache.stats()["bytes"] == 1500
+
+    cache.put("new", clip(tmp_path, "download_new.wav", 1200))
+
+    assert not os.path.exists(old)
+    assert not os.path.exists(tmp_path / "tts_old.ogg")
+    assert cache.stats()["bytes"] == 1200
+
+
+def test_compressed_copies_left_by_an_earlier_run_are_counted(tmp_path):
+    clip(tmp_path, "tts_kept.wav", 1000)
+    clip(tmp_path, "tts_kept.mp3", 300)
+
+    assert TTSCache(str(tmp_path)).stats()["bytes"] == 1300
@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+import wave
+
+import pytest
+
+from benchmarks.fake_typecast import FakeTypecastServer
+from simple_speech_ai.audio_server import PARTIAL_SUFFIX
+from simple_speech_ai.tts_cache import TTSCache, cache_key
+from simple_speech_ai.typecast import TypecastClient, build_payload, claim_partial
+
+TEXT = "할매요, 안녕하십니꺼!"
+
+
+@pytest.fixture
+def server():
+    with FakeTypecastServer(latency=lambda text: 0.2) as server:
+        yield server
+
+
+def frames(path):
+    with wave.open(path, "rb") as f:
+        return f.getnframes()
+
+
+def test_concurrent_misses_both_return_complete_files(server, tmp_path):
+    cache = TTSCache(str(tmp_path))
+    clients = [TypecastClient(api_key="test", speak_url=server.speak_url) for _ in range(2)]
+    barrier = threading.Barrier(len(clients))
+    paths = [None] * len(clients)
+
+    def synthesize(index):
+        barrier.wait()
+        paths[index] = clients[index].synthesize(TEXT, output_dir=str(tmp_path), cache=cache)
+
+    threads = [threading.Thread(target=synthesize, args=(index,)) for index in range(len(clients))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(paths)
+    for path in paths:
+        assert os.path.exists(path)
+        assert not os.path.exists(path + PARTIAL_SUFFIX)
+        assert frames(path) > 0
+    assert cache.get(cache_key(build_payload(TEXT))) is not None
+    for client in clients:
+        client.close()
+
+
+def test_miss_while_entry_is_downloading_keeps_its_own_file(server, tmp_path):
+    cache = TTSCache(str(tmp_path))
+    entry = cache.path_for(cache_key(build_payload(TEXT)))
+    # Another session is downloading the cache entry
+    assert claim_partial(entry)
+
+    client = TypecastClient(api_key="test", speak_url=server.speak_url)
+    path = client.synthesize(TEXT, output_dir=str(tmp_path), cache=cache)
+    client.close()
+
+    assert path != entry
+    assert os.path.exists(path)
+    assert frames(path) > 0
+    # The other session's download is left alone
+    assert os.path.exists(entry + PARTIAL_SUFFIX)
+    assert not os.path.exists(entry)
+
+
+def test_download_abandoned_by_a_crashed_process_is_taken_over(server, tmp_path):
+    cache = TTSCache(str(tmp_path))
+    key = cache_key(build_payload(TEXT))
+    entry = cache.path_for(key)
+    # A process died half-way through downloading the entry an hour ago
+    with open(entry + PARTIAL_SUFFIX, "wb") as f:
+        f.write(b"RIFF")
+    an_hour_ago = time.time() - 3600
+    os.utime(entry + PARTIAL_SUFFIX, (an_hour_ago, an_hour_ago))
+
+    client = TypecastClient(api_key="test", speak_url=server.speak_url)
+    path = client.synthesize(TEXT, output_dir=str(tmp_path), cache=cache)
+    client.close()
+
+    assert path == entry
+    assert frames(path) > 0
+    assert not os.path.exists(entry + PARTIAL_SUFFIX)
+    assert cache.get(key) == entry
+    assert sorted(os.listdir(tmp_path)) == [os.path.basename(entry)]
+
+
+def test_recent_partial_file_is_not_taken_over(tmp_path):
+    entry = str(tmp_path / "tts_entry.wav")
+    assert claim_partial(entry)
+
+    assert not claim_partial(entry, stale_after=60)
+    assert os.path.exists(entry + PARTIAL_SUFFIX)
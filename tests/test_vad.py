@@ -0,0 +1,27 @@
+import pytest
+from pydub import AudioSegment
+from pydub.generators import Sine
+
+from simple_speech_ai.vad import NoSpeechError, trim_silence
+
+RATE = 16000
+
+
+def silence(ms):
+    return AudioSegment.silent(ms, frame_rate=RATE)
+
+
+def tone(ms):
+    return Sine(300).to_audio_segment(ms).set_frame_rate(RATE)
+
+
+def test_short_burst_is_not_speech():
+    # A click padded to more than the minimum speech length must still be rejected
+    with pytest.raises(NoSpeechError):
+        trim_silence(silence(1500) + tone(150) + silence(1500))
+
+
+def test_speech_is_kept_and_long_pauses_trimmed():
+    result = trim_silence(silence(1000) + tone(800) + silence(2000) + tone(600) + silence(1000))
+    assert 1400 <= result.kept_ms < result.original_ms
+    assert result.original_ms == 5400